@@ -24,12 +24,44 @@ class Settings(BaseSettings):
     BOT_TOKEN: str = ""
     WEBAPP_URL: str = ""  # URL фронтенда Mini App
     
+    # Отправка в Telegram (общий темп — на все процессы, остальные лимиты — на процесс)
+    TELEGRAM_GLOBAL_RATE: float = 30.0  # Сообщений в секунду на всех получателей
+    TELEGRAM_SHARED_BUDGET: bool = True  # Делить TELEGRAM_GLOBAL_RATE между воркерами API и ботом через SQLite
+    TELEGRAM_CHAT_INTERVAL: float = 1.0  # Минимальный интервал между сообщениями в один личный чат, секунд
+    TELEGRAM_GROUP_CHAT_INTERVAL: float = 3.0  # То же для групп и каналов (20 сообщений в минуту)
+    TELEGRAM_MAX_IN_FLIGHT: int = 8  # Одновременных запросов отправки к Bot API
+    TELEGRAM_MAX_RETRIES: int = 3  # Сколько раз повторять запрос после ответа 429 (RetryAfter)
+    
     # Сервер
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     
     # База данных
     DATABASE_PATH: Path = PROJECT_ROOT / "database" / "miniapp.db"
+    DB_POOL_SIZE: int = 4  # Соединений для чтения в пуле API (0 — одно общее соединение, как раньше)
+    DB_POOL_TIMEOUT: float = 5.0  # Сколько секунд ждать свободное соединение пула
+    
+    # Профиль SQLite (применяется к каждому соединению DatabaseService)
+    DB_JOURNAL_MODE: str = "WAL"  # WAL: читатели не блокируются писателем
+    DB_SYNCHRONOUS: str = "NORMAL"  # В режиме WAL NORMAL безопасен и заметно быстрее FULL
+    DB_CACHE_SIZE: int = -20000  # Отрицательное значение — размер кэша страниц в KiB (~20 MB)
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024  # Чтение файла базы через mmap (0 — выключено)
+    DB_TEMP_STORE: str = "MEMORY"  # Временные таблицы и индексы сортировки в памяти
+    DB_BUSY_TIMEOUT: int = 5000  # Сколько мс ждать снятия блокировки другим процессом
+    DB_WAL_CHECKPOINT_INTERVAL: int = 60  # Период фонового wal_checkpoint в секундах (0 — выключен)
+    
+    # Поиск
+    SEARCH_INDEX_REFRESH_INTERVAL: int = 300  # Период перестроения in-memory индексов поиска и подсказок в секундах (0 — только при старте)
+    
+    # Заказы
+    STOCK_HOLD_MINUTES: int = 10  # Сколько минут держится резерв товаров корзины при оформлении заказа
+    
+    # Очередь уведомлений
+    NOTIFICATION_OUTBOX_POLL_INTERVAL: float = 5.0  # Период опроса очереди уведомлений в секундах (0 — очередь не разбирается этим процессом)
+    NOTIFICATION_MAX_ATTEMPTS: int = 6  # После стольких неудачных отправок уведомление получает статус dead
+    
+    # Кэш ответов
+    CACHE_INVALIDATION_POLL_INTERVAL: float = 0.5  # Период опроса change_log (изменения из бота и других воркеров) в секундах (0 — выключено)
     
     # Загрузка медиа
     UPLOADS_DIR: Path = PROJECT_ROOT / "uploads"
@@ -37,6 +69,9 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10 MB
     ALLOWED_IMAGE_TYPES: list = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
     ALLOWED_VIDEO_TYPES: list = ["video/mp4", "video/webm"]
+    IMAGE_WORKERS: int = 2  # Процессов для обработки изображений: копии фото товаров и ресайз /media?w= (0 — выключено)
+    MEDIA_RESIZE_CACHE_MAX_MB: int = 512  # Предел кэша ресайза в uploads/.cache, MB (старые по обращению удаляются)
+    MEDIA_ACCEL_REDIRECT_PREFIX: str = ""  # internal-location nginx для /media (например "/internal-media/"); пусто — файлы отдаёт API
     
     # CORS
     CORS_ORIGINS: list = ["*"]
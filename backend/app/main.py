@@ -2,15 +2,33 @@
 Telegram Mini App - FastAPI Backend
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
 
 from .config import settings
-from .services.database import _db_service, DatabaseService
+from .services.database import (
+    _db_service,
+    DatabaseService,
+    DatabasePool,
+    DatabasePoolTimeout,
+    run_wal_checkpoints,
+)
+from .services.search_index import search_index, run_catalog_index_refresh
+from .services.suggest_index import suggest_index
+from .services.cache_invalidation import run_change_log_watch
+from .services.notification_outbox import run_notification_outbox
+from .services.category_tree import category_tree
+from .services.http_cache import ConditionalGetMiddleware
+from .services.media_serving import media_response
+from .services.image_resize import MAX_RESIZE_DIMENSION, resized_media_response
+from .services.image_variants import shutdown_image_pool
+from .services.telegram_sender import telegram_send_scheduler
+from .services.pagination import NEXT_CURSOR_HEADER
 from .routes import (
     users_router,
     shops_router,
@@ -39,9 +57,10 @@ async def lifespan(app: FastAPI):
     global _db_service
     from .services import database
     # Используем путь из настроек, чтобы он был единым для всего приложения
-    database._db_service = DatabaseService(db_path=settings.DATABASE_PATH)
+    database._db_service = DatabaseService(db_path=settings.DATABASE_PATH, shared=True)
     await database._db_service.connect()
-    print(f"[OK] Database connected: {settings.DATABASE_PATH}")
+    journal_mode = await database._db_service.fetch_one("PRAGMA journal_mode")
+    print(f"[OK] Database connected: {settings.DATABASE_PATH} (journal_mode={journal_mode['journal_mode']})")
     
     # Проверяем и деактивируем товары магазинов с истекшими подписками
     try:
@@ -482,9 +501,182 @@ async def lifespan(app: FastAPI):
         except:
             pass
     
+    # Видимость магазинов на витрине (shops.visible_until) и триггеры на подписках
+    try:
+        from .services.subscription_manager import ensure_shop_visibility
+        if await ensure_shop_visibility(database._db_service):
+            print("[SUBSCRIPTION] shops.visible_until backfilled")
+    except Exception as visibility_error:
+        print(f"[WARNING] Error preparing shop visibility: {visibility_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+    
+    # Резервы остатков на время оформления заказа
+    try:
+        from .services.stock_holds import ensure_stock_holds
+        await ensure_stock_holds(database._db_service)
+        await database._db_service.commit()
+    except Exception as holds_error:
+        print(f"[WARNING] Error creating stock_holds table: {holds_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+    
+    # Очередь уведомлений (пишется в транзакции заказа, разбирается фоновой задачей)
+    try:
+        from .services.notification_outbox import ensure_notification_outbox
+        await ensure_notification_outbox(database._db_service)
+        await database._db_service.commit()
+    except Exception as outbox_error:
+        print(f"[WARNING] Error creating notification_outbox table: {outbox_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+    
+    # Задания рассылок администратора (отправляет бот)
+    try:
+        from .services.broadcasts import ensure_broadcast_tables
+        await ensure_broadcast_tables(database._db_service)
+        await database._db_service.commit()
+    except Exception as broadcast_error:
+        print(f"[WARNING] Error creating broadcast tables: {broadcast_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+    
+    # Уменьшенные копии фото товаров (product_media.variants)
+    try:
+        from .services.image_variants import ensure_media_variants_column
+        if await ensure_media_variants_column(database._db_service):
+            await database._db_service.commit()
+            print("[MIGRATION] variants column added to product_media")
+    except Exception as variants_error:
+        print(f"[WARNING] Error adding product_media.variants column: {variants_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+    
+    # Шина изменений change_log (пишут воркеры API, бот и триггеры)
+    try:
+        from .services.cache_invalidation import ensure_change_log
+        await ensure_change_log(database._db_service)
+        await database._db_service.commit()
+    except Exception as change_log_error:
+        print(f"[WARNING] Error creating change_log table: {change_log_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+    
+    # Триггеры дерева категорий для кэша (правки из бота и скриптов)
+    try:
+        from .services.category_tree import ensure_category_triggers
+        if await ensure_category_triggers(database._db_service):
+            print("[CATEGORIES] Category tree triggers created")
+    except Exception as category_error:
+        print(f"[WARNING] Error creating category tree triggers: {category_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+    
+    # Индексы для горячих запросов (после миграций, чтобы все таблицы уже существовали)
+    try:
+        from .services.db_indexes import apply_indexes
+        created_indexes = await apply_indexes(database._db_service)
+        if created_indexes:
+            print(f"[INDEXES] Created {created_indexes} indexes")
+    except Exception as index_error:
+        print(f"[WARNING] Error applying indexes: {index_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+
+    # Полнотекстовый индекс каталога (FTS5) и триггеры синхронизации
+    try:
+        from .services.product_search import ensure_products_fts
+        if await ensure_products_fts(database._db_service):
+            print("[SEARCH] Full-text index products_fts rebuilt")
+    except Exception as fts_error:
+        print(f"[WARNING] Error creating full-text index: {fts_error}")
+        try:
+            await database._db_service.rollback()
+        except Exception:
+            pass
+
+    # Пул соединений: параллельные чтения и один сериализованный writer
+    if settings.DB_POOL_SIZE > 0:
+        database._db_pool = DatabasePool(
+            db_path=settings.DATABASE_PATH,
+            readers=settings.DB_POOL_SIZE,
+            acquire_timeout=settings.DB_POOL_TIMEOUT
+        )
+        await database._db_pool.connect()
+        print(f"[OK] Database pool ready: {settings.DB_POOL_SIZE} readers + 1 writer")
+    
+    # Фоновый checkpoint, чтобы WAL не разрастался под нагрузкой
+    checkpoint_task = None
+    if journal_mode["journal_mode"].upper() == "WAL" and settings.DB_WAL_CHECKPOINT_INTERVAL > 0:
+        checkpoint_task = asyncio.create_task(
+            run_wal_checkpoints(database._db_service, settings.DB_WAL_CHECKPOINT_INTERVAL)
+        )
+    
+    # In-memory индексы каталога: поиск с морфологией, подсказки при вводе, дерево категорий
+    search_refresh_task = None
+    catalog_indexes = {"search": search_index, "suggest": suggest_index, "categories": category_tree}
+    for index_name, holder in catalog_indexes.items():
+        try:
+            indexed = await holder.rebuild(database._db_service)
+            print(f"[SEARCH] {index_name} index built: {indexed} entries")
+        except Exception as search_error:
+            print(f"[WARNING] Error building {index_name} index: {search_error}")
+    if settings.SEARCH_INDEX_REFRESH_INTERVAL > 0:
+        search_refresh_task = asyncio.create_task(
+            run_catalog_index_refresh(
+                database._db_service,
+                settings.SEARCH_INDEX_REFRESH_INTERVAL,
+                catalog_indexes.values()
+            )
+        )
+    
+    # Шина изменений: кэш ответов и индексы следуют за правками других воркеров и бота
+    cache_watch_task = None
+    if settings.CACHE_INVALIDATION_POLL_INTERVAL > 0:
+        cache_watch_task = asyncio.create_task(
+            run_change_log_watch(database._db_service, settings.CACHE_INVALIDATION_POLL_INTERVAL)
+        )
+    
+    # Отправка уведомлений из очереди (на своём соединении)
+    outbox_task = None
+    if settings.NOTIFICATION_OUTBOX_POLL_INTERVAL > 0:
+        outbox_task = asyncio.create_task(
+            run_notification_outbox(settings.NOTIFICATION_OUTBOX_POLL_INTERVAL)
+        )
+    
     yield
     
     # Shutdown
+    for task in (checkpoint_task, search_refresh_task, cache_watch_task, outbox_task):
+        if not task:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    shutdown_image_pool()
+    await telegram_send_scheduler.close()
+    if database._db_pool:
+        await database._db_pool.disconnect()
+        database._db_pool = None
+        print("[OK] Database pool closed")
     if database._db_service:
         await database._db_service.disconnect()
         print("[OK] Database disconnected")
@@ -498,6 +690,9 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# ETag и 304 для JSON-ответов GET (добавляется первым, чтобы CORS оборачивал и ответы 304)
+app.add_middleware(ConditionalGetMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -505,8 +700,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Курсор следующей страницы списков (services/pagination.py) и ETag для условных запросов
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+@app.exception_handler(DatabasePoolTimeout)
+async def database_pool_timeout_handler(request: Request, exc: DatabasePoolTimeout):
+    """Пул соединений перегружен — просим клиента повторить запрос позже."""
+    print(f"[DB POOL] {exc} ({request.method} {request.url.path})")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
+
 # Подключаем роутеры
 app.include_router(users_router, prefix="/api/users", tags=["Users"])
 
@@ -816,106 +1024,21 @@ if (FRONTEND_DIR / "images").exists():
 if (FRONTEND_DIR / "assets").exists():
     app.mount("/assets", StaticFiles(directory=FRONTEND_DIR / "assets"), name="assets")
 
-# Раздача медиа файлов (товары и магазины)
-# Создаём специальный роут для видео с поддержкой range requests
-@app.get("/media/{path:path}")
-async def serve_media(path: str, request: Request = None):
-    """Отдает медиа файлы с правильными MIME-типами и поддержкой range requests для видео."""
-    from fastapi.responses import Response, StreamingResponse
-    from fastapi import Request, HTTPException
-    import aiofiles
-    import os
-    
-    file_path = UPLOADS_DIR / path
-    
-    # Проверяем существование файла
-    if not file_path.exists() or not file_path.is_file():
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    # Определяем MIME-тип по расширению
-    extension = file_path.suffix.lower()
-    mime_types = {
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.png': 'image/png',
-        '.webp': 'image/webp',
-        '.mp4': 'video/mp4',
-        '.webm': 'video/webm',
-        '.gif': 'image/gif',
-    }
-    media_type = mime_types.get(extension, 'application/octet-stream')
-    
-    file_size = file_path.stat().st_size
-    
-    # Для видео файлов добавляем поддержку range requests
-    if extension in ['.mp4', '.webm']:
-        range_header = request.headers.get('range') if request else None
-        
-        if range_header:
-            # Парсим range header (например: "bytes=0-1023")
-            import re
-            match = re.match(r'bytes=(\d+)-(\d*)', range_header)
-            if match:
-                start = int(match.group(1))
-                end = int(match.group(2)) if match.group(2) else file_size - 1
-                
-                # Ограничиваем диапазон размером файла
-                end = min(end, file_size - 1)
-                content_length = end - start + 1
-                
-                async def generate():
-                    async with aiofiles.open(file_path, 'rb') as f:
-                        await f.seek(start)
-                        remaining = content_length
-                        while remaining > 0:
-                            chunk_size = min(8192, remaining)
-                            chunk = await f.read(chunk_size)
-                            if not chunk:
-                                break
-                            remaining -= len(chunk)
-                            yield chunk
-                
-                headers = {
-                    'Content-Range': f'bytes {start}-{end}/{file_size}',
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(content_length),
-                    'Content-Type': media_type,
-                }
-                
-                return StreamingResponse(
-                    generate(),
-                    status_code=206,  # Partial Content
-                    headers=headers,
-                    media_type=media_type
-                )
-        
-        # Если нет range header, возвращаем весь файл
-        headers = {
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(file_size),
-            'Content-Type': media_type,
-        }
-        
-        async def generate_full():
-            async with aiofiles.open(file_path, 'rb') as f:
-                while True:
-                    chunk = await f.read(8192)
-                    if not chunk:
-                        break
-                    yield chunk
-        
-        return StreamingResponse(
-            generate_full(),
-            headers=headers,
-            media_type=media_type
-        )
-    
-    # Для изображений используем обычный FileResponse
-    from fastapi.responses import FileResponse
-    return FileResponse(
-        path=str(file_path),
-        media_type=media_type
-    )
+# Раздача медиа файлов (товары и магазины): Range, HEAD, X-Accel-Redirect / sendfile
+@app.api_route("/media/{path:path}", methods=["GET", "HEAD"])
+async def serve_media(
+    path: str,
+    w: Optional[int] = Query(None, ge=1, le=MAX_RESIZE_DIMENSION, description="Ширина копии изображения"),
+    h: Optional[int] = Query(None, ge=1, le=MAX_RESIZE_DIMENSION, description="Высота копии изображения"),
+    fmt: Optional[str] = Query(None, pattern="^(webp|avif|jpeg|png)$", description="Формат копии"),
+):
+    """
+    Отдает медиа файлы с правильными MIME-типами и поддержкой Range-запросов.
+    С параметрами w/h/fmt отдаёт копию изображения нужного размера (services/image_resize.py).
+    """
+    if w or h or fmt:
+        return await resized_media_response(UPLOADS_DIR, path, w, h, fmt)
+    return media_response(UPLOADS_DIR, path)
 
 # Также монтируем статику для обратной совместимости (но роут выше будет иметь приоритет)
 if UPLOADS_DIR.exists():
@@ -55,6 +55,18 @@ class OrderCreate(OrderBase):
     items: List[OrderItemCreate]
 
 
+class StockHoldCreate(BaseModel):
+    """Резерв товаров корзины на время оформления заказа."""
+    shop_id: int
+    items: List[OrderItemCreate]
+
+
+class StockHold(BaseModel):
+    """Действующий резерв покупателя."""
+    expires_at: datetime
+    items: List[OrderItemCreate]
+
+
 class Order(OrderBase):
     """Полная модель заказа."""
     id: int
@@ -2,10 +2,11 @@
 Модели товара.
 """
 
+import json
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 class ProductMediaBase(BaseModel):
@@ -17,11 +18,28 @@ class ProductMediaBase(BaseModel):
     is_primary: bool = False
 
 
+class MediaVariant(BaseModel):
+    """Уменьшенная копия фото (services/image_variants.py)."""
+    url: str
+    width: int
+    height: int
+    format: str
+
+
 class ProductMedia(ProductMediaBase):
     """Полная модель медиа файла."""
     id: int
     product_id: int
     created_at: datetime
+    variants: List[MediaVariant] = []
+
+    @field_validator("variants", mode="before")
+    @classmethod
+    def decode_variants(cls, value):
+        # В базе варианты хранятся строкой JSON
+        if isinstance(value, str):
+            return json.loads(value)
+        return value or []
 
     class Config:
         from_attributes = True
@@ -12,12 +12,21 @@ from ..models.user import User
 from ..models.shop import Shop, ShopUpdate
 from ..models.product import Product
 from ..models.order import Order, OrderWithItems
+from ..services.cache_invalidation import product_tags, publish_invalidation, shop_tags
 from ..services.database import DatabaseService, get_db
+from ..services import catalog_events
+from ..services.image_resize import resize_cache
+from ..services.notification_outbox import notification_stats, retry_dead_notifications
+from ..services.pagination import keyset_condition, next_cursor, parse_cursor, set_next_cursor
+from ..services.response_cache import response_cache
 from .users import get_current_user
 from ..config import settings
 
 router = APIRouter()
 
+# Ключ сортировки админских списков (новые сначала) для курсорной пагинации
+ADMIN_SORT_KEY = ("created_at", "id")
+
 
 def is_admin_user(telegram_id: int) -> bool:
     """Проверяет, является ли пользователь администратором."""
@@ -46,8 +55,10 @@ async def get_admin_user(
 
 @router.get("/shops", response_model=List[dict])
 async def get_all_shops(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     is_active: Optional[bool] = None,
     is_verified: Optional[bool] = None,
     search: Optional[str] = None,
@@ -71,6 +82,12 @@ async def get_all_shops(
         search_param = f"%{search}%"
         params.extend([search_param, search_param, search_param])
     
+    cursor_values = parse_cursor(cursor, ADMIN_SORT_KEY)
+    if cursor_values:
+        conditions.append(keyset_condition(["s.created_at", "s.id"]))
+        params.extend(cursor_values)
+        skip = 0
+    
     where_clause = " AND ".join(conditions) if conditions else "1=1"
     
     query = f"""
@@ -83,12 +100,13 @@ async def get_all_shops(
         FROM shops s
         LEFT JOIN users u ON s.owner_id = u.id
         WHERE {where_clause}
-        ORDER BY s.created_at DESC
+        ORDER BY s.created_at DESC, s.id DESC
         LIMIT ? OFFSET ?
     """
     params.extend([limit, skip])
     
     shops = await db.fetch_all(query, tuple(params))
+    set_next_cursor(response, next_cursor(shops, limit, ADMIN_SORT_KEY))
     
     # Преобразуем Decimal в float для JSON
     result = []
@@ -152,6 +170,7 @@ async def update_shop(
     if update_data:
         await db.update("shops", update_data, "id = ?", (shop_id,))
         await db.commit()
+        await publish_invalidation(db, *shop_tags(shop_id))
     
     updated_shop = await db.fetch_one("SELECT * FROM shops WHERE id = ?", (shop_id,))
     return Shop(**updated_shop)
@@ -222,8 +241,10 @@ async def get_shop_statistics(
 
 @router.get("/products", response_model=List[dict])
 async def get_all_products(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     shop_id: Optional[int] = None,
     category_id: Optional[int] = None,
     is_active: Optional[bool] = None,
@@ -252,6 +273,12 @@ async def get_all_products(
         search_param = f"%{search}%"
         params.extend([search_param, search_param])
     
+    cursor_values = parse_cursor(cursor, ADMIN_SORT_KEY)
+    if cursor_values:
+        conditions.append(keyset_condition(["p.created_at", "p.id"]))
+        params.extend(cursor_values)
+        skip = 0
+    
     where_clause = " AND ".join(conditions) if conditions else "1=1"
     
     query = f"""
@@ -262,12 +289,13 @@ async def get_all_products(
         LEFT JOIN shops s ON p.shop_id = s.id
         LEFT JOIN categories c ON p.category_id = c.id
         WHERE {where_clause}
-        ORDER BY p.created_at DESC
+        ORDER BY p.created_at DESC, p.id DESC
         LIMIT ? OFFSET ?
     """
     params.extend([limit, skip])
     
     products = await db.fetch_all(query, tuple(params))
+    set_next_cursor(response, next_cursor(products, limit, ADMIN_SORT_KEY))
     
     result = []
     for product in products:
@@ -329,6 +357,8 @@ async def delete_product(
     
     await db.execute("DELETE FROM products WHERE id = ?", (product_id,))
     await db.commit()
+    catalog_events.product_deleted(product_id)
+    await publish_invalidation(db, *product_tags(product["shop_id"], product_id))
     
     return {"message": "Product deleted successfully"}
 
@@ -352,6 +382,8 @@ async def update_product_status(
         (product_id,)
     )
     await db.commit()
+    await catalog_events.product_changed(db, product_id)
+    await publish_invalidation(db, *product_tags(product["shop_id"], product_id))
     
     return {"message": f"Product {'activated' if is_active else 'deactivated'} successfully"}
 
@@ -360,8 +392,10 @@ async def update_product_status(
 
 @router.get("/orders", response_model=List[dict])
 async def get_all_orders(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     status: Optional[str] = None,
     shop_id: Optional[int] = None,
     user_id: Optional[int] = None,
@@ -394,6 +428,12 @@ async def get_all_orders(
         conditions.append("DATE(o.created_at) <= ?")
         params.append(end_date)
     
+    cursor_values = parse_cursor(cursor, ADMIN_SORT_KEY)
+    if cursor_values:
+        conditions.append(keyset_condition(["o.created_at", "o.id"]))
+        params.extend(cursor_values)
+        skip = 0
+    
     where_clause = " AND ".join(conditions) if conditions else "1=1"
     
     query = f"""
@@ -407,12 +447,13 @@ async def get_all_orders(
         LEFT JOIN shops s ON o.shop_id = s.id
         LEFT JOIN users u ON o.user_id = u.id
         WHERE {where_clause}
-        ORDER BY o.created_at DESC
+        ORDER BY o.created_at DESC, o.id DESC
         LIMIT ? OFFSET ?
     """
     params.extend([limit, skip])
     
     orders = await db.fetch_all(query, tuple(params))
+    set_next_cursor(response, next_cursor(orders, limit, ADMIN_SORT_KEY))
     
     result = []
     for order in orders:
@@ -556,8 +597,10 @@ async def get_orders_statistics(
 
 @router.get("/users", response_model=List[dict])
 async def get_all_users(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     search: Optional[str] = None,
     admin_user: User = Depends(get_admin_user),
     db: DatabaseService = Depends(get_db)
@@ -571,6 +614,12 @@ async def get_all_users(
         search_param = f"%{search}%"
         params.extend([search_param, search_param, search_param])
     
+    cursor_values = parse_cursor(cursor, ADMIN_SORT_KEY)
+    if cursor_values:
+        conditions.append(keyset_condition(["u.created_at", "u.id"]))
+        params.extend(cursor_values)
+        skip = 0
+    
     where_clause = " AND ".join(conditions) if conditions else "1=1"
     
     query = f"""
@@ -579,12 +628,13 @@ async def get_all_users(
                (SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE user_id = u.id) as total_spent
         FROM users u
         WHERE {where_clause}
-        ORDER BY u.created_at DESC
+        ORDER BY u.created_at DESC, u.id DESC
         LIMIT ? OFFSET ?
     """
     params.extend([limit, skip])
     
     users = await db.fetch_all(query, tuple(params))
+    set_next_cursor(response, next_cursor(users, limit, ADMIN_SORT_KEY))
     
     result = []
     for user in users:
@@ -629,8 +679,10 @@ async def get_user_details(
 @router.get("/users/{user_id}/orders", response_model=List[dict])
 async def get_user_orders(
     user_id: int,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     admin_user: User = Depends(get_admin_user),
     db: DatabaseService = Depends(get_db)
 ):
@@ -639,15 +691,24 @@ async def get_user_orders(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    conditions = ["o.user_id = ?"]
+    params = [user_id]
+    cursor_values = parse_cursor(cursor, ADMIN_SORT_KEY)
+    if cursor_values:
+        conditions.append(keyset_condition(["o.created_at", "o.id"]))
+        params.extend(cursor_values)
+        skip = 0
+    
     orders = await db.fetch_all(
-        """SELECT o.*, s.name as shop_name
+        f"""SELECT o.*, s.name as shop_name
            FROM orders o
            LEFT JOIN shops s ON o.shop_id = s.id
-           WHERE o.user_id = ?
-           ORDER BY o.created_at DESC
+           WHERE {" AND ".join(conditions)}
+           ORDER BY o.created_at DESC, o.id DESC
            LIMIT ? OFFSET ?""",
-        (user_id, limit, skip)
+        tuple(params) + (limit, skip)
     )
+    set_next_cursor(response, next_cursor(orders, limit, ADMIN_SORT_KEY))
     
     result = []
     for order in orders:
@@ -899,3 +960,40 @@ async def get_promo_statistics(
         ]
     }
 
+
+# ==================== Кэш ====================
+
+@router.get("/cache/stats", response_model=dict)
+async def get_cache_stats(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Попадания и промахи кэша ответов по маршрутам (в текущем процессе)."""
+    return response_cache.stats()
+
+
+@router.get("/cache/media-resize", response_model=dict)
+async def get_media_resize_stats(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Кэш копий изображений /media?w= (в текущем процессе): файлы, объём, попадания, вытеснения."""
+    return resize_cache.stats()
+
+
+# ==================== Уведомления ====================
+
+@router.get("/notifications/stats", response_model=dict)
+async def get_notification_stats(
+    admin_user: User = Depends(get_admin_user),
+    db: DatabaseService = Depends(get_db)
+):
+    """Число уведомлений в очереди по статусам (pending, sending, sent, dead)."""
+    return await notification_stats(db)
+
+
+@router.post("/notifications/retry-dead", response_model=dict)
+async def retry_dead(
+    admin_user: User = Depends(get_admin_user),
+    db: DatabaseService = Depends(get_db)
+):
+    """Возвращает в очередь уведомления, исчерпавшие попытки отправки."""
+    return {"requeued": await retry_dead_notifications(db)}
@@ -8,12 +8,17 @@ from datetime import datetime
 
 from ..models.banner import Banner, BannerCreate, BannerUpdate
 from ..models.user import User
+from ..services.cache_invalidation import publish_invalidation
 from ..services.database import DatabaseService, get_db
 from ..services.media import get_media_service
+from ..services.response_cache import response_cache
 from .users import get_current_user
 
 router = APIRouter()
 
+# Время жизни списка баннеров в кэше ответов, секунды
+BANNERS_CACHE_TTL = 300
+
 
 @router.get("/", response_model=List[Banner])
 async def get_banners(
@@ -29,16 +34,20 @@ async def get_banners(
     
     where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
     
-    banners = await db.fetch_all(
-        f"""
-        SELECT * FROM banners
-        {where_clause}
-        ORDER BY display_order ASC, created_at DESC
-        """,
-        tuple(params)
+    async def load():
+        banners = await db.fetch_all(
+            f"""
+            SELECT * FROM banners
+            {where_clause}
+            ORDER BY display_order ASC, created_at DESC
+            """,
+            tuple(params)
+        )
+        return [Banner(**banner) for banner in banners]
+    
+    return await response_cache.get_or_load(
+        "banners.list", active_only, load, ttl=BANNERS_CACHE_TTL, tags=["banners"]
     )
-    
-    return [Banner(**banner) for banner in banners]
 
 
 @router.post("/", response_model=Banner)
@@ -56,6 +65,7 @@ async def create_banner(
     
     banner_id = await db.insert("banners", banner_dict)
     await db.commit()
+    await publish_invalidation(db, "banners")
     
     banner = await db.fetch_one("SELECT * FROM banners WHERE id = ?", (banner_id,))
     return Banner(**banner)
@@ -92,6 +102,7 @@ async def update_banner(
         update_data["updated_at"] = datetime.now()
         await db.update("banners", update_data, "id = ?", (banner_id,))
         await db.commit()
+        await publish_invalidation(db, "banners")
     
     updated = await db.fetch_one("SELECT * FROM banners WHERE id = ?", (banner_id,))
     return Banner(**updated)
@@ -112,6 +123,7 @@ async def delete_banner(
     
     await db.delete("banners", "id = ?", (banner_id,))
     await db.commit()
+    await publish_invalidation(db, "banners")
     
     return {"message": "Banner deleted successfully"}
 
@@ -127,15 +139,8 @@ async def upload_banner_image(
     
     media_service = get_media_service()
     
-    # Читаем содержимое файла
-    contents = await file.read()
-    
-    # Сохраняем файл через media service
-    file_url = await media_service.save_file(
-        file=contents,
-        filename=file.filename,
-        folder="banners"
-    )
+    # Сохраняем файл через media service (блоками, без чтения целиком в память)
+    file_url = await media_service.save_file(file=file, folder="banners")
     
     return {"url": file_url}
 
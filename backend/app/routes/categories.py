@@ -2,42 +2,35 @@
 API Routes для категорий.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from typing import List
 
 from ..models.category import Category, CategoryWithChildren
+from ..services.category_tree import category_tree
 from ..services.database import DatabaseService, get_db
+from ..services.http_cache import etag_matches
+from ..services.media_loader import load_product_media
+from ..services.subscription_manager import SHOP_VISIBLE_CONDITION
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[CategoryWithChildren])
 async def get_categories(
+    request: Request,
     db: DatabaseService = Depends(get_db)
 ):
-    """Получает дерево категорий."""
-    # Получаем все категории
-    all_categories = await db.fetch_all(
-        """SELECT c.*, 
-                  (SELECT COUNT(*) FROM products p WHERE p.category_id = c.id AND p.is_active = 1) as products_count
-           FROM categories c 
-           WHERE c.is_active = 1 
-           ORDER BY c.sort_order"""
-    )
-    
-    # Строим дерево
-    categories_dict = {cat["id"]: {**cat, "children": []} for cat in all_categories}
-    root_categories = []
-    
-    for cat in all_categories:
-        if cat["parent_id"] is None:
-            root_categories.append(categories_dict[cat["id"]])
-        else:
-            parent = categories_dict.get(cat["parent_id"])
-            if parent:
-                parent["children"].append(categories_dict[cat["id"]])
-    
-    return [CategoryWithChildren(**cat) for cat in root_categories]
+    """
+    Получает дерево категорий из in-process кэша (category_tree).
+    Поддерживает If-None-Match: неизменившееся дерево — 304 без тела.
+    """
+    if not category_tree.index.ready:
+        await category_tree.rebuild(db)
+    body, etag = category_tree.index.payload()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/flat", response_model=List[Category])
@@ -93,12 +86,10 @@ async def get_category_products(
 ):
     """Получает товары категории."""
     if include_subcategories:
-        # Получаем ID всех подкатегорий
-        subcategories = await db.fetch_all(
-            "SELECT id FROM categories WHERE parent_id = ? AND is_active = 1",
-            (category_id,)
-        )
-        category_ids = [category_id] + [s["id"] for s in subcategories]
+        # Активные подкатегории любой глубины (из кэша дерева категорий)
+        if not category_tree.index.ready:
+            await category_tree.rebuild(db)
+        category_ids = category_tree.index.descendants(category_id, active_only=True)
         placeholders = ",".join(["?" for _ in category_ids])
         
         products = await db.fetch_all(
@@ -112,19 +103,14 @@ async def get_category_products(
                 JOIN shops s ON p.shop_id = s.id
                 LEFT JOIN categories c ON p.category_id = c.id
                 WHERE p.category_id IN ({placeholders}) AND p.is_active = 1 AND p.quantity > 0 AND s.is_active = 1
-                AND EXISTS (
-                    SELECT 1 FROM shop_subscriptions ss 
-                    WHERE ss.shop_id = s.id 
-                    AND ss.is_active = 1 
-                    AND ss.end_date > datetime('now')
-                )
+                AND {SHOP_VISIBLE_CONDITION}
                 ORDER BY p.created_at DESC
                 LIMIT ? OFFSET ?""",
             tuple(category_ids) + (limit, skip)
         )
     else:
         products = await db.fetch_all(
-            """SELECT p.*, 
+            f"""SELECT p.*, 
                       s.name as shop_name,
                       s.id as shop_id,
                       s.average_rating as shop_rating,
@@ -134,18 +120,14 @@ async def get_category_products(
                JOIN shops s ON p.shop_id = s.id
                LEFT JOIN categories c ON p.category_id = c.id
                WHERE p.category_id = ? AND p.is_active = 1 AND p.quantity > 0 AND s.is_active = 1
-               AND EXISTS (
-                   SELECT 1 FROM shop_subscriptions ss 
-                   WHERE ss.shop_id = s.id 
-                   AND ss.is_active = 1 
-                   AND ss.end_date > datetime('now')
-               )
+               AND {SHOP_VISIBLE_CONDITION}
                ORDER BY p.created_at DESC
                LIMIT ? OFFSET ?""",
             (category_id, limit, skip)
         )
     
-    # Получаем все медиа для каждого товара и обрабатываем данные
+    # Медиа всех товаров одним запросом, затем обрабатываем данные
+    media_by_product = await load_product_media(db, [p["id"] for p in products])
     result = []
     for product in products:
         product_dict = dict(product)
@@ -171,18 +153,9 @@ async def get_category_products(
             elif not isinstance(product_dict["shop_reviews_count"], int):
                 product_dict["shop_reviews_count"] = int(product_dict["shop_reviews_count"]) if product_dict["shop_reviews_count"] else 0
         
-        # Получаем все медиа для товара
-        media = await db.fetch_all(
-            """SELECT id, media_type, url, is_primary, sort_order 
-               FROM product_media 
-               WHERE product_id = ? 
-               ORDER BY 
-                   CASE WHEN media_type = 'video' THEN 0 ELSE 1 END,
-                   is_primary DESC, 
-                   sort_order""",
-            (product["id"],)
-        )
-        product_dict["media"] = [dict(m) for m in media]
+        # Медиа товара
+        media = media_by_product.get(product["id"], [])
+        product_dict["media"] = media
         product_dict["primary_image"] = media[0]["url"] if media else None
         result.append(product_dict)
     
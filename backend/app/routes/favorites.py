@@ -8,6 +8,7 @@ from typing import List
 from ..models.favorite import Favorite, FavoriteCreate
 from ..models.user import User
 from ..services.database import DatabaseService, get_db
+from ..services.media_loader import load_product_media
 from .users import get_current_user
 
 router = APIRouter()
@@ -36,7 +37,8 @@ async def get_favorites(
         (current_user.id,)
     )
     
-    # Получаем все медиа для каждого товара и обрабатываем данные
+    # Медиа всех товаров одним запросом, затем обрабатываем данные
+    media_by_product = await load_product_media(db, [p["id"] for p in favorites])
     result = []
     for favorite in favorites:
         favorite_dict = dict(favorite)
@@ -62,18 +64,9 @@ async def get_favorites(
             elif not isinstance(favorite_dict["shop_reviews_count"], int):
                 favorite_dict["shop_reviews_count"] = int(favorite_dict["shop_reviews_count"]) if favorite_dict["shop_reviews_count"] else 0
         
-        # Получаем все медиа для товара
-        media = await db.fetch_all(
-            """SELECT id, media_type, url, is_primary, sort_order 
-               FROM product_media 
-               WHERE product_id = ? 
-               ORDER BY 
-                   CASE WHEN media_type = 'video' THEN 0 ELSE 1 END,
-                   is_primary DESC, 
-                   sort_order""",
-            (favorite["id"],)
-        )
-        favorite_dict["media"] = [dict(m) for m in media]
+        # Медиа товара
+        media = media_by_product.get(favorite["id"], [])
+        favorite_dict["media"] = media
         favorite_dict["primary_image"] = media[0]["url"] if media else None
         result.append(favorite_dict)
     
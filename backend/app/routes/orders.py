@@ -3,16 +3,22 @@ API Routes для заказов.
 """
 
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Query
+from collections import Counter
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional
 from decimal import Decimal
 import uuid
 from datetime import datetime
 
-from ..models.order import Order, OrderCreate, OrderItem, OrderWithItems
+from ..models.order import Order, OrderCreate, OrderWithItems, StockHold, StockHoldCreate
 from ..models.user import User
+from ..services import catalog_events
+from ..services.cache_invalidation import publish_invalidation, shop_tags
 from ..services.database import DatabaseService, get_db
-from ..services.telegram_notifier import telegram_notifier
+from ..services.notification_outbox import enqueue_notification, wake_notification_outbox
+from ..services.order_repository import ORDER_SORT_KEY, fetch_orders_page, hydrate_orders
+from ..services.pagination import parse_cursor, set_next_cursor
+from ..services.stock_holds import held_by_others, hold_items, load_available_products, release_holds
 from .users import get_current_user
 
 router = APIRouter()
@@ -26,12 +32,21 @@ def generate_order_number() -> str:
     return f"ORD-{timestamp}-{unique}"
 
 
+async def publish_stock_change(db: DatabaseService, shop_id: int, product_ids: List[int]) -> None:
+    """Остатки товаров изменились (после commit): обновляет индексы и сбрасывает кэш витрины."""
+    for product_id in product_ids:
+        await catalog_events.product_changed(db, product_id)
+    await publish_invalidation(db, *shop_tags(shop_id), *(f"product:{product_id}" for product_id in product_ids))
+
+
 @router.get("/shop/{shop_id}", response_model=List[OrderWithItems])
 async def get_shop_orders(
     shop_id: int,
+    response: Response,
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     current_user: User = Depends(get_current_user),
     db: DatabaseService = Depends(get_db)
 ):
@@ -44,155 +59,41 @@ async def get_shop_orders(
     if not shop:
         raise HTTPException(status_code=404, detail="Shop not found or access denied")
     
+    cursor_values = parse_cursor(cursor, ORDER_SORT_KEY)
     if status:
-        orders = await db.fetch_all(
-            """SELECT o.*, s.name as shop_name
-               FROM orders o
-               JOIN shops s ON o.shop_id = s.id
-               WHERE o.shop_id = ? AND o.status = ?
-               ORDER BY o.created_at DESC
-               LIMIT ? OFFSET ?""",
-            (shop_id, status, limit, skip)
+        orders, next_page = await fetch_orders_page(
+            db, "o.shop_id = ? AND o.status = ?", (shop_id, status), limit, skip, cursor_values
         )
     else:
-        orders = await db.fetch_all(
-            """SELECT o.*, s.name as shop_name
-               FROM orders o
-               JOIN shops s ON o.shop_id = s.id
-               WHERE o.shop_id = ?
-               ORDER BY o.created_at DESC
-               LIMIT ? OFFSET ?""",
-            (shop_id, limit, skip)
+        orders, next_page = await fetch_orders_page(
+            db, "o.shop_id = ?", (shop_id,), limit, skip, cursor_values
         )
-    
-    result = []
-    for order in orders:
-        items = await db.fetch_all(
-            """SELECT oi.*, 
-                      COALESCE(oi.product_name, p.name, 'Товар удалён') as product_name,
-                      CASE 
-                          WHEN p.id IS NOT NULL THEN 
-                              (SELECT url FROM product_media WHERE product_id = p.id AND is_primary = 1 LIMIT 1)
-                          ELSE NULL
-                      END as product_image_url
-               FROM order_items oi
-               LEFT JOIN products p ON oi.product_id = p.id
-               WHERE oi.order_id = ?""",
-            (order["id"],)
-        )
-        
-        # Безопасное создание OrderItem с обработкой ошибок
-        order_items = []
-        for item in items:
-            try:
-                item_data = dict(item)
-                # Убеждаемся, что product_id может быть None
-                if 'product_id' not in item_data or item_data['product_id'] is None:
-                    item_data['product_id'] = None
-                order_items.append(OrderItem(**item_data))
-            except Exception as e:
-                print(f"[ERROR] Failed to create OrderItem: {e}, item data: {item}")
-                # Пропускаем проблемный товар или создаем с минимальными данными
-                try:
-                    order_items.append(OrderItem(
-                        id=item.get('id', 0),
-                        order_id=item.get('order_id', order["id"]),
-                        product_id=item.get('product_id'),
-                        quantity=item.get('quantity', 1),
-                        price=item.get('price', 0),
-                        discount_price=item.get('discount_price'),
-                        product_name=item.get('product_name', 'Товар удалён'),
-                        product_image_url=item.get('product_image_url')
-                    ))
-                except Exception as e2:
-                    print(f"[ERROR] Failed to create fallback OrderItem: {e2}")
-                    continue
-        
-        result.append(OrderWithItems(
-            **order,
-            items=order_items
-        ))
-    
-    return result
+    set_next_cursor(response, next_page)
+    return orders
 
 
 @router.get("/", response_model=List[OrderWithItems])
 async def get_orders(
+    response: Response,
     status: Optional[str] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     current_user: User = Depends(get_current_user),
     db: DatabaseService = Depends(get_db)
 ):
     """Получает заказы пользователя."""
+    cursor_values = parse_cursor(cursor, ORDER_SORT_KEY)
     if status:
-        orders = await db.fetch_all(
-            """SELECT o.*, s.name as shop_name
-               FROM orders o
-               JOIN shops s ON o.shop_id = s.id
-               WHERE o.user_id = ? AND o.status = ?
-               ORDER BY o.created_at DESC
-               LIMIT ? OFFSET ?""",
-            (current_user.id, status, limit, skip)
+        orders, next_page = await fetch_orders_page(
+            db, "o.user_id = ? AND o.status = ?", (current_user.id, status), limit, skip, cursor_values
         )
     else:
-        orders = await db.fetch_all(
-            """SELECT o.*, s.name as shop_name
-               FROM orders o
-               JOIN shops s ON o.shop_id = s.id
-               WHERE o.user_id = ?
-               ORDER BY o.created_at DESC
-               LIMIT ? OFFSET ?""",
-            (current_user.id, limit, skip)
-        )
-    
-    result = []
-    for order in orders:
-        items = await db.fetch_all(
-            """SELECT oi.*, 
-                      COALESCE(oi.product_name, p.name, 'Товар удалён') as product_name,
-                      CASE 
-                          WHEN p.id IS NOT NULL THEN 
-                              (SELECT url FROM product_media WHERE product_id = p.id AND is_primary = 1 LIMIT 1)
-                          ELSE NULL
-                      END as product_image_url
-               FROM order_items oi
-               LEFT JOIN products p ON oi.product_id = p.id
-               WHERE oi.order_id = ?""",
-            (order["id"],)
+        orders, next_page = await fetch_orders_page(
+            db, "o.user_id = ?", (current_user.id,), limit, skip, cursor_values
         )
-        
-        # Безопасное создание OrderItem с обработкой ошибок
-        order_items = []
-        for item in items:
-            try:
-                item_data = dict(item)
-                if 'product_id' not in item_data or item_data['product_id'] is None:
-                    item_data['product_id'] = None
-                order_items.append(OrderItem(**item_data))
-            except Exception as e:
-                print(f"[ERROR] Failed to create OrderItem: {e}, item data: {item}")
-                try:
-                    order_items.append(OrderItem(
-                        id=item.get('id', 0),
-                        order_id=item.get('order_id', order["id"]),
-                        product_id=item.get('product_id'),
-                        quantity=item.get('quantity', 1),
-                        price=item.get('price', 0),
-                        discount_price=item.get('discount_price'),
-                        product_name=item.get('product_name', 'Товар удалён'),
-                        product_image_url=item.get('product_image_url')
-                    ))
-                except Exception as e2:
-                    print(f"[ERROR] Failed to create fallback OrderItem: {e2}")
-                    continue
-        
-        result.append(OrderWithItems(
-            **order,
-            items=order_items
-        ))
-    
-    return result
+    set_next_cursor(response, next_page)
+    return orders
 
 
 @router.get("/{order_id}", response_model=OrderWithItems)
@@ -212,50 +113,30 @@ async def get_order(
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    items = await db.fetch_all(
-            """SELECT oi.*, 
-                  oi.product_id as product_id,
-                  COALESCE(oi.product_name, p.name, 'Товар удалён') as product_name,
-                  CASE 
-                      WHEN p.id IS NOT NULL THEN 
-                          (SELECT url FROM product_media WHERE product_id = p.id AND is_primary = 1 LIMIT 1)
-                      ELSE NULL
-                  END as product_image_url
-           FROM order_items oi
-           LEFT JOIN products p ON oi.product_id = p.id
-           WHERE oi.order_id = ?""",
-        (order_id,)
-    )
-    
-    # Безопасное создание OrderItem с обработкой ошибок
-    order_items = []
-    for item in items:
-        try:
-            item_data = dict(item)
-            if item_data.get('product_id') is None:
-                item_data['product_id'] = None
-            order_items.append(OrderItem(**item_data))
-        except Exception as e:
-            print(f"[ERROR] Failed to create OrderItem: {e}, item data: {item}")
-            try:
-                order_items.append(OrderItem(
-                    id=item.get('id', 0),
-                    order_id=item.get('order_id', order_id),
-                    product_id=item.get('product_id'),
-                    quantity=item.get('quantity', 1),
-                    price=item.get('price', 0),
-                    discount_price=item.get('discount_price'),
-                    product_name=item.get('product_name', 'Товар удалён'),
-                    product_image_url=item.get('product_image_url')
-                ))
-            except Exception as e2:
-                print(f"[ERROR] Failed to create fallback OrderItem: {e2}")
-                continue
-    
-    return OrderWithItems(
-        **order,
-        items=order_items
-    )
+    return (await hydrate_orders(db, [order]))[0]
+
+
+@router.post("/hold", response_model=StockHold)
+async def hold_order_items(
+    hold_data: StockHoldCreate,
+    current_user: User = Depends(get_current_user),
+    db: DatabaseService = Depends(get_db)
+):
+    """
+    Резервирует товары корзины на время оформления заказа (STOCK_HOLD_MINUTES).
+    Повторный вызов заменяет резерв; 409, если товара уже не хватает.
+    """
+    return await hold_items(db, current_user.id, hold_data.shop_id, hold_data.items)
+
+
+@router.delete("/hold")
+async def release_order_hold(
+    current_user: User = Depends(get_current_user),
+    db: DatabaseService = Depends(get_db)
+):
+    """Снимает резерв покупателя (выход из оформления заказа)."""
+    released = await release_holds(db, current_user.id)
+    return {"released": released}
 
 
 @router.post("/", response_model=Order)
@@ -281,220 +162,11 @@ async def create_order(
     if not shop:
         raise HTTPException(status_code=404, detail="Shop not found")
     
-    # Проверяем товары и считаем сумму
-    subtotal_amount = Decimal("0")
-    discount_amount = Decimal("0")
-    order_items_info = []  # Для уведомления
-    
-    for item in order_data.items:
-        product = await db.fetch_one(
-            "SELECT * FROM products WHERE id = ? AND shop_id = ? AND is_active = 1",
-            (item.product_id, order_data.shop_id)
-        )
-        if not product:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Товар {item.product_id} не найден в магазине"
-            )
-        if not product["is_active"]:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Товар '{product['name']}' недоступен для заказа"
-            )
-        if product["quantity"] < item.quantity:
-            available = product["quantity"] or 0
-            raise HTTPException(
-                status_code=400,
-                detail=f"Недостаточно товара '{product['name']}' на складе. Доступно: {available}, требуется: {item.quantity}"
-            )
-        
-        price = Decimal(str(product["price"]))
-        discount_price = Decimal(str(product["discount_price"])) if product["discount_price"] else None
-        
-        if discount_price:
-            item_total = float(discount_price * item.quantity)
-            subtotal_amount += discount_price * item.quantity
-            discount_amount += (price - discount_price) * item.quantity
-        else:
-            item_total = float(price * item.quantity)
-            subtotal_amount += price * item.quantity
-        
-        # Сохраняем информацию о товаре для уведомления
-        order_items_info.append({
-            "name": product["name"],
-            "quantity": item.quantity,
-            "total": item_total
-        })
-    
-    # Проверяем и применяем промокод, если указан
-    promo_discount_amount = Decimal("0")
-    
-    # Определяем стоимость доставки в зависимости от типа доставки
-    delivery_type = (order_data.delivery_type or "delivery").strip().lower()  # По умолчанию доставка, нормализуем
-    is_pickup = delivery_type == "pickup"
-    
-    logger.info(f"[ORDER] Delivery type received: '{order_data.delivery_type}'")
-    logger.info(f"[ORDER] Delivery type normalized: '{delivery_type}', is_pickup: {is_pickup}")
-    
-    if is_pickup:
-        # При самовывозе доставка бесплатна
-        delivery_fee = Decimal("0")
-        logger.info(f"[ORDER] Pickup order - delivery fee set to 0")
-    else:
-        # Стандартная стоимость доставки
-        delivery_fee = Decimal("500")
-        logger.info(f"[ORDER] Delivery order - delivery fee set to 500")
-    
-    logger.info(f"[ORDER] Final delivery fee: {delivery_fee}, subtotal: {subtotal_amount}, total will be: {subtotal_amount - Decimal('0') + delivery_fee}")
-    
-    if order_data.promo_code:
-        from ..models.promo import PromoValidate
-        from ..routes.promo import validate_promo
-        
-        # Проверяем, является ли это первым заказом
-        user_orders = await db.fetch_one(
-            "SELECT COUNT(*) as count FROM orders WHERE user_id = ?",
-            (current_user.id,)
-        )
-        is_first_order = (user_orders and user_orders["count"] == 0) if user_orders else False
-        
-        # Валидируем промокод
-        promo_validate = PromoValidate(
-            code=order_data.promo_code,
-            shop_id=order_data.shop_id,
-            total_amount=subtotal_amount,
-            is_first_order=is_first_order
-        )
-        
-        # Получаем промокод напрямую через БД для валидации
-        promo = await db.fetch_one(
-            "SELECT * FROM promos WHERE code = ? AND is_active = 1",
-            (order_data.promo_code.upper().strip(),)
-        )
-        
-        if promo:
-            from datetime import date
-            from ..models.promo import PromoType
-            
-            today = date.today()
-            promo_valid = True
-            promo_type = PromoType(promo["promo_type"])
-            promo_value = Decimal(str(promo["value"]))
-            
-            # Проверка дат
-            if promo["valid_from"]:
-                valid_from = date.fromisoformat(promo["valid_from"]) if isinstance(promo["valid_from"], str) else promo["valid_from"]
-                if valid_from > today:
-                    promo_valid = False
-            if promo["valid_until"]:
-                valid_until = date.fromisoformat(promo["valid_until"]) if isinstance(promo["valid_until"], str) else promo["valid_until"]
-                if valid_until < today:
-                    promo_valid = False
-            
-            # Проверка условий
-            if promo_valid and promo["min_order_amount"]:
-                if subtotal_amount < Decimal(str(promo["min_order_amount"])):
-                    promo_valid = False
-            
-            if promo_valid and promo["shop_id"]:
-                if promo["shop_id"] != order_data.shop_id:
-                    promo_valid = False
-            
-            if promo_valid and promo["first_order_only"]:
-                if not is_first_order:
-                    promo_valid = False
-            
-            if promo_valid and promo["use_once"]:
-                used = await db.fetch_one(
-                    "SELECT COUNT(*) as count FROM orders WHERE user_id = ? AND promo_code = ?",
-                    (current_user.id, order_data.promo_code.upper().strip())
-                )
-                if used and used["count"] > 0:
-                    promo_valid = False
-            
-            # Промокод с бесплатной доставкой не применяется при самовывозе
-            if promo_valid and promo_type == PromoType.FREE_DELIVERY and is_pickup:
-                promo_valid = False
-            
-            # Вычисляем скидку
-            if promo_valid:
-                if promo_type == PromoType.PERCENT:
-                    promo_discount_amount = (subtotal_amount * promo_value) / 100
-                elif promo_type == PromoType.FIXED:
-                    promo_discount_amount = min(promo_value, subtotal_amount)
-                elif promo_type == PromoType.FREE_DELIVERY:
-                    # Промокод с бесплатной доставкой применяется только для доставки (не для самовывоза)
-                    if not is_pickup:
-                        delivery_fee = Decimal("0")
-                    promo_discount_amount = Decimal("0")
-                
-                # Увеличиваем счетчик использований промокода
-                await db.execute(
-                    "UPDATE promos SET usage_count = usage_count + 1 WHERE id = ?",
-                    (promo["id"],)
-                )
-    
-    # Итоговая сумма с учетом промокода и доставки
-    total_amount = subtotal_amount - promo_discount_amount + delivery_fee
-    logger.info(f"[ORDER] Final calculation: subtotal={subtotal_amount}, promo_discount={promo_discount_amount}, delivery_fee={delivery_fee}, total={total_amount}")
-    
-    # Создаём заказ
-    order_dict = order_data.model_dump(exclude={"items"})
-    order_dict["user_id"] = current_user.id
-    order_dict["order_number"] = generate_order_number()
-    order_dict["total_amount"] = float(total_amount)
-    order_dict["discount_amount"] = float(discount_amount)
-    order_dict["promo_discount_amount"] = float(promo_discount_amount)
-    order_dict["delivery_fee"] = float(delivery_fee)
-    
-    order_id = await db.insert("orders", order_dict)
-    
-    # Добавляем товары в заказ и обновляем остатки
-    for item in order_data.items:
-        # Получаем полную информацию о товаре для сохранения названия и себестоимости
-        product = await db.fetch_one(
-            "SELECT name, price, discount_price, cost_price FROM products WHERE id = ?",
-            (item.product_id,)
-        )
-        
-        # Сохраняем название товара и себестоимость в заказе (на случай, если товар будет удален или изменен)
-        await db.insert("order_items", {
-            "order_id": order_id,
-            "product_id": item.product_id,
-            "quantity": item.quantity,
-            "price": product["price"],
-            "discount_price": product["discount_price"],
-            "product_name": product["name"],  # Сохраняем название товара
-            "cost_price": product.get("cost_price")  # Сохраняем себестоимость на момент заказа
-        })
-        
-        # Уменьшаем остаток и увеличиваем счётчик продаж
-        await db.execute(
-            """UPDATE products 
-               SET quantity = quantity - ?, sales_count = sales_count + ?
-               WHERE id = ?""",
-            (item.quantity, item.quantity, item.product_id)
-        )
-    
-    await db.commit()
-    
-    # Удаляем товары из корзины
-    product_ids = [item.product_id for item in order_data.items]
-    placeholders = ",".join(["?" for _ in product_ids])
-    await db.execute(
-        f"DELETE FROM cart_items WHERE user_id = ? AND product_id IN ({placeholders})",
-        (current_user.id,) + tuple(product_ids)
-    )
-    await db.commit()
-    
-    order = await db.fetch_one("SELECT * FROM orders WHERE id = ?", (order_id,))
-    
     # Форматируем дату и время доставки для уведомлений
     delivery_date_str = None
-    delivery_time_str = None
+    delivery_time_str = order_data.delivery_time
     
     if order_data.delivery_date:
-        from datetime import datetime
         try:
             if isinstance(order_data.delivery_date, str):
                 delivery_date_obj = datetime.fromisoformat(order_data.delivery_date)
@@ -504,71 +176,282 @@ async def create_order(
         except:
             delivery_date_str = str(order_data.delivery_date)
     
-    delivery_time_str = order_data.delivery_time
-    
-    # Отправляем уведомление владельцу магазина в Telegram
-    if shop.get("telegram_id"):
-        try:
-            await telegram_notifier.send_order_notification(
-                shop_owner_telegram_id=shop["telegram_id"],
-                order_number=order_dict["order_number"],
-                customer_name=order_data.recipient_name,
-                customer_phone=order_data.recipient_phone,
-                delivery_address=order_data.delivery_address,
-                items=order_items_info,
-                total_amount=float(total_amount),
-                promo_code=order_data.promo_code if order_data.promo_code else None,
-                promo_discount=float(promo_discount_amount),
-                delivery_fee=float(delivery_fee),
-                delivery_date=delivery_date_str,
-                delivery_time=delivery_time_str,
-                customer_telegram_id=current_user.telegram_id,
-                delivery_type=order_data.delivery_type or "delivery",
-                gift_message=order_data.gift_message
-            )
-        except Exception as e:
-            # Не прерываем выполнение, если уведомление не отправилось
-            import traceback
-            print(f"[ERROR] Failed to send order notification to shop owner: {e}")
-            traceback.print_exc()
-    
-    # Отправляем сообщение с подтверждением заказа покупателю
-    if current_user.telegram_id:
+    # Дата для временного слота в подтверждении покупателю
+    delivery_date_for_slot = None
+    if order_data.delivery_date:
         try:
-            # Форматируем дату для временного слота
-            delivery_date_for_slot = None
-            if order_data.delivery_date:
+            if isinstance(order_data.delivery_date, str):
                 try:
-                    if isinstance(order_data.delivery_date, str):
-                        try:
-                            date_obj = datetime.strptime(order_data.delivery_date, "%Y-%m-%d")
-                        except:
-                            date_obj = datetime.strptime(order_data.delivery_date, "%d.%m.%Y")
-                        delivery_date_for_slot = date_obj.strftime("%d.%m.%Y")
-                    else:
-                        delivery_date_for_slot = order_data.delivery_date.strftime("%d.%m.%Y")
+                    date_obj = datetime.strptime(order_data.delivery_date, "%Y-%m-%d")
                 except:
-                    delivery_date_for_slot = str(order_data.delivery_date)
-            
-            await telegram_notifier.send_order_confirmation_to_customer(
-                customer_telegram_id=current_user.telegram_id,
-                order_number=order_dict["order_number"],
-                customer_name=order_data.recipient_name,
-                customer_phone=order_data.recipient_phone,
-                delivery_address=order_data.delivery_address,
-                delivery_date=delivery_date_for_slot,
-                delivery_time=delivery_time_str,
-                items=order_items_info,
-                delivery_fee=float(delivery_fee),
-                total_amount=float(total_amount),
-                delivery_type=order_data.delivery_type or "delivery",
-                shop_owner_username=shop.get("username")
+                    date_obj = datetime.strptime(order_data.delivery_date, "%d.%m.%Y")
+                delivery_date_for_slot = date_obj.strftime("%d.%m.%Y")
+            else:
+                delivery_date_for_slot = order_data.delivery_date.strftime("%d.%m.%Y")
+        except:
+            delivery_date_for_slot = str(order_data.delivery_date)
+    
+    # Проверка остатков, заказ, позиции, списание остатков и очистка корзины — одна
+    # транзакция BEGIN IMMEDIATE: остатки не меняются между проверкой и списанием,
+    # а при любой ошибке не остаётся частично созданного заказа
+    async with db.transaction() as tx:
+        # Все товары заказа одним запросом; available — остаток за вычетом чужих резервов
+        product_ids = list(dict.fromkeys(item.product_id for item in order_data.items))
+        products = await load_available_products(tx, current_user.id, order_data.shop_id, product_ids)
+        
+        # Одна позиция товара может встречаться в заказе несколько раз
+        requested = Counter()
+        for item in order_data.items:
+            requested[item.product_id] += item.quantity
+        
+        # Проверяем товары и считаем сумму
+        subtotal_amount = Decimal("0")
+        discount_amount = Decimal("0")
+        order_items_info = []  # Для уведомления
+        
+        for item in order_data.items:
+            product = products.get(item.product_id)
+            if not product:
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Товар {item.product_id} не найден в магазине"
+                )
+            if product["available"] < requested[item.product_id]:
+                available = max(product["available"] or 0, 0)
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Недостаточно товара '{product['name']}' на складе. Доступно: {available}, требуется: {requested[item.product_id]}"
+                )
+        
+            price = Decimal(str(product["price"]))
+            discount_price = Decimal(str(product["discount_price"])) if product["discount_price"] else None
+        
+            if discount_price:
+                item_total = float(discount_price * item.quantity)
+                subtotal_amount += discount_price * item.quantity
+                discount_amount += (price - discount_price) * item.quantity
+            else:
+                item_total = float(price * item.quantity)
+                subtotal_amount += price * item.quantity
+        
+            # Сохраняем информацию о товаре для уведомления
+            order_items_info.append({
+                "name": product["name"],
+                "quantity": item.quantity,
+                "total": item_total
+            })
+        
+        # Проверяем и применяем промокод, если указан
+        promo_discount_amount = Decimal("0")
+        
+        # Определяем стоимость доставки в зависимости от типа доставки
+        delivery_type = (order_data.delivery_type or "delivery").strip().lower()  # По умолчанию доставка, нормализуем
+        is_pickup = delivery_type == "pickup"
+        
+        logger.info(f"[ORDER] Delivery type received: '{order_data.delivery_type}'")
+        logger.info(f"[ORDER] Delivery type normalized: '{delivery_type}', is_pickup: {is_pickup}")
+        
+        if is_pickup:
+            # При самовывозе доставка бесплатна
+            delivery_fee = Decimal("0")
+            logger.info(f"[ORDER] Pickup order - delivery fee set to 0")
+        else:
+            # Стандартная стоимость доставки
+            delivery_fee = Decimal("500")
+            logger.info(f"[ORDER] Delivery order - delivery fee set to 500")
+        
+        logger.info(f"[ORDER] Final delivery fee: {delivery_fee}, subtotal: {subtotal_amount}, total will be: {subtotal_amount - Decimal('0') + delivery_fee}")
+        
+        if order_data.promo_code:
+            from ..models.promo import PromoValidate
+            from ..routes.promo import validate_promo
+        
+            # Проверяем, является ли это первым заказом
+            user_orders = await tx.fetch_one(
+                "SELECT COUNT(*) as count FROM orders WHERE user_id = ?",
+                (current_user.id,)
+            )
+            is_first_order = (user_orders and user_orders["count"] == 0) if user_orders else False
+        
+            # Валидируем промокод
+            promo_validate = PromoValidate(
+                code=order_data.promo_code,
+                shop_id=order_data.shop_id,
+                total_amount=subtotal_amount,
+                is_first_order=is_first_order
+            )
+        
+            # Получаем промокод напрямую через БД для валидации
+            promo = await tx.fetch_one(
+                "SELECT * FROM promos WHERE code = ? AND is_active = 1",
+                (order_data.promo_code.upper().strip(),)
             )
-        except Exception as e:
-            # Не прерываем выполнение, если уведомление не отправилось
-            import traceback
-            print(f"[ERROR] Failed to send order confirmation to customer: {e}")
-            traceback.print_exc()
+        
+            if promo:
+                from datetime import date
+                from ..models.promo import PromoType
+        
+                today = date.today()
+                promo_valid = True
+                promo_type = PromoType(promo["promo_type"])
+                promo_value = Decimal(str(promo["value"]))
+        
+                # Проверка дат
+                if promo["valid_from"]:
+                    valid_from = date.fromisoformat(promo["valid_from"]) if isinstance(promo["valid_from"], str) else promo["valid_from"]
+                    if valid_from > today:
+                        promo_valid = False
+                if promo["valid_until"]:
+                    valid_until = date.fromisoformat(promo["valid_until"]) if isinstance(promo["valid_until"], str) else promo["valid_until"]
+                    if valid_until < today:
+                        promo_valid = False
+        
+                # Проверка условий
+                if promo_valid and promo["min_order_amount"]:
+                    if subtotal_amount < Decimal(str(promo["min_order_amount"])):
+                        promo_valid = False
+        
+                if promo_valid and promo["shop_id"]:
+                    if promo["shop_id"] != order_data.shop_id:
+                        promo_valid = False
+        
+                if promo_valid and promo["first_order_only"]:
+                    if not is_first_order:
+                        promo_valid = False
+        
+                if promo_valid and promo["use_once"]:
+                    used = await tx.fetch_one(
+                        "SELECT COUNT(*) as count FROM orders WHERE user_id = ? AND promo_code = ?",
+                        (current_user.id, order_data.promo_code.upper().strip())
+                    )
+                    if used and used["count"] > 0:
+                        promo_valid = False
+        
+                # Промокод с бесплатной доставкой не применяется при самовывозе
+                if promo_valid and promo_type == PromoType.FREE_DELIVERY and is_pickup:
+                    promo_valid = False
+        
+                # Вычисляем скидку
+                if promo_valid:
+                    if promo_type == PromoType.PERCENT:
+                        promo_discount_amount = (subtotal_amount * promo_value) / 100
+                    elif promo_type == PromoType.FIXED:
+                        promo_discount_amount = min(promo_value, subtotal_amount)
+                    elif promo_type == PromoType.FREE_DELIVERY:
+                        # Промокод с бесплатной доставкой применяется только для доставки (не для самовывоза)
+                        if not is_pickup:
+                            delivery_fee = Decimal("0")
+                        promo_discount_amount = Decimal("0")
+        
+                    # Увеличиваем счетчик использований промокода
+                    await tx.execute(
+                        "UPDATE promos SET usage_count = usage_count + 1 WHERE id = ?",
+                        (promo["id"],)
+                    )
+        
+        # Итоговая сумма с учетом промокода и доставки
+        total_amount = subtotal_amount - promo_discount_amount + delivery_fee
+        logger.info(f"[ORDER] Final calculation: subtotal={subtotal_amount}, promo_discount={promo_discount_amount}, delivery_fee={delivery_fee}, total={total_amount}")
+        
+        # Создаём заказ
+        order_dict = order_data.model_dump(exclude={"items"})
+        order_dict["user_id"] = current_user.id
+        order_dict["order_number"] = generate_order_number()
+        order_dict["total_amount"] = float(total_amount)
+        order_dict["discount_amount"] = float(discount_amount)
+        order_dict["promo_discount_amount"] = float(promo_discount_amount)
+        order_dict["delivery_fee"] = float(delivery_fee)
+        
+        order_id = await tx.insert("orders", order_dict, commit=False)
+        
+        # Сохраняем название товара и себестоимость в заказе (на случай, если товар будет удален или изменен)
+        await tx.executemany(
+            """INSERT INTO order_items
+                   (order_id, product_id, quantity, price, discount_price, product_name, cost_price)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (
+                    order_id,
+                    item.product_id,
+                    item.quantity,
+                    products[item.product_id]["price"],
+                    products[item.product_id]["discount_price"],
+                    products[item.product_id]["name"],
+                    products[item.product_id].get("cost_price"),
+                )
+                for item in order_data.items
+            ]
+        )
+        
+        # Уменьшаем остаток и увеличиваем счётчик продаж. Списание условное: строка
+        # обновляется, только если остатка за вычетом чужих резервов хватает,
+        # поэтому конкурирующий заказ не уведёт остаток в минус (проверка по rowcount)
+        cursor = await tx.executemany(
+            f"""UPDATE products 
+               SET quantity = quantity - ?, sales_count = sales_count + ?
+               WHERE id = ? AND quantity - {held_by_others()} >= ?""",
+            [
+                (item.quantity, item.quantity, item.product_id, current_user.id, item.quantity)
+                for item in order_data.items
+            ]
+        )
+        if cursor.rowcount != len(order_data.items):
+            raise HTTPException(status_code=409, detail="Остатки товаров изменились, повторите заказ")
+        
+        # Резерв покупателя выполнен заказом
+        await release_holds(tx, current_user.id, commit=False)
+        
+        # Удаляем товары из корзины
+        placeholders = ",".join(["?" for _ in product_ids])
+        await tx.execute(
+            f"DELETE FROM cart_items WHERE user_id = ? AND product_id IN ({placeholders})",
+            (current_user.id,) + tuple(product_ids)
+        )
+        
+        # Уведомления владельцу магазина и покупателю уходят через очередь после commit:
+        # ответ на оформление не ждёт Telegram, а уведомление не теряется при сбое
+        if shop.get("telegram_id"):
+            # В уведомлении — время оформления, а не отправки (очередь может задержать её)
+            created = await tx.fetch_one("SELECT created_at FROM orders WHERE id = ?", (order_id,))
+            await enqueue_notification(tx, "order_created", {
+                "shop_owner_telegram_id": shop["telegram_id"],
+                "order_number": order_dict["order_number"],
+                "customer_name": order_data.recipient_name,
+                "customer_phone": order_data.recipient_phone,
+                "delivery_address": order_data.delivery_address,
+                "items": order_items_info,
+                "total_amount": float(total_amount),
+                "promo_code": order_data.promo_code if order_data.promo_code else None,
+                "promo_discount": float(promo_discount_amount),
+                "delivery_fee": float(delivery_fee),
+                "delivery_date": delivery_date_str,
+                "delivery_time": delivery_time_str,
+                "customer_telegram_id": current_user.telegram_id,
+                "delivery_type": order_data.delivery_type or "delivery",
+                "gift_message": order_data.gift_message,
+                "created_at": created["created_at"] if created else None,
+            })
+        if current_user.telegram_id:
+            await enqueue_notification(tx, "order_confirmation", {
+                "customer_telegram_id": current_user.telegram_id,
+                "order_number": order_dict["order_number"],
+                "customer_name": order_data.recipient_name,
+                "customer_phone": order_data.recipient_phone,
+                "delivery_address": order_data.delivery_address,
+                "delivery_date": delivery_date_for_slot,
+                "delivery_time": delivery_time_str,
+                "items": order_items_info,
+                "delivery_fee": float(delivery_fee),
+                "total_amount": float(total_amount),
+                "delivery_type": order_data.delivery_type or "delivery",
+                "shop_owner_username": shop.get("username"),
+            })
+    
+    wake_notification_outbox()
+    # Проданные товары могли закончиться — витрина и карточка магазина не должны их показывать
+    await publish_stock_change(db, order_data.shop_id, product_ids)
+    
+    order = await db.fetch_one("SELECT * FROM orders WHERE id = ?", (order_id,))
     
     return Order(**order)
 
@@ -598,43 +481,35 @@ async def update_order_status(
     
     old_status = order["status"]
     
-    await db.update("orders", {"status": status}, "id = ?", (order_id,))
-    await db.commit()
-    
-    updated_order = await db.fetch_one("SELECT * FROM orders WHERE id = ?", (order_id,))
-    
-    # Отправляем уведомление покупателю о смене статуса
+    # Уведомление покупателю ставится в очередь в той же транзакции, что и смена статуса
+    buyer = None
     if old_status != status:
         print(f"[ORDER STATUS] Status changed from '{old_status}' to '{status}' for order {order_id}")
-        
-        # Получаем telegram_id покупателя
         buyer = await db.fetch_one(
             "SELECT telegram_id FROM users WHERE id = ?",
             (order["user_id"],)
         )
-        
-        print(f"[ORDER STATUS] Buyer user_id: {order['user_id']}, telegram_id: {buyer.get('telegram_id') if buyer else 'NOT FOUND'}")
-        
+    
+    async with db.transaction() as tx:
+        await tx.update("orders", {"status": status}, "id = ?", (order_id,), commit=False)
         if buyer and buyer.get("telegram_id"):
-            try:
-                print(f"[ORDER STATUS] Sending notification to telegram_id: {buyer['telegram_id']}")
-                result = await telegram_notifier.send_order_status_notification(
-                    customer_telegram_id=buyer["telegram_id"],
-                    order_id=order_id,
-                    order_number=order["order_number"],
-                    shop_id=order["shop_id"],
-                    shop_name=order["shop_name"],
-                    new_status=status,
-                    total_amount=float(order["total_amount"])
-                )
-                print(f"[ORDER STATUS] Notification sent: {result}")
-            except Exception as e:
-                # Не прерываем выполнение, если уведомление не отправилось
-                import traceback
-                print(f"[ERROR] Failed to send status notification: {e}")
-                traceback.print_exc()
-        else:
+            await enqueue_notification(tx, "order_status", {
+                "customer_telegram_id": buyer["telegram_id"],
+                "order_id": order_id,
+                "order_number": order["order_number"],
+                "shop_id": order["shop_id"],
+                "shop_name": order["shop_name"],
+                "new_status": status,
+                "total_amount": float(order["total_amount"]),
+            })
+        elif old_status != status:
             print(f"[ORDER STATUS] No telegram_id found for buyer, skipping notification")
+    wake_notification_outbox()
+    if "delivered" in (old_status, status) and old_status != status:
+        # Карточка магазина показывает число выполненных заказов
+        await publish_invalidation(db, f"shop:{order['shop_id']}")
+    
+    updated_order = await db.fetch_one("SELECT * FROM orders WHERE id = ?", (order_id,))
     
     return Order(**updated_order)
 
@@ -656,18 +531,26 @@ async def cancel_order(
     if order["status"] not in ("pending", "confirmed"):
         raise HTTPException(status_code=400, detail="Cannot cancel order in this status")
     
-    # Возвращаем товары на склад
-    items = await db.fetch_all(
-        "SELECT product_id, quantity FROM order_items WHERE order_id = ?",
-        (order_id,)
-    )
-    for item in items:
-        await db.execute(
+    # Возврат на склад и смена статуса — одна транзакция; статус переключается
+    # условно, чтобы повторная отмена не вернула товары дважды
+    async with db.transaction() as tx:
+        cursor = await tx.execute(
+            "UPDATE orders SET status = 'cancelled' WHERE id = ? AND status IN ('pending', 'confirmed')",
+            (order_id,)
+        )
+        if not cursor.rowcount:
+            raise HTTPException(status_code=400, detail="Cannot cancel order in this status")
+        items = await tx.fetch_all(
+            "SELECT product_id, quantity FROM order_items WHERE order_id = ?",
+            (order_id,)
+        )
+        await tx.executemany(
             "UPDATE products SET quantity = quantity + ?, sales_count = sales_count - ? WHERE id = ?",
-            (item["quantity"], item["quantity"], item["product_id"])
+            [(item["quantity"], item["quantity"], item["product_id"]) for item in items]
         )
     
-    await db.update("orders", {"status": "cancelled"}, "id = ?", (order_id,))
+    product_ids = list(dict.fromkeys(item["product_id"] for item in items if item["product_id"]))
+    await publish_stock_change(db, order["shop_id"], product_ids)
     
     return {"message": "Order cancelled"}
 
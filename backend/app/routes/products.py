@@ -2,20 +2,91 @@
 API Routes для товаров.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Request, Request
+import json
+from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Request, Request, Response
 from typing import List, Optional
 
 from ..models.product import Product, ProductCreate, ProductUpdate, ProductWithMedia, ProductMedia
 from ..models.user import User
+from ..services.cache_invalidation import product_tags, publish_invalidation, shop_tags
+from ..services.category_tree import category_tree
 from ..services.database import DatabaseService, get_db
+from ..services.media_loader import load_product_media
 from ..services.media import get_media_service
+from ..services.image_variants import generate_variants
+from ..services.pagination import keyset_condition, next_cursor, parse_cursor, set_next_cursor
+from ..services.product_search import build_match_query, RANK_EXPRESSION
+from ..services.response_cache import response_cache
+from ..services.search_index import search_index
+from ..services.subscription_manager import SHOP_VISIBLE_CONDITION
+from ..services.suggest_index import suggest_index
+from ..services import catalog_events
 from .users import get_current_user
 
 router = APIRouter()
 
+# Витрина: активные товары активных магазинов с действующей подпиской
+CATALOG_VISIBILITY_CONDITIONS = [
+    "p.is_active = 1", 
+    "s.is_active = 1",
+    SHOP_VISIBLE_CONDITION,
+]
+
+PRODUCT_LIST_SELECT = """SELECT p.*, 
+                   s.name as shop_name,
+                   s.id as shop_id,
+                   s.average_rating as shop_rating,
+                   (SELECT COUNT(*) FROM shop_reviews WHERE shop_id = s.id) as shop_reviews_count,
+                   c.name as category_name"""
+
+# Ключ сортировки витрины (по убыванию) для курсорной пагинации
+PRODUCT_SORT_KEY = ("is_trending", "created_at", "id")
+
+# TTL кэша подборок (трендовые, со скидкой), секунд
+COLLECTIONS_CACHE_TTL = 60
+
+
+async def build_product_list(db: DatabaseService, products) -> List[dict]:
+    """Готовит строки товаров для ответа: типы рейтинга и отзывов, медиа."""
+    # Медиа всех товаров страницы одним запросом
+    media_by_product = await load_product_media(db, [p["id"] for p in products])
+    result = []
+    for product in products:
+        product_dict = dict(product)
+        
+        # Преобразуем Decimal в float для JSON сериализации
+        if product_dict.get("shop_rating") is not None:
+            from decimal import Decimal
+            if isinstance(product_dict["shop_rating"], Decimal):
+                product_dict["shop_rating"] = float(product_dict["shop_rating"])
+            elif isinstance(product_dict["shop_rating"], str):
+                try:
+                    product_dict["shop_rating"] = float(product_dict["shop_rating"])
+                except (ValueError, TypeError):
+                    product_dict["shop_rating"] = None
+        
+        # Преобразуем shop_reviews_count в int
+        if product_dict.get("shop_reviews_count") is not None:
+            if isinstance(product_dict["shop_reviews_count"], str):
+                try:
+                    product_dict["shop_reviews_count"] = int(product_dict["shop_reviews_count"])
+                except (ValueError, TypeError):
+                    product_dict["shop_reviews_count"] = 0
+            elif not isinstance(product_dict["shop_reviews_count"], int):
+                product_dict["shop_reviews_count"] = int(product_dict["shop_reviews_count"]) if product_dict["shop_reviews_count"] else 0
+        
+        media = media_by_product.get(product["id"], [])
+        product_dict["media"] = media
+        product_dict["primary_image"] = media[0]["url"] if media else None
+        result.append(product_dict)
+    
+    return result
+
 
 @router.get("/", response_model=List[dict])
 async def get_products(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     category_id: Optional[int] = None,
@@ -25,20 +96,15 @@ async def get_products(
     trending: Optional[bool] = None,
     discounted: Optional[bool] = None,
     in_stock: Optional[bool] = Query(None, description="Только товары в наличии (quantity > 0)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
     db: DatabaseService = Depends(get_db)
 ):
-    """Получает список товаров с фильтрацией."""
+    """
+    Получает список товаров с фильтрацией.
+    Без поиска поддерживается курсор: с ним skip не используется.
+    """
     # Добавляем проверку подписки: показываем только товары магазинов с активной подпиской
-    conditions = [
-        "p.is_active = 1", 
-        "s.is_active = 1",
-        """EXISTS (
-            SELECT 1 FROM shop_subscriptions ss 
-            WHERE ss.shop_id = s.id 
-            AND ss.is_active = 1 
-            AND ss.end_date > datetime('now')
-        )"""
-    ]
+    conditions = list(CATALOG_VISIBILITY_CONDITIONS)
     params = []
     
     # По умолчанию показываем только товары в наличии
@@ -46,73 +112,25 @@ async def get_products(
         conditions.append("p.quantity > 0")
     
     if category_id:
-        # Включаем подкатегории
-        subcats = await db.fetch_all(
-            "SELECT id FROM categories WHERE parent_id = ?", (category_id,)
-        )
-        cat_ids = [category_id] + [s["id"] for s in subcats]
+        # Включаем подкатегории любой глубины (из кэша дерева категорий)
+        if not category_tree.index.ready:
+            await category_tree.rebuild(db)
+        cat_ids = category_tree.index.descendants(category_id)
         placeholders = ",".join(["?" for _ in cat_ids])
         conditions.append(f"p.category_id IN ({placeholders})")
         params.extend(cat_ids)
     
-    if search:
-        # Умный поиск: разбиваем на слова
-        # Для одного слова - ищем в любом месте
-        # Для нескольких слов - ищем все слова (AND)
-        # Используем LIKE с COLLATE NOCASE для case-insensitive поиска (работает с кириллицей)
-        search_normalized = search.strip()
-        words = [w.strip() for w in search_normalized.split() if len(w.strip()) >= 1]  # Минимум 1 символ
-        
-        # Используем простой LIKE без COLLATE NOCASE в WHERE (может не работать с кириллицей)
-        # Фильтрацию по регистру будем делать в Python после получения результатов
-        if len(words) == 1:
-            # Одно слово - ищем в любом месте названия, описания или магазина
-            word = words[0]
-            # Ищем слово в любом регистре (используем несколько вариантов)
-            conditions.append(
-                "(p.name LIKE ? OR p.name LIKE ? OR p.name LIKE ? OR "
-                "p.description LIKE ? OR p.description LIKE ? OR p.description LIKE ? OR "
-                "s.name LIKE ? OR s.name LIKE ? OR s.name LIKE ?)"
-            )
-            # Добавляем варианты: как есть, с заглавной, с маленькой
-            word_variants = [word, word.capitalize(), word.upper(), word.lower()]
-            params.extend([
-                f"%{word_variants[0]}%", f"%{word_variants[1]}%", f"%{word_variants[2]}%",
-                f"%{word_variants[0]}%", f"%{word_variants[1]}%", f"%{word_variants[2]}%",
-                f"%{word_variants[0]}%", f"%{word_variants[1]}%", f"%{word_variants[2]}%"
-            ])
-        elif len(words) > 1:
-            # Несколько слов - ищем все слова (AND между словами)
-            word_conditions = []
-            for word in words:
-                # Ищем слово в названии, описании или названии магазина
-                word_variants = [word, word.capitalize(), word.upper(), word.lower()]
-                word_conditions.append(
-                    "(p.name LIKE ? OR p.name LIKE ? OR p.name LIKE ? OR "
-                    "p.description LIKE ? OR p.description LIKE ? OR p.description LIKE ? OR "
-                    "s.name LIKE ? OR s.name LIKE ? OR s.name LIKE ?)"
-                )
-                params.extend([
-                    f"%{word_variants[0]}%", f"%{word_variants[1]}%", f"%{word_variants[2]}%",
-                    f"%{word_variants[0]}%", f"%{word_variants[1]}%", f"%{word_variants[2]}%",
-                    f"%{word_variants[0]}%", f"%{word_variants[1]}%", f"%{word_variants[2]}%"
-                ])
-            
-            # Объединяем условия слов через AND (найти все слова)
-            conditions.append(f"({' AND '.join(word_conditions)})")
-        else:
-            # Если запрос пустой после обработки, ищем всю фразу
-            search_variants = [search_normalized, search_normalized.capitalize(), search_normalized.upper(), search_normalized.lower()]
-            conditions.append(
-                "(p.name LIKE ? OR p.name LIKE ? OR p.name LIKE ? OR "
-                "p.description LIKE ? OR p.description LIKE ? OR p.description LIKE ? OR "
-                "s.name LIKE ? OR s.name LIKE ? OR s.name LIKE ?)"
-            )
-            params.extend([
-                f"%{search_variants[0]}%", f"%{search_variants[1]}%", f"%{search_variants[2]}%",
-                f"%{search_variants[0]}%", f"%{search_variants[1]}%", f"%{search_variants[2]}%",
-                f"%{search_variants[0]}%", f"%{search_variants[1]}%", f"%{search_variants[2]}%"
-            ])
+    # Полнотекстовый поиск (FTS5): все слова запроса, каждое как префикс
+    match_query = build_match_query(search) if search else None
+    if search and search.strip() and not match_query:
+        # В запросе нет ни одного слова (например, только знаки) — ничего не нашлось,
+        # а не весь каталог
+        return []
+    fts_join = ""
+    if match_query:
+        fts_join = "JOIN products_fts ON products_fts.rowid = p.id"
+        conditions.append("products_fts MATCH ?")
+        params.append(match_query)
     
     if min_price is not None:
         conditions.append("COALESCE(p.discount_price, p.price) >= ?")
@@ -128,43 +146,27 @@ async def get_products(
     if discounted:
         conditions.append("p.discount_price IS NOT NULL")
     
-    where_clause = " AND ".join(conditions)
+    # Курсор — по ключу сортировки витрины; у поиска порядок по релевантности, там только skip
+    sort_columns = [f"p.{key}" for key in PRODUCT_SORT_KEY]
+    cursor_values = None if match_query else parse_cursor(cursor, sort_columns)
+    if cursor_values:
+        conditions.append(keyset_condition(sort_columns))
+        params.extend(cursor_values)
+        skip = 0
     
-    # Строим ORDER BY с учётом релевантности поиска
-    order_by = "p.is_trending DESC, p.created_at DESC"
+    where_clause = " AND ".join(conditions)
     
-    if search:
-        search_normalized = search.strip()
-        words = [w.strip() for w in search_normalized.split() if len(w.strip()) >= 1]
-        
-        if words:
-            # Создаём score для релевантности: чем больше слов совпало, тем выше
-            relevance_parts = []
-            for word in words:
-                # +10 за совпадение в названии, +5 за совпадение в описании, +3 за магазин
-                # Используем COLLATE NOCASE для case-insensitive поиска
-                relevance_parts.append(f"(CASE WHEN p.name LIKE '%{word}%' COLLATE NOCASE THEN 10 ELSE 0 END)")
-                relevance_parts.append(f"(CASE WHEN p.description LIKE '%{word}%' COLLATE NOCASE THEN 5 ELSE 0 END)")
-                relevance_parts.append(f"(CASE WHEN s.name LIKE '%{word}%' COLLATE NOCASE THEN 3 ELSE 0 END)")
-            
-            # Дополнительные баллы за точное совпадение названия
-            relevance_parts.append(f"(CASE WHEN p.name = '{search_normalized}' COLLATE NOCASE THEN 100 ELSE 0 END)")
-            # Баллы если название начинается с поискового запроса
-            relevance_parts.append(f"(CASE WHEN p.name LIKE '{search_normalized}%' COLLATE NOCASE THEN 50 ELSE 0 END)")
-            
-            relevance_score = " + ".join(relevance_parts)
-            order_by = f"({relevance_score}) DESC, p.is_trending DESC, p.created_at DESC"
+    # Результаты поиска — по релевантности (bm25), затем обычный порядок
+    order_by = "p.is_trending DESC, p.created_at DESC, p.id DESC"
+    if match_query:
+        order_by = f"{RANK_EXPRESSION}, {order_by}"
     
     params.extend([limit, skip])
     
     products = await db.fetch_all(
-        f"""SELECT p.*, 
-                   s.name as shop_name,
-                   s.id as shop_id,
-                   s.average_rating as shop_rating,
-                   (SELECT COUNT(*) FROM shop_reviews WHERE shop_id = s.id) as shop_reviews_count,
-                   c.name as category_name
+        f"""{PRODUCT_LIST_SELECT}
             FROM products p
+            {fts_join}
             JOIN shops s ON p.shop_id = s.id
             LEFT JOIN categories c ON p.category_id = c.id
             WHERE {where_clause}
@@ -173,73 +175,66 @@ async def get_products(
         tuple(params)
     )
     
-    # Дополнительная фильтрация в Python для case-insensitive поиска с кириллицей
-    if search:
-        search_lower = search.lower().strip()
-        words = [w.strip() for w in search_lower.split() if len(w.strip()) >= 1]
-        
-        def matches_search(product_dict):
-            """Проверяет, соответствует ли товар поисковому запросу (case-insensitive)."""
-            name = (product_dict.get('name') or '').lower()
-            description = (product_dict.get('description') or '').lower()
-            shop_name = (product_dict.get('shop_name') or '').lower()
-            
-            if len(words) == 1:
-                # Одно слово - ищем в любом месте
-                word = words[0]
-                return word in name or word in description or word in shop_name
-            elif len(words) > 1:
-                # Несколько слов - все слова должны быть найдены
-                for word in words:
-                    if word not in name and word not in description and word not in shop_name:
-                        return False
-                return True
-            return False
-        
-        # Фильтруем результаты
-        products = [p for p in products if matches_search(dict(p))]
-    
-    # Получаем все медиа для каждого товара
-    result = []
-    for product in products:
-        product_dict = dict(product)
-        
-        # Преобразуем Decimal в float для JSON сериализации
-        if product_dict.get("shop_rating") is not None:
-            from decimal import Decimal
-            if isinstance(product_dict["shop_rating"], Decimal):
-                product_dict["shop_rating"] = float(product_dict["shop_rating"])
-            elif isinstance(product_dict["shop_rating"], str):
-                try:
-                    product_dict["shop_rating"] = float(product_dict["shop_rating"])
-                except (ValueError, TypeError):
-                    product_dict["shop_rating"] = None
-        
-        # Преобразуем shop_reviews_count в int
-        if product_dict.get("shop_reviews_count") is not None:
-            if isinstance(product_dict["shop_reviews_count"], str):
-                try:
-                    product_dict["shop_reviews_count"] = int(product_dict["shop_reviews_count"])
-                except (ValueError, TypeError):
-                    product_dict["shop_reviews_count"] = 0
-            elif not isinstance(product_dict["shop_reviews_count"], int):
-                product_dict["shop_reviews_count"] = int(product_dict["shop_reviews_count"]) if product_dict["shop_reviews_count"] else 0
-        
-        media = await db.fetch_all(
-            """SELECT id, media_type, url, is_primary, sort_order 
-               FROM product_media 
-               WHERE product_id = ? 
-               ORDER BY 
-                   CASE WHEN media_type = 'video' THEN 0 ELSE 1 END,
-                   is_primary DESC, 
-                   sort_order""",
-            (product["id"],)
+    if not match_query:
+        set_next_cursor(response, next_cursor(products, limit, PRODUCT_SORT_KEY))
+    return await build_product_list(db, products)
+
+
+@router.get("/search", response_model=List[dict])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: DatabaseService = Depends(get_db)
+):
+    """
+    Поиск с учётом словоформ, по префиксу последнего слова и с опечаткой в одну букву.
+    Ранжирование — в памяти (search_index), видимость товаров проверяется в базе.
+    """
+    if not search_index.index.ready:
+        await search_index.rebuild(db)
+    index = search_index.index
+    scores = index.search(q)
+    if not scores:
+        return []
+    
+    # Берём лучших кандидатов с запасом на скрытые товары и расширяем окно, пока не хватит
+    needed = skip + limit
+    window = max(needed * 2, 50)
+    visible = []
+    while True:
+        ranked_ids = index.top(scores, window)
+        placeholders = ",".join("?" * len(ranked_ids))
+        where_clause = " AND ".join(
+            CATALOG_VISIBILITY_CONDITIONS + ["p.quantity > 0", f"p.id IN ({placeholders})"]
         )
-        product_dict["media"] = [dict(m) for m in media]
-        product_dict["primary_image"] = media[0]["url"] if media else None
-        result.append(product_dict)
+        rows = await db.fetch_all(
+            f"""{PRODUCT_LIST_SELECT}
+                FROM products p
+                JOIN shops s ON p.shop_id = s.id
+                LEFT JOIN categories c ON p.category_id = c.id
+                WHERE {where_clause}""",
+            tuple(ranked_ids)
+        )
+        rows_by_id = {row["id"]: row for row in rows}
+        visible = [rows_by_id[pid] for pid in ranked_ids if pid in rows_by_id]
+        if len(visible) >= needed or window >= len(scores):
+            break
+        window *= 4
     
-    return result
+    return await build_product_list(db, visible[skip:needed])
+
+
+@router.get("/suggest", response_model=List[dict])
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """
+    Подсказки при вводе: названия товаров, магазинов и категорий.
+    Отвечает из in-memory индекса (suggest_index), база не используется.
+    """
+    return suggest_index.index.suggest(q, limit)
 
 
 @router.get("/trending", response_model=List[dict])
@@ -248,24 +243,23 @@ async def get_trending_products(
     db: DatabaseService = Depends(get_db)
 ):
     """Получает трендовые товары."""
-    products = await db.fetch_all(
-        """SELECT p.*, 
-                  s.name as shop_name,
-                  (SELECT url FROM product_media WHERE product_id = p.id AND is_primary = 1 LIMIT 1) as primary_image
-           FROM products p
-           JOIN shops s ON p.shop_id = s.id
-           WHERE p.is_active = 1 AND p.is_trending = 1 AND p.quantity > 0 AND s.is_active = 1
-           AND EXISTS (
-               SELECT 1 FROM shop_subscriptions ss 
-               WHERE ss.shop_id = s.id 
-               AND ss.is_active = 1 
-               AND ss.end_date > datetime('now')
-           )
-           ORDER BY p.views_count DESC
-           LIMIT ?""",
-        (limit,)
+    async def load():
+        return await db.fetch_all(
+            f"""SELECT p.*, 
+                      s.name as shop_name,
+                      (SELECT url FROM product_media WHERE product_id = p.id AND is_primary = 1 LIMIT 1) as primary_image
+               FROM products p
+               JOIN shops s ON p.shop_id = s.id
+               WHERE p.is_active = 1 AND p.is_trending = 1 AND p.quantity > 0 AND s.is_active = 1
+               AND {SHOP_VISIBLE_CONDITION}
+               ORDER BY p.views_count DESC
+               LIMIT ?""",
+            (limit,)
+        )
+
+    return await response_cache.get_or_load(
+        "products.trending", limit, load, ttl=COLLECTIONS_CACHE_TTL, tags=["products"]
     )
-    return products
 
 
 @router.get("/discounted", response_model=List[dict])
@@ -274,18 +268,22 @@ async def get_discounted_products(
     db: DatabaseService = Depends(get_db)
 ):
     """Получает товары со скидкой."""
-    products = await db.fetch_all(
-        """SELECT p.*, 
-                  s.name as shop_name,
-                  (SELECT url FROM product_media WHERE product_id = p.id AND is_primary = 1 LIMIT 1) as primary_image
-           FROM products p
-           JOIN shops s ON p.shop_id = s.id
-           WHERE p.is_active = 1 AND p.discount_price IS NOT NULL AND p.quantity > 0 AND s.is_active = 1
-           ORDER BY p.discount_percent DESC
-           LIMIT ?""",
-        (limit,)
+    async def load():
+        return await db.fetch_all(
+            """SELECT p.*, 
+                      s.name as shop_name,
+                      (SELECT url FROM product_media WHERE product_id = p.id AND is_primary = 1 LIMIT 1) as primary_image
+               FROM products p
+               JOIN shops s ON p.shop_id = s.id
+               WHERE p.is_active = 1 AND p.discount_price IS NOT NULL AND p.quantity > 0 AND s.is_active = 1
+               ORDER BY p.discount_percent DESC
+               LIMIT ?""",
+            (limit,)
+        )
+
+    return await response_cache.get_or_load(
+        "products.discounted", limit, load, ttl=COLLECTIONS_CACHE_TTL, tags=["products"]
     )
-    return products
 
 
 @router.get("/{product_id}", response_model=ProductWithMedia)
@@ -503,6 +501,9 @@ async def create_product(
                 "is_primary": i == 0 if not any(m.is_primary for m in product_data.media) else media.is_primary
             })
     
+    await catalog_events.product_changed(db, product_id)
+    await publish_invalidation(db, *product_tags(shop["id"], product_id))
+    
     product = await db.fetch_one("SELECT * FROM products WHERE id = ?", (product_id,))
     return Product(**product)
 
@@ -541,22 +542,30 @@ async def upload_product_media(
                 is_primary=file_is_primary
             )
             
+            media_type = "photo" if file.content_type and file.content_type.startswith("image/") else "video"
+            
+            # Уменьшенные копии для списков (в пуле процессов)
+            variants = await generate_variants(Path(file_path), url) if media_type == "photo" else []
+            
             # Сохраняем информацию в БД
             media_record = await db.insert("product_media", {
                 "product_id": product_id,
-                "media_type": "photo" if file.content_type and file.content_type.startswith("image/") else "video",
+                "media_type": media_type,
                 "url": url,
                 "thumbnail_url": None,
                 "sort_order": i,
-                "is_primary": file_is_primary
+                "is_primary": file_is_primary,
+                "variants": json.dumps(variants) if variants else None
             })
             
             uploaded_media.append({
                 "id": media_record,
                 "url": url,
-                "media_type": "photo" if file.content_type and file.content_type.startswith("image/") else "video"
+                "media_type": media_type,
+                "variants": variants
             })
         
+        await publish_invalidation(db, *shop_tags(product["shop_id"]))
         return {
             "success": True,
             "message": f"Загружено {len(uploaded_media)} файлов",
@@ -607,6 +616,8 @@ async def delete_product_media(
         "DELETE FROM product_media WHERE id = ?",
         (media_id,)
     )
+    await db.commit()
+    await publish_invalidation(db, *shop_tags(product["shop_id"]))
     
     return {"success": True, "message": "Медиа файл удалён"}
 
@@ -700,6 +711,9 @@ async def update_product(
             print(f"[UPDATE] Product {product_id} updated: {list(update_data.keys())}, rows affected: {cursor.rowcount}")
             print(f"[UPDATE] SQL Query: {query}")
             print(f"[UPDATE] SQL Values: {values}")
+            
+            await catalog_events.product_changed(db, product_id)
+            await publish_invalidation(db, *product_tags(product["shop_id"], product_id))
         
         # Проверяем, что cost_price действительно обновился
         updated = await db.fetch_one("SELECT * FROM products WHERE id = ?", (product_id,))
@@ -783,6 +797,8 @@ async def delete_product(
         
         await db.commit()
         print(f"[DELETE] Product {product_id} deleted successfully")
+        catalog_events.product_deleted(product_id)
+        await publish_invalidation(db, *product_tags(product["shop_id"], product_id))
         
         message = "Product deleted"
         if has_order_items:
@@ -7,6 +7,7 @@ from typing import List, Optional
 
 from ..models.review import ShopReview, ShopReviewCreate
 from ..models.user import User
+from ..services.cache_invalidation import publish_invalidation, shop_tags
 from ..services.database import DatabaseService, get_db
 from .users import get_current_user
 
@@ -170,6 +171,7 @@ async def update_shop_rating(shop_id: int, db: DatabaseService):
             tuple(values)
         )
         await db.commit()
+        await publish_invalidation(db, *shop_tags(shop_id))
 
 
 
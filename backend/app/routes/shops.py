@@ -9,12 +9,18 @@ from pydantic import BaseModel
 
 from ..models.shop import Shop, ShopCreate, ShopUpdate, ShopWithStats
 from ..models.user import User
+from ..services.cache_invalidation import publish_invalidation, shop_tags
 from ..services.database import DatabaseService, get_db
+from ..services.media_loader import load_product_media, PRIMARY_ORDER
 from ..services.media import get_media_service
+from ..services.response_cache import response_cache
 from .users import get_current_user, get_current_user_optional
 
 router = APIRouter()
 
+# TTL кэша карточки магазина, секунд
+SHOP_CACHE_TTL = 60
+
 
 class ShopStatistics(BaseModel):
     """Статистика магазина за период."""
@@ -318,31 +324,36 @@ async def get_shop(
     db: DatabaseService = Depends(get_db)
 ):
     """Получает магазин по ID."""
-    shop = await db.fetch_one(
-        "SELECT * FROM shops WHERE id = ? AND is_active = 1",
-        (shop_id,)
-    )
-    if not shop:
-        raise HTTPException(status_code=404, detail="Shop not found")
-    
-    # Явно конвертируем pickup_enabled из INTEGER в boolean
-    if "pickup_enabled" in shop:
-        shop["pickup_enabled"] = bool(shop["pickup_enabled"]) if shop["pickup_enabled"] is not None else True
-    
-    products_count = await db.fetch_one(
-        "SELECT COUNT(*) as cnt FROM products WHERE shop_id = ? AND is_active = 1 AND quantity > 0",
-        (shop_id,)
-    )
-    orders_count = await db.fetch_one(
-        "SELECT COUNT(*) as cnt FROM orders WHERE shop_id = ? AND status = 'delivered'",
-        (shop_id,)
-    )
-    
-    return ShopWithStats(
-        **shop,
-        products_count=products_count["cnt"],
-        orders_count=orders_count["cnt"],
-        subscription_active=False
+    async def load():
+        shop = await db.fetch_one(
+            "SELECT * FROM shops WHERE id = ? AND is_active = 1",
+            (shop_id,)
+        )
+        if not shop:
+            raise HTTPException(status_code=404, detail="Shop not found")
+        
+        # Явно конвертируем pickup_enabled из INTEGER в boolean
+        if "pickup_enabled" in shop:
+            shop["pickup_enabled"] = bool(shop["pickup_enabled"]) if shop["pickup_enabled"] is not None else True
+        
+        products_count = await db.fetch_one(
+            "SELECT COUNT(*) as cnt FROM products WHERE shop_id = ? AND is_active = 1 AND quantity > 0",
+            (shop_id,)
+        )
+        orders_count = await db.fetch_one(
+            "SELECT COUNT(*) as cnt FROM orders WHERE shop_id = ? AND status = 'delivered'",
+            (shop_id,)
+        )
+        
+        return ShopWithStats(
+            **shop,
+            products_count=products_count["cnt"],
+            orders_count=orders_count["cnt"],
+            subscription_active=False
+        )
+
+    return await response_cache.get_or_load(
+        "shops.detail", shop_id, load, ttl=SHOP_CACHE_TTL, tags=[f"shop:{shop_id}"]
     )
 
 
@@ -395,6 +406,7 @@ async def update_shop(
         tuple(values)
     )
     await db.commit()
+    await publish_invalidation(db, *shop_tags(shop_id))
     
     updated_shop = await db.fetch_one("SELECT * FROM shops WHERE id = ?", (shop_id,))
     logger.info(f"[SHOP UPDATE] Shop updated successfully. New address: {updated_shop.get('address')}")
@@ -433,6 +445,7 @@ async def upload_shop_photo(
         (photo_url, shop_id)
     )
     await db.commit()
+    await publish_invalidation(db, f"shop:{shop_id}")
     
     return {"photo_url": photo_url}
 
@@ -472,15 +485,15 @@ async def get_shop_products(
             (shop_id,)
         )
     
-    # Получаем медиа для каждого товара
+    # Медиа всех товаров магазина одним запросом
+    media_by_product = await load_product_media(
+        db, [p["id"] for p in products], columns="*", order_by=PRIMARY_ORDER
+    )
     result = []
     for product in products:
-        media = await db.fetch_all(
-            "SELECT * FROM product_media WHERE product_id = ? ORDER BY is_primary DESC, id ASC",
-            (product["id"],)
-        )
+        media = media_by_product.get(product["id"], [])
         product_dict = dict(product)
-        product_dict["media"] = [dict(m) for m in media]
+        product_dict["media"] = media
         # Добавляем primary_image для удобства (первое изображение из media или первое с is_primary=1)
         primary_media = next((m for m in media if m.get("is_primary") == 1), None) or (media[0] if media else None)
         product_dict["primary_image"] = primary_media["url"] if primary_media else None
@@ -11,12 +11,17 @@ from aiogram.types import LabeledPrice
 
 from ..models.subscription import SubscriptionPlan, ShopSubscription
 from ..models.user import User
+from ..services.cache_invalidation import publish_invalidation, shop_tags
 from ..services.database import DatabaseService, get_db
+from ..services.response_cache import response_cache
 from ..services.telegram_notifier import TelegramNotifier
 from .users import get_current_user
 
 router = APIRouter()
 
+# TTL кэша списка планов, секунд (планы меняются только из админки бота)
+PLANS_CACHE_TTL = 600
+
 
 def parse_plan(plan: dict) -> dict:
     """Парсит план подписки, преобразуя features из JSON строки в dict."""
@@ -59,7 +64,7 @@ async def get_subscription_plans(
     db: DatabaseService = Depends(get_db)
 ):
     """Получает список планов подписки."""
-    try:
+    async def load():
         # Проверяем существование таблицы
         tables = await db.fetch_all("SELECT name FROM sqlite_master WHERE type='table' AND name='subscription_plans'")
         if not tables:
@@ -86,6 +91,11 @@ async def get_subscription_plans(
                 # Пропускаем проблемный план вместо падения всего запроса
                 continue
         return result
+
+    try:
+        return await response_cache.get_or_load(
+            "subscriptions.plans", None, load, ttl=PLANS_CACHE_TTL, tags=["subscription_plans"]
+        )
     except Exception as e:
         print(f"Error fetching subscription plans: {e}")
         import traceback
@@ -188,6 +198,8 @@ async def subscribe(
     activated = await SubscriptionManager.activate_shop_products(db, shop["id"])
     if activated > 0:
         print(f"[SUBSCRIPTION] Activated {activated} products for shop {shop['id']}")
+    # Подписка меняет видимость магазина на витрине, даже если товары не менялись
+    await publish_invalidation(db, *shop_tags(shop["id"]))
     
     return ShopSubscription(**subscription, days_remaining=days_remaining)
 
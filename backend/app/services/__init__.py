@@ -2,9 +2,9 @@
 Сервисы для работы с данными.
 """
 
-from .database import DatabaseService, get_db
+from .database import DatabaseService, DatabasePool, get_db
 
-__all__ = ["DatabaseService", "get_db"]
+__all__ = ["DatabaseService", "DatabasePool", "get_db"]
 
 
 
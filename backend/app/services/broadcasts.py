@@ -0,0 +1,373 @@
+"""
+Рассылки администратора: задания с сохранением состояния.
+
+Задание (broadcast_jobs) хранит содержимое рассылки, статус и счётчики, а
+получатели (broadcast_recipients) — статус отправки каждому пользователю.
+Список получателей снимается одним INSERT ... SELECT внутри SQLite, отправка
+читает его пачками по keyset-курсору user_id, поэтому в памяти нет всей
+таблицы пользователей. Пачка отправляется конкурентно, темп держит планировщик
+отправки (telegram_sender).
+
+Задание можно приостановить, продолжить и отменить: статус проверяется
+между пачками. После перезапуска бота задания со статусом running
+продолжаются (resume_unfinished). Пачку помечаем sending до отправки:
+если процесс упал посреди пачки, её получатели получают статус unknown
+и повторно не отправляются — лучше пропустить сообщение, чем прислать дважды.
+
+Пользователи, заблокировавшие бота, помечаются users.bot_blocked_at и не
+попадают в следующие рассылки, пока снова не нажмут /start. is_active здесь не
+трогаем: это блокировка администратором.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from ..config import settings
+from .database import DatabaseService
+
+# Получателей в одной пачке (статусы фиксируются после каждой пачки)
+BROADCAST_BATCH_SIZE = 100
+
+# Как часто обновлять сообщение с прогрессом, секунд
+BROADCAST_PROGRESS_INTERVAL = 3.0
+
+# Получатель рассылки: не заблокирован администратором и не заблокировал бота
+ACTIVE_RECIPIENTS = "COALESCE(is_active, 1) = 1 AND bot_blocked_at IS NULL"
+
+_STATUS_TITLES = {
+    "running": "📤 Рассылка идёт",
+    "paused": "⏸ Рассылка приостановлена",
+    "cancelled": "❌ Рассылка отменена",
+    "completed": "✅ Рассылка завершена",
+}
+
+
+async def ensure_broadcast_tables(db: DatabaseService) -> None:
+    """Создаёт таблицы заданий рассылки, если их ещё нет."""
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS broadcast_jobs (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               text TEXT,
+               photo_file_id TEXT,
+               status TEXT NOT NULL DEFAULT 'running',
+               admin_chat_id INTEGER,
+               progress_message_id INTEGER,
+               total INTEGER NOT NULL DEFAULT 0,
+               sent INTEGER NOT NULL DEFAULT 0,
+               failed INTEGER NOT NULL DEFAULT 0,
+               blocked INTEGER NOT NULL DEFAULT 0,
+               created_by INTEGER,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               finished_at TIMESTAMP
+           )"""
+    )
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS broadcast_recipients (
+               job_id INTEGER NOT NULL REFERENCES broadcast_jobs(id) ON DELETE CASCADE,
+               user_id INTEGER NOT NULL,
+               telegram_id INTEGER NOT NULL,
+               status TEXT NOT NULL DEFAULT 'pending',
+               error TEXT,
+               PRIMARY KEY (job_id, user_id)
+           ) WITHOUT ROWID"""
+    )
+    columns = await db.fetch_all("PRAGMA table_info(users)")
+    if columns and not any(column["name"] == "bot_blocked_at" for column in columns):
+        await db.execute("ALTER TABLE users ADD COLUMN bot_blocked_at TIMESTAMP")
+        # Раньше заблокировавшие бота получали is_active = 0 — переносим отметку
+        await db.execute(
+            """UPDATE users SET is_active = 1, bot_blocked_at = CURRENT_TIMESTAMP
+               WHERE is_active = 0 AND id IN (
+                   SELECT user_id FROM broadcast_recipients WHERE status = 'blocked'
+               )"""
+        )
+
+
+async def mark_bot_unblocked(db: DatabaseService, telegram_id: int) -> None:
+    """Пользователь снова написал боту — возвращаем его в рассылки."""
+    await db.execute(
+        "UPDATE users SET bot_blocked_at = NULL WHERE telegram_id = ? AND bot_blocked_at IS NOT NULL",
+        (telegram_id,)
+    )
+
+
+async def count_recipients(db: DatabaseService) -> int:
+    """Сколько пользователей получит новую рассылку."""
+    row = await db.fetch_one(f"SELECT COUNT(*) as cnt FROM users WHERE {ACTIVE_RECIPIENTS}")
+    return row["cnt"] if row else 0
+
+
+async def create_broadcast_job(
+    db: DatabaseService,
+    text: str,
+    photo_file_id: Optional[str],
+    admin_chat_id: int,
+    progress_message_id: int,
+    created_by: int
+) -> dict:
+    """Создаёт задание и снимок списка получателей."""
+    async with db.transaction() as tx:
+        job_id = await tx.insert(
+            "broadcast_jobs",
+            {
+                "text": text,
+                "photo_file_id": photo_file_id,
+                "admin_chat_id": admin_chat_id,
+                "progress_message_id": progress_message_id,
+                "created_by": created_by,
+            },
+            commit=False
+        )
+        cursor = await tx.execute(
+            f"""INSERT INTO broadcast_recipients (job_id, user_id, telegram_id)
+                SELECT ?, id, telegram_id FROM users WHERE {ACTIVE_RECIPIENTS}""",
+            (job_id,)
+        )
+        await tx.update("broadcast_jobs", {"total": cursor.rowcount}, "id = ?", (job_id,), commit=False)
+    return await get_broadcast_job(db, job_id)
+
+
+async def get_broadcast_job(db: DatabaseService, job_id: int) -> Optional[dict]:
+    return await db.fetch_one("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,))
+
+
+def progress_text(job: dict) -> str:
+    """Текст сообщения с прогрессом рассылки."""
+    done = job["sent"] + job["failed"] + job["blocked"]
+    percent = done * 100 // job["total"] if job["total"] else 100
+    return f"""
+<b>{_STATUS_TITLES.get(job['status'], job['status'])}</b>
+
+<b>Прогресс:</b> {done} из {job['total']} ({percent}%)
+📤 Отправлено: {job['sent']}
+🚫 Заблокировали бота: {job['blocked']}
+❌ Ошибок: {job['failed']}
+"""
+
+
+def progress_keyboard(job: dict) -> InlineKeyboardMarkup:
+    """Кнопки управления рассылкой по её статусу."""
+    job_id = job["id"]
+    if job["status"] == "running":
+        buttons = [[
+            InlineKeyboardButton(text="⏸ Пауза", callback_data=f"admin_broadcast_pause_{job_id}"),
+            InlineKeyboardButton(text="❌ Отменить", callback_data=f"admin_broadcast_stop_{job_id}"),
+        ]]
+    elif job["status"] == "paused":
+        buttons = [[
+            InlineKeyboardButton(text="▶️ Продолжить", callback_data=f"admin_broadcast_resume_{job_id}"),
+            InlineKeyboardButton(text="❌ Отменить", callback_data=f"admin_broadcast_stop_{job_id}"),
+        ]]
+    else:
+        buttons = []
+    buttons.append([InlineKeyboardButton(text="◀️ Назад к пользователям", callback_data="admin_users_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def _send_one(bot: Bot, job: dict, telegram_id: int) -> tuple:
+    """Отправляет рассылку одному получателю. Возвращает (статус, ошибка)."""
+    try:
+        if job["photo_file_id"]:
+            await bot.send_photo(
+                chat_id=telegram_id,
+                photo=job["photo_file_id"],
+                caption=job["text"] or None
+            )
+        elif job["text"]:
+            await bot.send_message(chat_id=telegram_id, text=job["text"])
+        return "sent", None
+    except TelegramForbiddenError as e:
+        # Бот заблокирован или аккаунт удалён
+        return "blocked", str(e)
+    except TelegramBadRequest as e:
+        if "chat not found" in str(e).lower():
+            return "blocked", str(e)
+        return "failed", str(e)
+    except Exception as e:
+        return "failed", f"{type(e).__name__}: {e}"
+
+
+class BroadcastManager:
+    """Запуск и управление заданиями рассылки в процессе бота."""
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Задания, продолженные, пока их прежняя задача ещё завершалась после паузы
+        self._restart: Set[int] = set()
+
+    def is_running(self, job_id: int) -> bool:
+        task = self._tasks.get(job_id)
+        return task is not None and not task.done()
+
+    def start(self, bot: Bot, job_id: int) -> None:
+        """Запускает отправку задания в фоне (если ещё не запущена)."""
+        if self.is_running(job_id):
+            # Задача могла уже увидеть паузу и завершаться — перезапустим её после выхода
+            self._restart.add(job_id)
+            return
+        task = asyncio.create_task(self._run(bot, job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda done: self._on_done(bot, job_id, done))
+
+    def _on_done(self, bot: Bot, job_id: int, task: asyncio.Task) -> None:
+        self._tasks.pop(job_id, None)
+        if job_id in self._restart:
+            self._restart.discard(job_id)
+            if not task.cancelled():
+                self.start(bot, job_id)
+
+    async def set_status(self, db: DatabaseService, job_id: int, status: str) -> Optional[dict]:
+        """Меняет статус незавершённого задания (running/paused/cancelled)."""
+        finished = "CURRENT_TIMESTAMP" if status == "cancelled" else "NULL"
+        cursor = await db.execute(
+            f"""UPDATE broadcast_jobs SET status = ?, finished_at = {finished}
+                WHERE id = ? AND status IN ('running', 'paused')""",
+            (status, job_id)
+        )
+        await db.commit()
+        if not cursor.rowcount:
+            return None
+        return await get_broadcast_job(db, job_id)
+
+    async def resume_unfinished(self, bot: Bot) -> int:
+        """Продолжает задания, прерванные перезапуском. Возвращает их число."""
+        db = DatabaseService(db_path=settings.DATABASE_PATH)
+        await db.connect()
+        try:
+            await ensure_broadcast_tables(db)
+            await db.commit()
+            rows = await db.fetch_all("SELECT id FROM broadcast_jobs WHERE status = 'running'")
+        finally:
+            await db.disconnect()
+        for row in rows:
+            self.start(bot, row["id"])
+        return len(rows)
+
+    async def shutdown(self) -> None:
+        """Останавливает отправку (задания остаются running и продолжатся при запуске)."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _update_progress(self, bot: Bot, job: dict) -> None:
+        if not job["admin_chat_id"] or not job["progress_message_id"]:
+            return
+        try:
+            await bot.edit_message_text(
+                text=progress_text(job),
+                chat_id=job["admin_chat_id"],
+                message_id=job["progress_message_id"],
+                reply_markup=progress_keyboard(job)
+            )
+        except TelegramBadRequest as e:
+            if "not modified" not in str(e):
+                print(f"[BROADCAST] Failed to update progress of job {job['id']}: {e}")
+        except Exception as e:
+            print(f"[BROADCAST] Failed to update progress of job {job['id']}: {e}")
+
+    async def _run(self, bot: Bot, job_id: int) -> None:
+        db = DatabaseService(db_path=settings.DATABASE_PATH)
+        await db.connect()
+        try:
+            # Пачка, которую отправлял упавший процесс: не повторяем
+            cursor = await db.execute(
+                "UPDATE broadcast_recipients SET status = 'unknown' WHERE job_id = ? AND status = 'sending'",
+                (job_id,)
+            )
+            if cursor.rowcount:
+                await db.execute(
+                    "UPDATE broadcast_jobs SET failed = failed + ? WHERE id = ?",
+                    (cursor.rowcount, job_id)
+                )
+            await db.commit()
+
+            print(f"[BROADCAST] Job {job_id} started")
+            last_user_id = 0
+            progress_at = 0.0
+            while True:
+                job = await get_broadcast_job(db, job_id)
+                if not job or job["status"] != "running":
+                    break
+                # Статус running прочитан — продолжение учтено, перезапуск не нужен
+                self._restart.discard(job_id)
+                if time.monotonic() - progress_at >= BROADCAST_PROGRESS_INTERVAL:
+                    await self._update_progress(bot, job)
+                    progress_at = time.monotonic()
+
+                recipients = await db.fetch_all(
+                    """SELECT user_id, telegram_id FROM broadcast_recipients
+                       WHERE job_id = ? AND user_id > ? AND status = 'pending'
+                       ORDER BY user_id LIMIT ?""",
+                    (job_id, last_user_id, BROADCAST_BATCH_SIZE)
+                )
+                if not recipients:
+                    await db.execute(
+                        """UPDATE broadcast_jobs SET status = 'completed', finished_at = CURRENT_TIMESTAMP
+                           WHERE id = ? AND status = 'running'""",
+                        (job_id,)
+                    )
+                    await db.commit()
+                    break
+                last_user_id = recipients[-1]["user_id"]
+                await self._send_batch(db, bot, job, recipients)
+
+            job = await get_broadcast_job(db, job_id)
+            if job:
+                await self._update_progress(bot, job)
+                print(f"[BROADCAST] Job {job_id} {job['status']}: sent {job['sent']}, "
+                      f"blocked {job['blocked']}, failed {job['failed']} of {job['total']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[BROADCAST] Job {job_id} failed: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            await db.disconnect()
+
+    async def _send_batch(self, db: DatabaseService, bot: Bot, job: dict, recipients: List[dict]) -> None:
+        job_id = job["id"]
+        user_ids = [row["user_id"] for row in recipients]
+        placeholders = ",".join("?" * len(user_ids))
+        await db.execute(
+            f"UPDATE broadcast_recipients SET status = 'sending' WHERE job_id = ? AND user_id IN ({placeholders})",
+            (job_id, *user_ids)
+        )
+        await db.commit()
+
+        results = await asyncio.gather(*(_send_one(bot, job, row["telegram_id"]) for row in recipients))
+
+        counts = {"sent": 0, "failed": 0, "blocked": 0}
+        for status, _ in results:
+            counts[status] += 1
+        await db.executemany(
+            "UPDATE broadcast_recipients SET status = ?, error = ? WHERE job_id = ? AND user_id = ?",
+            [(status, error, job_id, user_id) for user_id, (status, error) in zip(user_ids, results)]
+        )
+        blocked_users = [user_id for user_id, (status, _) in zip(user_ids, results) if status == "blocked"]
+        if blocked_users:
+            # Следующие рассылки пропустят этих пользователей
+            await db.execute(
+                f"""UPDATE users SET bot_blocked_at = CURRENT_TIMESTAMP
+                    WHERE id IN ({','.join('?' * len(blocked_users))})""",
+                tuple(blocked_users)
+            )
+        await db.execute(
+            "UPDATE broadcast_jobs SET sent = sent + ?, failed = failed + ?, blocked = blocked + ? WHERE id = ?",
+            (counts["sent"], counts["failed"], counts["blocked"], job_id)
+        )
+        await db.commit()
+
+
+# Глобальный экземпляр
+broadcast_manager = BroadcastManager()
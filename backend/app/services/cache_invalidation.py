@@ -0,0 +1,143 @@
+"""
+Шина инвалидаций между процессами: воркеры Gunicorn, бот, скрипты.
+
+Изменение публикуется тегами («banners», «products», «shop:{id}», «product:{id}»,
+«categories»). publish_invalidation применяет теги в текущем процессе и пишет их
+в таблицу change_log с pid процесса-источника. Каждый воркер API опрашивает
+журнал (run_change_log_watch): пока PRAGMA data_version не изменилась, в базу
+никто не писал и опрос стоит одного PRAGMA. Новые записи чужих процессов
+сбрасывают теги кэша ответов и передаются слушателям (add_change_listener),
+которые обновляют in-memory индексы. Своё событие процесс уже применил и пропускает.
+
+Внешней службы не нужно: журнал живёт в той же SQLite-базе, поэтому в него
+могут писать и триггеры (правки категорий любым процессом).
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Iterable, List, Set
+
+from .database import DatabaseService
+from .response_cache import response_cache
+
+# Сколько хранить записи change_log
+CHANGE_LOG_RETENTION = "-1 day"
+
+# Как часто удалять старые записи, секунд
+CHANGE_LOG_PRUNE_INTERVAL = 3600
+
+# Слушатель получает соединение и теги изменений из других процессов
+ChangeListener = Callable[[DatabaseService, Set[str]], Awaitable[None]]
+
+_change_listeners: List[ChangeListener] = []
+
+_table_ready = False
+
+
+def add_change_listener(listener: ChangeListener) -> None:
+    """Подписывает слушателя на изменения из других процессов."""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+async def ensure_change_log(db: DatabaseService) -> None:
+    """Создаёт таблицу change_log (или добавляет колонку origin), если нужно."""
+    global _table_ready
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS change_log (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               tags TEXT NOT NULL,
+               origin INTEGER,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )"""
+    )
+    columns = await db.fetch_all("PRAGMA table_info(change_log)")
+    if "origin" not in {column["name"] for column in columns}:
+        await db.execute("ALTER TABLE change_log ADD COLUMN origin INTEGER")
+    _table_ready = True
+
+
+async def publish_invalidation(db: DatabaseService, *tags: str) -> None:
+    """
+    Сбрасывает теги кэша ответов здесь и в других процессах.
+    Вызывается после commit изменения; ошибка записи только логируется.
+    """
+    tags = tuple(tag for tag in tags if tag)
+    if not tags:
+        return
+    response_cache.invalidate(*tags)
+    try:
+        if not _table_ready:
+            await ensure_change_log(db)
+        await db.execute(
+            "INSERT INTO change_log (tags, origin) VALUES (?, ?)",
+            (" ".join(tags), os.getpid())
+        )
+        await db.commit()
+    except Exception as e:
+        print(f"[CACHE] Failed to publish invalidation {tags}: {e}")
+
+
+def shop_tags(shop_id: int) -> Iterable[str]:
+    """Теги, которые затрагивает изменение магазина или его товаров."""
+    return ("products", f"shop:{shop_id}")
+
+
+def product_tags(shop_id: int, product_id: int) -> Iterable[str]:
+    """Теги изменения одного товара."""
+    return (*shop_tags(shop_id), f"product:{product_id}")
+
+
+async def _prune_change_log(db: DatabaseService) -> None:
+    await db.execute(
+        f"DELETE FROM change_log WHERE created_at < datetime('now', '{CHANGE_LOG_RETENTION}')"
+    )
+    await db.commit()
+
+
+async def _data_version(db: DatabaseService) -> int:
+    row = await db.fetch_one("PRAGMA data_version")
+    return row["data_version"]
+
+
+async def run_change_log_watch(db: DatabaseService, interval_seconds: float) -> None:
+    """Фоновая задача: применяет изменения, записанные другими процессами."""
+    await ensure_change_log(db)
+    await _prune_change_log(db)
+    pruned_at = time.monotonic()
+    row = await db.fetch_one("SELECT COALESCE(MAX(id), 0) as last_id FROM change_log")
+    last_id = row["last_id"]
+    # data_version меняется при commit из любого другого соединения
+    known_version = await _data_version(db)
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            version = await _data_version(db)
+            if version == known_version:
+                continue
+            known_version = version
+            rows = await db.fetch_all(
+                "SELECT id, tags, origin FROM change_log WHERE id > ? ORDER BY id", (last_id,)
+            )
+            if rows:
+                last_id = rows[-1]["id"]
+                pid = os.getpid()
+                tags = set()
+                for row in rows:
+                    if row["origin"] != pid:
+                        tags.update(row["tags"].split())
+                if tags:
+                    response_cache.invalidate(*tags)
+                    for listener in _change_listeners:
+                        try:
+                            await listener(db, tags)
+                        except Exception as e:
+                            print(f"[CACHE] Listener {getattr(listener, '__qualname__', listener)} failed: {e}")
+            if time.monotonic() - pruned_at > CHANGE_LOG_PRUNE_INTERVAL:
+                await _prune_change_log(db)
+                pruned_at = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[CACHE] Change log poll failed: {e}")
@@ -0,0 +1,92 @@
+"""
+События изменения каталога для in-process индексов (поиск, подсказки).
+
+Роуты, меняющие товары, вызывают product_changed / product_deleted после commit
+(массовые изменения товаров магазина — shop_products_changed), а индексы
+подписываются через add_product_listener и обновляются без полной перестройки. Ошибка в слушателе не ломает запрос — она только логируется.
+
+Изменения из других процессов (воркеры, бот) приходят через шину change_log
+тегами product:{id} и shop:{id}: товар перечитывается из базы так же, как локально.
+"""
+
+from typing import Callable, List, Optional, Set
+
+from .cache_invalidation import add_change_listener
+from .database import DatabaseService
+
+# Слушатель получает (product_id, строка товара) или (product_id, None) при удалении
+ProductListener = Callable[[int, Optional[dict]], None]
+
+# Товар с данными, нужными индексам: тексты, признаки видимости, популярность
+CATALOG_PRODUCTS_QUERY = """
+    SELECT p.id, p.name, p.description, p.is_active, p.views_count,
+           p.shop_id, s.name as shop_name, s.is_active as shop_is_active,
+           s.visible_until as shop_visible_until,
+           p.category_id, c.name as category_name
+    FROM products p
+    LEFT JOIN shops s ON p.shop_id = s.id
+    LEFT JOIN categories c ON p.category_id = c.id
+"""
+
+_product_listeners: List[ProductListener] = []
+
+
+def add_product_listener(listener: ProductListener) -> None:
+    """Подписывает слушателя на изменения товаров (повторная подписка игнорируется)."""
+    if listener not in _product_listeners:
+        _product_listeners.append(listener)
+
+
+def _notify(product_id: int, product: Optional[dict]) -> None:
+    for listener in _product_listeners:
+        try:
+            listener(product_id, product)
+        except Exception as e:
+            print(f"[CATALOG] Listener {getattr(listener, '__qualname__', listener)} failed for product {product_id}: {e}")
+
+
+async def load_catalog_product(db: DatabaseService, product_id: int) -> Optional[dict]:
+    """Загружает товар в формате CATALOG_PRODUCTS_QUERY."""
+    row = await db.fetch_one(f"{CATALOG_PRODUCTS_QUERY} WHERE p.id = ?", (product_id,))
+    return dict(row) if row else None
+
+
+async def product_changed(db: DatabaseService, product_id: int) -> None:
+    """Товар создан или изменён: перечитывает его и оповещает индексы."""
+    try:
+        product = await load_catalog_product(db, product_id)
+    except Exception as e:
+        print(f"[CATALOG] Failed to load product {product_id}: {e}")
+        return
+    _notify(product_id, product)
+
+
+async def shop_products_changed(db: DatabaseService, shop_id: int) -> None:
+    """Товары магазина изменены массово (например, при смене подписки)."""
+    try:
+        rows = await db.fetch_all(f"{CATALOG_PRODUCTS_QUERY} WHERE p.shop_id = ?", (shop_id,))
+    except Exception as e:
+        print(f"[CATALOG] Failed to load products of shop {shop_id}: {e}")
+        return
+    for row in rows:
+        _notify(row["id"], dict(row))
+
+
+def product_deleted(product_id: int) -> None:
+    """Товар удалён."""
+    _notify(product_id, None)
+
+
+async def apply_remote_changes(db: DatabaseService, tags: Set[str]) -> None:
+    """Перечитывает товары, изменённые другими процессами (теги product:{id} и shop:{id})."""
+    for tag in tags:
+        kind, _, value = tag.partition(":")
+        if not value.isdigit():
+            continue
+        if kind == "product":
+            await product_changed(db, int(value))
+        elif kind == "shop":
+            await shop_products_changed(db, int(value))
+
+
+add_change_listener(apply_remote_changes)
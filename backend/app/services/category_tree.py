@@ -0,0 +1,197 @@
+"""
+In-process кэш дерева категорий для GET /api/categories.
+
+Дерево и число активных товаров в каждой категории хранятся в памяти. Счётчики
+обновляются точечно по событиям товаров (catalog_events): создание, изменение,
+удаление, массовая (де)активация при смене подписки. Готовый JSON и его ETag
+собираются один раз после изменения, поэтому запрос без изменений — это 304
+или отдача готовых байтов без обращения к базе.
+
+Кэш также раскрывает фильтр по категории во все её подкатегории любой глубины
+(descendants) без запроса к базе. Категории меняет и бот (другой процесс), поэтому
+триггеры на categories пишут тег «categories» в шину change_log, а воркеры API
+перестраивают кэш, получив его (cache_invalidation.run_change_log_watch).
+"""
+
+import json
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from ..models.category import CategoryWithChildren
+from .cache_invalidation import add_change_listener, ensure_change_log
+from .catalog_events import add_product_listener
+from .database import DatabaseService
+from .http_cache import make_etag
+from .schema_versions import get_schema_version, set_schema_version
+from .search_index import CatalogIndexHolder
+
+CATEGORY_TRIGGERS_VERSION = 1
+
+# Событие для шины: любая правка категорий и перенос товаров между ними
+_PUBLISH_CHANGE = "INSERT INTO change_log (tags) VALUES ('categories');"
+
+CATEGORY_TRIGGERS = {
+    "category_tree_ai": f"CREATE TRIGGER category_tree_ai AFTER INSERT ON categories BEGIN {_PUBLISH_CHANGE} END",
+    "category_tree_au": f"CREATE TRIGGER category_tree_au AFTER UPDATE ON categories BEGIN {_PUBLISH_CHANGE} END",
+    "category_tree_ad": f"CREATE TRIGGER category_tree_ad AFTER DELETE ON categories BEGIN {_PUBLISH_CHANGE} END",
+    "category_tree_products_au": f"""
+        CREATE TRIGGER category_tree_products_au AFTER UPDATE OF category_id ON products
+        WHEN OLD.category_id IS NOT NEW.category_id BEGIN {_PUBLISH_CHANGE} END""",
+}
+
+
+class CategoryTreeData(NamedTuple):
+    """Данные для полной перестройки кэша."""
+    categories: List[dict]
+    products: List[dict]
+
+
+class CategoryTree:
+    """Активные категории (в порядке sort_order) и счётчики активных товаров."""
+
+    def __init__(self):
+        # Подкатегории каждой категории (в том числе неактивные)
+        self._children: Dict[int, List[int]] = {}
+        self._descendants: Dict[Tuple[int, bool], List[int]] = {}
+        # Активные категории — то, что показывается в дереве
+        self._categories: List[dict] = []
+        self._category_ids = set()
+        self._counts: Counter = Counter()
+        # product_id → category_id активного товара
+        self._product_categories: Dict[int, int] = {}
+        self._payload: Optional[Tuple[bytes, str]] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    # ---------- Обновление ----------
+
+    def _change_count(self, category_id: int, delta: int) -> None:
+        self._counts[category_id] += delta
+        if category_id in self._category_ids:
+            self._payload = None
+
+    def add_product(self, product: dict) -> None:
+        """Учитывает товар (dict с id, category_id, is_active)."""
+        product_id = product["id"]
+        category_id = product.get("category_id") if product.get("is_active") else None
+        previous = self._product_categories.get(product_id)
+        if previous == category_id:
+            return
+        self.remove_product(product_id)
+        if category_id is not None:
+            self._product_categories[product_id] = category_id
+            self._change_count(category_id, 1)
+
+    def remove_product(self, product_id: int) -> None:
+        category_id = self._product_categories.pop(product_id, None)
+        if category_id is not None:
+            self._change_count(category_id, -1)
+
+    @classmethod
+    def build(cls, data: CategoryTreeData) -> "CategoryTree":
+        tree = cls()
+        for category in data.categories:
+            if category["parent_id"] is not None:
+                tree._children.setdefault(category["parent_id"], []).append(category["id"])
+        tree._categories = [category for category in data.categories if category["is_active"]]
+        tree._category_ids = {category["id"] for category in tree._categories}
+        for product in data.products:
+            tree.add_product(product)
+        tree.ready = True
+        return tree
+
+    # ---------- Подкатегории ----------
+
+    def descendants(self, category_id: int, active_only: bool = False) -> List[int]:
+        """Категория и все её подкатегории любой глубины (active_only — только по активным)."""
+        key = (category_id, active_only)
+        cached = self._descendants.get(key)
+        if cached is None:
+            cached = [category_id]
+            seen = {category_id}
+            # Обход в ширину; seen защищает от циклов в parent_id
+            for current in cached:
+                for child in self._children.get(current, ()):
+                    if child in seen or (active_only and child not in self._category_ids):
+                        continue
+                    seen.add(child)
+                    cached.append(child)
+            self._descendants[key] = cached
+        return cached
+
+    # ---------- Ответ ----------
+
+    def payload(self) -> Tuple[bytes, str]:
+        """JSON дерева категорий и его ETag (пересобираются только после изменений)."""
+        if self._payload is None:
+            categories_dict = {
+                category["id"]: {
+                    **category,
+                    "products_count": self._counts.get(category["id"], 0),
+                    "children": [],
+                }
+                for category in self._categories
+            }
+            root_categories = []
+            for category in self._categories:
+                node = categories_dict[category["id"]]
+                if category["parent_id"] is None:
+                    root_categories.append(node)
+                else:
+                    parent = categories_dict.get(category["parent_id"])
+                    if parent:
+                        parent["children"].append(node)
+
+            tree = [CategoryWithChildren(**category) for category in root_categories]
+            body = json.dumps(
+                jsonable_encoder(tree), ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+            self._payload = (body, make_etag(body))
+        return self._payload
+
+
+async def _load_category_tree(db: DatabaseService) -> CategoryTreeData:
+    categories = await db.fetch_all("SELECT * FROM categories ORDER BY sort_order")
+    products = await db.fetch_all(
+        "SELECT id, category_id, is_active FROM products WHERE is_active = 1"
+    )
+    return CategoryTreeData(
+        categories=[dict(row) for row in categories],
+        products=[dict(row) for row in products],
+    )
+
+
+category_tree = CatalogIndexHolder(CategoryTree, _load_category_tree)
+add_product_listener(category_tree.apply_product)
+
+
+async def _on_changes(db: DatabaseService, tags: Set[str]) -> None:
+    if "categories" in tags:
+        await category_tree.rebuild(db)
+
+
+add_change_listener(_on_changes)
+
+
+async def ensure_category_triggers(db: DatabaseService) -> bool:
+    """
+    Создаёт триггеры, публикующие правки категорий в change_log
+    (пересоздаёт при смене CATEGORY_TRIGGERS_VERSION). Возвращает True, если обновлено.
+    """
+    await ensure_change_log(db)
+    applied_version = await get_schema_version(db, "category_triggers")
+    if applied_version == CATEGORY_TRIGGERS_VERSION:
+        await db.commit()
+        return False
+
+    for name in CATEGORY_TRIGGERS:
+        await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for statement in CATEGORY_TRIGGERS.values():
+        await db.execute(statement)
+    await set_schema_version(db, "category_triggers", CATEGORY_TRIGGERS_VERSION)
+    await db.commit()
+    return True
@@ -2,22 +2,78 @@
 Сервис для работы с базой данных SQLite.
 """
 
+import asyncio
 import aiosqlite
 import json
 from pathlib import Path
 from typing import Optional, List, Dict, Any, AsyncGenerator
 from contextlib import asynccontextmanager
 
+from ..config import settings
+
 
 # Путь к базе данных
 DATABASE_PATH = Path(__file__).parent.parent.parent.parent / "database" / "miniapp.db"
 
+# Допустимые значения PRAGMA из настроек (подставляются в SQL, поэтому проверяем)
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORE_MODES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+def get_connection_pragmas(read_only: bool = False) -> List[str]:
+    """Возвращает PRAGMA профиля соединения из настроек."""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.DB_BUSY_TIMEOUT)}",
+    ]
+    
+    journal_mode = settings.DB_JOURNAL_MODE.upper()
+    # Режим журнала хранится в файле базы, поэтому его меняет только соединение с правом записи
+    if journal_mode in _JOURNAL_MODES and not read_only:
+        pragmas.append(f"PRAGMA journal_mode = {journal_mode}")
+    
+    synchronous = settings.DB_SYNCHRONOUS.upper()
+    if synchronous in _SYNCHRONOUS_MODES:
+        pragmas.append(f"PRAGMA synchronous = {synchronous}")
+    
+    temp_store = settings.DB_TEMP_STORE.upper()
+    if temp_store in _TEMP_STORE_MODES:
+        pragmas.append(f"PRAGMA temp_store = {temp_store}")
+    
+    pragmas.append(f"PRAGMA cache_size = {int(settings.DB_CACHE_SIZE)}")
+    pragmas.append(f"PRAGMA mmap_size = {int(settings.DB_MMAP_SIZE)}")
+    return pragmas
+
+
+class DatabasePoolTimeout(RuntimeError):
+    """Не удалось получить соединение из пула за отведённое время."""
+
+
+def is_read_query(query: str) -> bool:
+    """Определяет, что запрос только читает данные и может выполняться на соединении для чтения."""
+    stripped = query.lstrip().lstrip("(")
+    if not stripped:
+        return False
+    head = stripped.split(None, 1)[0].upper()
+    if head in ("SELECT", "EXPLAIN"):
+        return True
+    if head == "PRAGMA":
+        # PRAGMA x = y меняет настройки соединения, PRAGMA table_info(...) — только чтение
+        return "=" not in stripped
+    if head == "WITH":
+        upper = stripped.upper()
+        return not any(word in upper for word in ("INSERT ", "UPDATE ", "DELETE ", "REPLACE "))
+    return False
+
 
 class DatabaseService:
     """Асинхронный сервис для работы с SQLite."""
     
-    def __init__(self, db_path: Path = DATABASE_PATH):
+    def __init__(self, db_path: Path = DATABASE_PATH, read_only: bool = False, shared: bool = False):
         self.db_path = db_path
+        self.read_only = read_only
+        # Общее соединение всех запросов (режим без пула, DB_POOL_SIZE=0)
+        self.shared = shared
         self._connection: Optional[aiosqlite.Connection] = None
     
     async def connect(self) -> None:
@@ -26,6 +82,12 @@ class DatabaseService:
         self._connection.row_factory = aiosqlite.Row
         await self._connection.execute("PRAGMA foreign_keys = ON")
         await self._connection.execute("PRAGMA encoding = 'UTF-8'")
+        for pragma in get_connection_pragmas(read_only=self.read_only):
+            cursor = await self._connection.execute(pragma)
+            await cursor.close()
+        if self.read_only:
+            # Соединения пула для чтения не могут случайно изменить данные
+            await self._connection.execute("PRAGMA query_only = ON")
     
     async def disconnect(self) -> None:
         """Закрывает соединение с базой данных."""
@@ -64,6 +126,34 @@ class DatabaseService:
         """Откатывает транзакцию."""
         await self.connection.rollback()
     
+    @asynccontextmanager
+    async def transaction(self) -> AsyncGenerator["DatabaseService", None]:
+        """
+        Явная транзакция BEGIN IMMEDIATE: блокировка записи берётся сразу, поэтому
+        прочитанное внутри не изменится до commit. При исключении всё откатывается.
+        Внутри insert/update/delete вызываются с commit=False и через
+        возвращённый сервис: у общего соединения (shared) транзакция открывается
+        на отдельном, иначе её изменения зафиксировал бы или откатил любой
+        другой запрос, а параллельный BEGIN завершился бы ошибкой.
+        """
+        if self.shared:
+            tx = DatabaseService(db_path=self.db_path)
+            await tx.connect()
+            try:
+                async with tx.transaction():
+                    yield tx
+            finally:
+                await tx.disconnect()
+            return
+        
+        await self.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            await self.rollback()
+            raise
+        await self.commit()
+    
     async def fetch_one(
         self, 
         query: str, 
@@ -72,6 +162,8 @@ class DatabaseService:
         """Выполняет запрос и возвращает одну строку."""
         cursor = await self.execute(query, params)
         row = await cursor.fetchone()
+        # Закрываем курсор сразу, чтобы незавершённый SELECT не держал блокировку чтения
+        await cursor.close()
         return dict(row) if row else None
     
     async def fetch_all(
@@ -87,7 +179,8 @@ class DatabaseService:
     async def insert(
         self, 
         table: str, 
-        data: Dict[str, Any]
+        data: Dict[str, Any],
+        commit: bool = True
     ) -> int:
         """Вставляет запись и возвращает ID."""
         columns = ", ".join(data.keys())
@@ -95,7 +188,8 @@ class DatabaseService:
         query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
         
         cursor = await self.execute(query, tuple(data.values()))
-        await self.commit()
+        if commit:
+            await self.commit()
         return cursor.lastrowid
     
     async def update(
@@ -103,41 +197,261 @@ class DatabaseService:
         table: str, 
         data: Dict[str, Any], 
         where: str, 
-        where_params: tuple = ()
+        where_params: tuple = (),
+        commit: bool = True
     ) -> int:
         """Обновляет записи и возвращает количество затронутых строк."""
         set_clause = ", ".join([f"{k} = ?" for k in data.keys()])
         query = f"UPDATE {table} SET {set_clause} WHERE {where}"
         
         cursor = await self.execute(query, tuple(data.values()) + where_params)
-        await self.commit()
+        if commit:
+            await self.commit()
         return cursor.rowcount
     
     async def delete(
         self, 
         table: str, 
         where: str, 
-        where_params: tuple = ()
+        where_params: tuple = (),
+        commit: bool = True
     ) -> int:
         """Удаляет записи и возвращает количество затронутых строк."""
         query = f"DELETE FROM {table} WHERE {where}"
         cursor = await self.execute(query, where_params)
-        await self.commit()
+        if commit:
+            await self.commit()
         return cursor.rowcount
 
 
+class DatabasePool:
+    """
+    Пул соединений с базой данных.
+    
+    Держит несколько соединений только для чтения и одно соединение для записи.
+    Чтения разных запросов выполняются параллельно, записи сериализуются
+    через единственного writer'а.
+    """
+    
+    def __init__(
+        self,
+        db_path: Path = DATABASE_PATH,
+        readers: int = 4,
+        acquire_timeout: float = 5.0
+    ):
+        self.db_path = db_path
+        self.readers_count = max(1, readers)
+        self.acquire_timeout = acquire_timeout
+        self._readers: List[DatabaseService] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._writer: Optional[DatabaseService] = None
+        self._writer_lock: Optional[asyncio.Lock] = None
+    
+    async def connect(self) -> None:
+        """Открывает соединения пула."""
+        self._idle_readers = asyncio.Queue()
+        self._writer_lock = asyncio.Lock()
+        
+        self._writer = DatabaseService(db_path=self.db_path)
+        await self._writer.connect()
+        
+        for _ in range(self.readers_count):
+            reader = DatabaseService(db_path=self.db_path, read_only=True)
+            await reader.connect()
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+    
+    async def disconnect(self) -> None:
+        """Закрывает все соединения пула."""
+        for reader in self._readers:
+            await reader.disconnect()
+        self._readers = []
+        if self._writer:
+            await self._writer.disconnect()
+            self._writer = None
+    
+    async def acquire_reader(self) -> DatabaseService:
+        """Берёт свободное соединение для чтения."""
+        try:
+            return await asyncio.wait_for(self._idle_readers.get(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise DatabasePoolTimeout(
+                f"No free read connection within {self.acquire_timeout}s"
+            )
+    
+    def release_reader(self, reader: DatabaseService) -> None:
+        """Возвращает соединение для чтения в пул."""
+        self._idle_readers.put_nowait(reader)
+    
+    async def acquire_writer(self) -> DatabaseService:
+        """Захватывает соединение для записи (одно на процесс)."""
+        try:
+            await asyncio.wait_for(self._writer_lock.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise DatabasePoolTimeout(
+                f"Write connection is busy for more than {self.acquire_timeout}s"
+            )
+        return self._writer
+    
+    def release_writer(self) -> None:
+        """Освобождает соединение для записи."""
+        if self._writer_lock.locked():
+            self._writer_lock.release()
+    
+    def session(self) -> "PooledDatabaseService":
+        """Создаёт сессию на время одного запроса."""
+        return PooledDatabaseService(self)
+
+
+class PooledDatabaseService(DatabaseService):
+    """
+    Сессия пула на время одного HTTP-запроса.
+    
+    Имеет тот же интерфейс, что и DatabaseService. Соединение для чтения
+    берётся при первом SELECT и держится до конца запроса. Соединение для записи
+    берётся при первом изменяющем запросе и держится до commit/rollback;
+    пока транзакция открыта, чтения идут через него же, чтобы видеть свои изменения.
+    """
+    
+    def __init__(self, pool: DatabasePool):
+        super().__init__(db_path=pool.db_path)
+        self._pool = pool
+        self._reader: Optional[DatabaseService] = None
+        self._writer: Optional[DatabaseService] = None
+    
+    async def connect(self) -> None:
+        """Соединения выдаёт пул, отдельное подключение не требуется."""
+    
+    async def disconnect(self) -> None:
+        """Возвращает соединения в пул, фиксируя незавершённые изменения."""
+        await self.close(commit=True)
+    
+    @property
+    def connection(self) -> aiosqlite.Connection:
+        """Возвращает соединение, которое видит последние изменения этой сессии."""
+        if self._writer:
+            return self._writer.connection
+        if self._reader:
+            return self._reader.connection
+        raise RuntimeError("No connection acquired for this session yet.")
+    
+    async def _get_reader(self) -> DatabaseService:
+        if self._reader is None:
+            self._reader = await self._pool.acquire_reader()
+        return self._reader
+    
+    async def _get_writer(self) -> DatabaseService:
+        if self._writer is None:
+            self._writer = await self._pool.acquire_writer()
+        return self._writer
+    
+    def _release_writer(self) -> None:
+        if self._writer is not None:
+            self._writer = None
+            self._pool.release_writer()
+    
+    async def execute(
+        self, 
+        query: str, 
+        params: tuple = ()
+    ) -> aiosqlite.Cursor:
+        """Выполняет SQL запрос на подходящем соединении пула."""
+        if self._writer is None and is_read_query(query):
+            reader = await self._get_reader()
+            return await reader.execute(query, params)
+        writer = await self._get_writer()
+        return await writer.execute(query, params)
+    
+    async def executemany(
+        self, 
+        query: str, 
+        params_list: List[tuple]
+    ) -> aiosqlite.Cursor:
+        """Выполняет SQL запрос для множества параметров (всегда через writer)."""
+        writer = await self._get_writer()
+        return await writer.executemany(query, params_list)
+    
+    async def commit(self) -> None:
+        """Фиксирует транзакцию и освобождает соединение для записи."""
+        if self._writer is None:
+            return
+        try:
+            await self._writer.commit()
+        finally:
+            self._release_writer()
+    
+    async def rollback(self) -> None:
+        """Откатывает транзакцию и освобождает соединение для записи."""
+        if self._writer is None:
+            return
+        try:
+            await self._writer.rollback()
+        finally:
+            self._release_writer()
+    
+    async def close(self, commit: bool = True) -> None:
+        """Завершает сессию: фиксирует или откатывает изменения и возвращает соединения."""
+        try:
+            if commit:
+                await self.commit()
+            else:
+                await self.rollback()
+        finally:
+            self._release_writer()
+            if self._reader is not None:
+                self._pool.release_reader(self._reader)
+                self._reader = None
+
+
+async def run_wal_checkpoints(db: DatabaseService, interval_seconds: int) -> None:
+    """
+    Периодически переносит страницы из WAL в основной файл базы.
+    
+    Режим PASSIVE не ждёт читателей и писателей, поэтому не блокирует запросы,
+    а WAL-файл не разрастается при постоянной нагрузке.
+    """
+    print(f"[DB] WAL checkpoint task started (every {interval_seconds}s)")
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            result = await db.fetch_one("PRAGMA wal_checkpoint(PASSIVE)")
+            if result:
+                busy, log_pages, checkpointed = tuple(result.values())
+                if log_pages and checkpointed < log_pages:
+                    print(f"[DB] WAL checkpoint: {checkpointed}/{log_pages} pages (busy={busy})")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[DB] WAL checkpoint error: {e}")
+
+
 # Глобальный экземпляр сервиса
 _db_service: Optional[DatabaseService] = None
 
+# Глобальный пул соединений (создаётся в lifespan, если включён в настройках)
+_db_pool: Optional[DatabasePool] = None
+
 
 async def get_db() -> AsyncGenerator[DatabaseService, None]:
     """Dependency для FastAPI - возвращает сервис базы данных."""
     global _db_service
     
+    if _db_pool is not None:
+        # Режим пула: каждый запрос получает свою сессию
+        session = _db_pool.session()
+        try:
+            yield session
+        except Exception:
+            await session.close(commit=False)
+            raise
+        else:
+            await session.close(commit=True)
+        return
+    
     if _db_service is None:
         # Используем глобальный экземпляр, если он уже создан в lifespan
         # Иначе создаем новый с путем по умолчанию
-        _db_service = DatabaseService()
+        _db_service = DatabaseService(shared=True)
         await _db_service.connect()
     
     try:
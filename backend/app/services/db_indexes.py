@@ -0,0 +1,145 @@
+"""
+Декларативный набор индексов для горячих запросов.
+
+Индексы применяются при старте API (см. lifespan в main.py). Чтобы добавить
+или удалить индекс, измените INDEXES / DROPPED_INDEXES и увеличьте INDEXES_VERSION.
+Проверка планов запросов: python database/check_query_plans.py
+"""
+
+from typing import Dict, List, NamedTuple, Tuple
+
+from .database import DatabaseService
+from .schema_versions import get_schema_version, set_schema_version
+
+
+class IndexDefinition(NamedTuple):
+    """Описание индекса."""
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+
+
+INDEXES_VERSION = 5
+
+INDEXES: List[IndexDefinition] = [
+    # Каталог: товары магазина, фильтр по активности и наличию
+    IndexDefinition("idx_products_shop_active_qty", "products", ("shop_id", "is_active", "quantity")),
+    # Фильтр каталога по категории
+    IndexDefinition("idx_products_category_active", "products", ("category_id", "is_active")),
+    # Медиа товара в порядке показа
+    IndexDefinition("idx_product_media_product", "product_media", ("product_id", "is_primary", "sort_order")),
+    # Заказы магазина и заказы пользователя
+    IndexDefinition("idx_orders_shop_status_created", "orders", ("shop_id", "status", "created_at")),
+    IndexDefinition("idx_orders_user_created", "orders", ("user_id", "created_at")),
+    # Позиции заказа: по заказу и по товару (удаление товара, ON DELETE SET NULL)
+    IndexDefinition("idx_order_items_order", "order_items", ("order_id",)),
+    IndexDefinition("idx_order_items_product", "order_items", ("product_id",)),
+    IndexDefinition("idx_cart_items_user", "cart_items", ("user_id",)),
+    IndexDefinition("idx_favorites_user", "favorites", ("user_id",)),
+    IndexDefinition("idx_shop_reviews_shop", "shop_reviews", ("shop_id",)),
+    # Проверка активной подписки магазина
+    IndexDefinition(
+        "idx_shop_subscriptions_shop_active_end",
+        "shop_subscriptions",
+        ("shop_id", "is_active", "end_date")
+    ),
+    IndexDefinition("idx_product_views_product_user", "product_views", ("product_id", "user_id")),
+    # Подкатегории
+    IndexDefinition("idx_categories_parent", "categories", ("parent_id",)),
+    # Курсорная пагинация: порядок витрины и админских списков (id — rowid, входит в индекс)
+    IndexDefinition("idx_products_trending_created", "products", ("is_trending", "created_at")),
+    IndexDefinition("idx_orders_created", "orders", ("created_at",)),
+    IndexDefinition("idx_shops_created", "shops", ("created_at",)),
+    IndexDefinition("idx_users_created", "users", ("created_at",)),
+    # Магазины витрины (shops.visible_until поддерживается триггерами подписок)
+    IndexDefinition("idx_shops_active_visible", "shops", ("is_active", "visible_until")),
+    # Резервы остатков: сумма по товару, снятие по покупателю, очистка истёкших
+    IndexDefinition("idx_stock_holds_product_expires", "stock_holds", ("product_id", "expires_at")),
+    IndexDefinition("idx_stock_holds_user", "stock_holds", ("user_id",)),
+    IndexDefinition("idx_stock_holds_expires", "stock_holds", ("expires_at",)),
+    # Очередь уведомлений: выборка готовых к отправке
+    IndexDefinition("idx_notification_outbox_status_next", "notification_outbox", ("status", "next_attempt_at")),
+]
+
+# Индексы из прошлых версий набора, которые больше не нужны
+DROPPED_INDEXES: List[str] = []
+
+
+def index_statement(index: IndexDefinition) -> str:
+    """Возвращает CREATE INDEX для описания индекса."""
+    columns = ", ".join(index.columns)
+    return f"CREATE INDEX IF NOT EXISTS {index.name} ON {index.table} ({columns})"
+
+
+def indexes_by_table() -> Dict[str, List[IndexDefinition]]:
+    """Группирует объявленные индексы по таблицам."""
+    result: Dict[str, List[IndexDefinition]] = {}
+    for index in INDEXES:
+        result.setdefault(index.table, []).append(index)
+    return result
+
+
+async def _table_columns(db: DatabaseService, table: str) -> List[str]:
+    columns = await db.fetch_all(f"PRAGMA table_info({table})")
+    return [col["name"] for col in columns]
+
+
+async def _covering_index(db: DatabaseService, index: IndexDefinition) -> str:
+    """
+    Возвращает имя существующего индекса (например, от UNIQUE-ограничения),
+    который начинается с тех же колонок, или пустую строку.
+    """
+    existing = await db.fetch_all(f"PRAGMA index_list({index.table})")
+    for row in existing:
+        if row["name"] == index.name:
+            continue
+        info = await db.fetch_all(f"PRAGMA index_info({row['name']})")
+        columns = tuple(col["name"] for col in sorted(info, key=lambda c: c["seqno"]))
+        if columns[:len(index.columns)] == index.columns:
+            return row["name"]
+    return ""
+
+
+async def apply_indexes(db: DatabaseService) -> int:
+    """
+    Создаёт недостающие индексы из INDEXES.
+
+    Пропускает индексы для отсутствующих таблиц/колонок и индексы, которые уже
+    покрыты существующими (например, UNIQUE(user_id, product_id)).
+    Возвращает количество созданных индексов.
+    """
+    applied_version = await get_schema_version(db, "indexes")
+    if applied_version == INDEXES_VERSION:
+        return 0
+
+    created = 0
+    complete = True
+    for index in INDEXES:
+        columns = await _table_columns(db, index.table)
+        if not columns or any(col not in columns for col in index.columns):
+            print(f"[INDEXES] Skip {index.name}: {index.table}({', '.join(index.columns)}) not found")
+            complete = False
+            continue
+
+        covered_by = await _covering_index(db, index)
+        if covered_by:
+            print(f"[INDEXES] Skip {index.name}: covered by {covered_by}")
+            continue
+
+        await db.execute(index_statement(index))
+        created += 1
+        print(f"[INDEXES] Created {index.name}")
+
+    for name in DROPPED_INDEXES:
+        await db.execute(f"DROP INDEX IF EXISTS {name}")
+
+    if created:
+        # Обновляем статистику планировщика только для изменившихся таблиц
+        await db.execute("PRAGMA optimize")
+
+    # Версию фиксируем, только когда набор применён полностью:
+    # таблицы, созданные позже, получат индексы при следующем старте
+    if complete:
+        await set_schema_version(db, "indexes", INDEXES_VERSION)
+    await db.commit()
+    return created
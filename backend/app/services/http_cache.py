@@ -0,0 +1,156 @@
+"""
+HTTP-кэширование ответов: ETag и условные запросы (If-None-Match → 304).
+
+ConditionalGetMiddleware добавляет сильный ETag к JSON-ответам GET и отвечает
+304 без тела, если клиент прислал тот же ETag. Для маршрутов, отданных из кэша
+ответов (response_cache), ETag запоминается вместе с версиями записей кэша:
+пока версии не сменились, повторный запрос подтверждается без вызова эндпоинта,
+запросов к базе и сериализации.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .response_cache import Dependency, dependencies_var, response_cache
+
+# Сколько URL помнить для подтверждения ETag по версиям кэша
+ETAG_MEMO_SIZE = 4096
+
+# Заголовки, от которых может зависеть ответ (входят в ключ памяти ETag)
+_IDENTITY_HEADERS = ("x-telegram-id", "authorization")
+
+
+def make_etag(body: bytes) -> str:
+    """Сильный ETag по содержимому ответа."""
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match (слабое сравнение, как требует RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+class _Memo(NamedTuple):
+    etag: str
+    dependencies: Tuple[Dependency, ...]
+    headers: List[Tuple[bytes, bytes]]
+
+
+class ConditionalGetMiddleware:
+    """ETag и 304 для JSON-ответов на GET (ASGI-middleware, тело буферизуется только у JSON 200)."""
+
+    def __init__(self, app: ASGIApp, memo_size: int = ETAG_MEMO_SIZE):
+        self.app = app
+        self._memo_size = memo_size
+        self._memo: "OrderedDict[tuple, _Memo]" = OrderedDict()
+
+    def _memo_key(self, scope: Scope, headers: Headers) -> tuple:
+        return (
+            scope["path"],
+            scope.get("query_string", b""),
+            *(headers.get(name) for name in _IDENTITY_HEADERS),
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        memo_key = self._memo_key(scope, request_headers)
+
+        memo = self._memo.get(memo_key)
+        if memo is not None:
+            if response_cache.is_current(memo.dependencies):
+                if etag_matches(if_none_match, memo.etag):
+                    self._memo.move_to_end(memo_key)
+                    await self._send_not_modified(send, memo.headers)
+                    return
+            else:
+                del self._memo[memo_key]
+
+        dependencies: List[Dependency] = []
+        token = dependencies_var.set(dependencies)
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        buffering = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, buffering
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                buffering = (
+                    message["status"] == 200
+                    and headers.get("content-type", "").startswith("application/json")
+                    and "etag" not in headers
+                )
+                if buffering:
+                    start = message
+                    return
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or not buffering:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self._finish(send, start, b"".join(chunks), if_none_match, memo_key, dependencies)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            dependencies_var.reset(token)
+
+    async def _finish(
+        self,
+        send: Send,
+        start: Message,
+        body: bytes,
+        if_none_match: Optional[str],
+        memo_key: tuple,
+        dependencies: List[Dependency],
+    ) -> None:
+        etag = make_etag(body)
+        headers = MutableHeaders(raw=list(start["headers"]))
+        headers["ETag"] = etag
+        if "cache-control" not in headers:
+            # Клиент хранит ответ, но перед использованием переспрашивает сервер
+            headers["Cache-Control"] = "no-cache"
+        validator_headers = [
+            (name, value) for name, value in headers.raw
+            if name not in (b"content-length", b"content-type")
+        ]
+
+        if dependencies and all(version is not None for _, version in dependencies):
+            self._memo[memo_key] = _Memo(etag, tuple(dependencies), validator_headers)
+            self._memo.move_to_end(memo_key)
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+
+        if etag_matches(if_none_match, etag):
+            await self._send_not_modified(send, validator_headers)
+            return
+        await send({**start, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+
+    @staticmethod
+    async def _send_not_modified(send: Send, headers: List[Tuple[bytes, bytes]]) -> None:
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
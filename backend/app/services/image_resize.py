@@ -0,0 +1,242 @@
+"""
+Ресайз изображений по запросу: /media/{path}?w=&h=&fmt=.
+
+Размеры для баннеров и фото магазинов заранее не известны, поэтому копия
+нужного размера создаётся при первом запросе в пуле процессов (image_variants)
+и сохраняется в uploads/.cache. Последующие запросы отдаются с диска.
+Одновременные запросы одной и той же копии ждут одну задачу ресайза.
+
+Кэш ограничен MEDIA_RESIZE_CACHE_MAX_MB на всю папку: копии создают все
+воркеры, поэтому при превышении (или раз в RESCAN_INTERVAL) воркер обходит
+папку, считает её настоящий размер и удаляет копии, к которым дольше всего не
+обращались (время обращения хранится в atime файла, поэтому порядок общий
+для воркеров и переживает перезапуск). Файлы, удалённые другим воркером,
+просто создаются заново.
+
+Ширина и высота округляются вверх до RESIZE_STEP, чтобы произвольные
+?w= не создавали по копии на каждый пиксель.
+
+Ключ копии включает версию оригинала (хэш из имени или mtime и размер),
+поэтому после замены оригинала старые копии не отдаются.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from ..config import settings
+from .image_variants import ENCODERS, available_formats, run_in_image_pool
+from .media_serving import MediaFileResponse, content_hash, media_file_response, resolve_media_path
+
+# Папка кэша внутри uploads
+RESIZE_CACHE_DIR = ".cache"
+
+# Максимальная ширина и высота копии, px
+MAX_RESIZE_DIMENSION = 2048
+
+# Шаг размеров копий, px (w и h округляются вверх)
+RESIZE_STEP = 50
+
+# Как часто пересчитывать размер папки кэша, секунд; после вытеснения
+# в ней остаётся EVICT_TO_RATIO предела, чтобы не обходить её на каждой копии
+RESCAN_INTERVAL = 60
+EVICT_TO_RATIO = 0.9
+
+# Форматы копий (fmt) → (имя формата Pillow, параметры save)
+RESIZE_FORMATS = {
+    **ENCODERS,
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+    "png": ("PNG", {"optimize": True}),
+}
+
+# Расширение оригинала → формат копии, если fmt не указан
+SOURCE_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp", ".avif": "avif"}
+
+
+def round_dimension(value: Optional[int]) -> Optional[int]:
+    """Размер копии: вверх до кратного RESIZE_STEP, не больше MAX_RESIZE_DIMENSION."""
+    if not value:
+        return None
+    return min(-(-value // RESIZE_STEP) * RESIZE_STEP, MAX_RESIZE_DIMENSION)
+
+
+def resize_image(source: str, target: str, width: Optional[int], height: Optional[int], fmt: str) -> None:
+    """
+    Вписывает изображение в рамку width×height (без увеличения) и сохраняет
+    в target (выполняется в процессе пула).
+    """
+    from PIL import Image, ImageOps
+
+    box = (width or MAX_RESIZE_DIMENSION, height or MAX_RESIZE_DIMENSION)
+    with Image.open(source) as original:
+        original.draft("RGB", box)
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail(box, Image.LANCZOS)
+        if fmt == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+        target_path = Path(target)
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = target_path.with_name(f".{target_path.name}.{os.getpid()}.tmp")
+        pil_format, options = RESIZE_FORMATS[fmt]
+        image.save(temp_path, format=pil_format, **options)
+        os.replace(temp_path, target_path)
+
+
+class ResizeCache:
+    """Копии изображений на диске с вытеснением по давности обращения."""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.MEDIA_RESIZE_CACHE_MAX_MB * 1024 * 1024
+        # Размер папки по последнему обходу плюс копии, созданные с тех пор этим воркером
+        self._files = 0
+        self._total = 0
+        self._scanned_at: Optional[float] = None
+        self._evicting: Optional[asyncio.Task] = None
+        self._pending: Dict[Path, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evicted = 0
+
+    def _evict(self, cache_dir: Path) -> None:
+        """
+        Обходит папку кэша (её пополняют все воркеры) и удаляет копии, к которым
+        дольше всего не обращались, пока размер не станет ниже EVICT_TO_RATIO предела.
+        """
+        files = []
+        if cache_dir.is_dir():
+            for path in cache_dir.glob("*/*"):
+                if path.name.startswith("."):
+                    continue
+                try:
+                    file_stat = path.stat()
+                except OSError:
+                    continue
+                files.append((file_stat.st_atime, path, file_stat.st_size))
+        total = sum(size for _, _, size in files)
+        if total > self.max_bytes:
+            files.sort()
+            target = self.max_bytes * EVICT_TO_RATIO
+            # Самую свежую копию не трогаем: её, возможно, сейчас отдают
+            while len(files) > 1 and total > target:
+                _, path, size = files.pop(0)
+                path.unlink(missing_ok=True)
+                total -= size
+                self.evicted += 1
+        self._files = len(files)
+        self._total = total
+
+    def _maybe_evict(self, cache_dir: Path) -> None:
+        """Запускает пересчёт папки кэша, если оценка превысила предел или устарела."""
+        now = time.monotonic()
+        stale = self._scanned_at is None or now - self._scanned_at > RESCAN_INTERVAL
+        if (self._total <= self.max_bytes and not stale) or self._evicting is not None:
+            return
+        self._scanned_at = now
+        # Обход каталога — в фоне и в потоке: запрос его не ждёт, цикл событий не занят
+        self._evicting = asyncio.create_task(asyncio.to_thread(self._evict, cache_dir))
+        self._evicting.add_done_callback(self._eviction_done)
+
+    def _eviction_done(self, task: asyncio.Task) -> None:
+        self._evicting = None
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[IMAGES] Resize cache eviction failed: {task.exception()}")
+
+    def _touch(self, path: Path) -> None:
+        try:
+            os.utime(path, (time.time(), path.stat().st_mtime))
+        except OSError:
+            pass
+
+    async def _render(self, source: Path, target: Path, width, height, fmt) -> None:
+        try:
+            await run_in_image_pool(resize_image, str(source), str(target), width, height, fmt)
+            try:
+                self._total += target.stat().st_size
+                self._files += 1
+            except OSError:
+                pass
+        finally:
+            self._pending.pop(target, None)
+
+    async def get(self, cache_dir: Path, source: Path, version: str, width, height, fmt: str) -> Path:
+        """Путь к копии source нужного размера (создаёт её при первом запросе)."""
+        key = hashlib.sha1(f"{source}|{version}|{width}|{height}|{fmt}".encode()).hexdigest()
+        target = cache_dir / key[:2] / f"{key}.{fmt}"
+
+        task = self._pending.get(target)
+        if task is not None:
+            self.coalesced += 1
+        elif target.exists():
+            # Создана раньше этим или другим воркером
+            self.hits += 1
+            self._touch(target)
+            return target
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._render(source, target, width, height, fmt))
+            self._pending[target] = task
+        # shield: отключение одного клиента не отменяет ресайз для остальных
+        await asyncio.shield(task)
+        self._maybe_evict(cache_dir)
+        return target
+
+    def stats(self) -> dict:
+        return {
+            "files": self._files,
+            "bytes": self._total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evicted": self.evicted,
+        }
+
+
+# Глобальный экземпляр (один на процесс)
+resize_cache = ResizeCache()
+
+
+async def resized_media_response(
+    root: Path,
+    path: str,
+    width: Optional[int],
+    height: Optional[int],
+    fmt: Optional[str]
+) -> MediaFileResponse:
+    """Ответ с копией изображения root/path, вписанной в width×height, в формате fmt."""
+    source = resolve_media_path(root, path)
+    source_format = SOURCE_FORMATS.get(source.suffix.lower())
+    if source_format is None or source.relative_to(root.resolve()).parts[0] == RESIZE_CACHE_DIR:
+        raise HTTPException(status_code=400, detail="Resize is supported only for images")
+    fmt = fmt or source_format
+    if fmt not in RESIZE_FORMATS or (fmt in ENCODERS and fmt not in available_formats()):
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    if settings.IMAGE_WORKERS <= 0 or not available_formats():
+        # Ресайз выключен — отдаём оригинал
+        return media_file_response(root, source)
+    width, height = round_dimension(width), round_dimension(height)
+
+    source_hash = content_hash(source)
+    if source_hash:
+        version = source_hash
+    else:
+        source_stat = source.stat()
+        version = f"{source_stat.st_mtime_ns}-{source_stat.st_size}"
+
+    try:
+        cached = await resize_cache.get(root.resolve() / RESIZE_CACHE_DIR, source, version, width, height, fmt)
+    except Exception as e:
+        print(f"[IMAGES] Resize of {path} to {width}x{height} {fmt} failed: {e}")
+        raise HTTPException(status_code=422, detail="Cannot resize this image")
+
+    # Копия content-addressed оригинала тоже неизменяема: версия — хэш и параметры
+    variant_version = f"{source_hash}-{width or ''}x{height or ''}-{fmt}" if source_hash else None
+    return media_file_response(root, cached, version=variant_version)
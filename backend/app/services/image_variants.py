@@ -0,0 +1,157 @@
+"""
+Производные изображения товаров: уменьшенные копии в WebP (и AVIF, если его поддерживает Pillow).
+
+При загрузке фото рядом с оригиналом создаются файлы
+<имя оригинала>_w<ширина>.<формат> для ширин VARIANT_WIDTHS, которые меньше
+исходной (крупнее оригинала не увеличиваем). Декодирование и кодирование идут
+в пуле процессов (IMAGE_WORKERS), чтобы не занимать цикл событий воркера.
+Список вариантов хранится в product_media.variants (JSON) и отдаётся в поле
+media[].variants: [{"url": ..., "width": 480, "height": 360, "format": "webp"}, ...].
+
+Имя варианта производно от имени оригинала с хэшем содержимого, поэтому
+варианты кэшируются клиентом так же бессрочно, как оригинал (media_serving).
+Для уже загруженных фото варианты создаёт database/generate_image_variants.py.
+"""
+
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    print("[IMAGES] WARNING: Pillow not installed. Image variants will not be generated.")
+
+from ..config import settings
+from .database import DatabaseService
+
+# Ширины вариантов в пикселях: карточка в сетке, карточка крупно, экран товара
+VARIANT_WIDTHS = (200, 480, 1080)
+
+# Параметры кодировщиков (формат → (имя формата Pillow, параметры save))
+ENCODERS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", {"quality": 60}),
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def available_formats() -> List[str]:
+    """Форматы вариантов, которые умеет кодировать установленный Pillow."""
+    if not PIL_AVAILABLE:
+        return []
+    return [fmt for fmt in ENCODERS if features.check(fmt)]
+
+
+def render_variants(
+    source: str,
+    widths: Sequence[int] = VARIANT_WIDTHS,
+    formats: Optional[Sequence[str]] = None
+) -> List[dict]:
+    """
+    Создаёт варианты файла source рядом с ним (выполняется в процессе пула).
+    Возвращает [{"name", "width", "height", "format"}, ...].
+    """
+    formats = list(formats) if formats is not None else available_formats()
+    source_path = Path(source)
+    variants = []
+    with Image.open(source_path) as original:
+        # JPEG сразу декодируется в уменьшенном масштабе, если это позволяет размер
+        largest = max(widths)
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        targets = [width for width in widths if width < image.width] or [image.width]
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                pil_format, options = ENCODERS[fmt]
+                name = f"{source_path.stem}_w{width}.{fmt}"
+                target = source_path.with_name(name)
+                temp_path = source_path.with_name(f".{name}.tmp")
+                resized.save(temp_path, format=pil_format, **options)
+                os.replace(temp_path, target)
+                variants.append({"name": name, "width": width, "height": height, "format": fmt})
+    return variants
+
+
+def variants_payload(url: str, rendered: List[dict]) -> List[dict]:
+    """Результат render_variants → список для product_media.variants (URL рядом с оригиналом)."""
+    base_url = url.rsplit("/", 1)[0]
+    return [
+        {"url": f"{base_url}/{variant['name']}", "width": variant["width"],
+         "height": variant["height"], "format": variant["format"]}
+        for variant in rendered
+    ]
+
+
+async def run_in_image_pool(func, *args):
+    """
+    Выполняет func(*args) в пуле процессов обработки изображений (общий для
+    вариантов при загрузке и ресайза по запросу, image_resize).
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_pool, func, *args)
+    except BrokenProcessPool:
+        # Процесс пула упал (например, не хватило памяти) — следующий вызов создаст новый пул
+        _pool = None
+        raise
+
+
+def shutdown_image_pool() -> None:
+    """Останавливает пул процессов (при завершении приложения)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def generate_variants(file_path: Path, url: str) -> List[dict]:
+    """
+    Создаёт варианты фото в пуле процессов. Возвращает список для
+    product_media.variants (пустой, если варианты создать не удалось).
+    """
+    if settings.IMAGE_WORKERS <= 0 or not available_formats():
+        return []
+    try:
+        rendered = await run_in_image_pool(render_variants, str(file_path))
+    except Exception as e:
+        print(f"[IMAGES] Variants for {url} failed: {e}")
+        return []
+    return variants_payload(url, rendered)
+
+
+def parse_variants(value) -> List[dict]:
+    """Варианты из колонки product_media.variants (JSON или NULL)."""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return []
+
+
+async def ensure_media_variants_column(db: DatabaseService) -> bool:
+    """Добавляет колонку product_media.variants. Возвращает True, если колонка добавлена."""
+    columns = await db.fetch_all("PRAGMA table_info(product_media)")
+    if not columns or any(column["name"] == "variants" for column in columns):
+        return False
+    await db.execute("ALTER TABLE product_media ADD COLUMN variants TEXT")
+    return True
@@ -5,6 +5,7 @@
 import hashlib
 import shutil
 import os
+import uuid
 from pathlib import Path
 from typing import Optional, Tuple
 from fastapi import UploadFile, HTTPException
@@ -12,6 +13,9 @@ import aiofiles
 
 from ..config import settings
 
+# Размер блока при сохранении загрузки: в памяти держится не больше одного блока
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
 
 class MediaService:
     """Сервис для работы с медиа файлами."""
@@ -25,6 +29,51 @@ class MediaService:
         # Создаём директории при инициализации
         self.media_dir.mkdir(parents=True, exist_ok=True)
     
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=413,
+            detail=f"Файл слишком большой. Максимальный размер: {self.max_size / 1024 / 1024:.1f} MB"
+        )
+    
+    async def _store_upload(
+        self,
+        file: UploadFile,
+        target_dir: Path,
+        prefix: str,
+        extension: str
+    ) -> Path:
+        """
+        Сохраняет загрузку блоками во временный файл, считая md5 по ходу записи,
+        и переименовывает её в {prefix}_{md5[:12]}{extension}.
+        
+        Прерывается с 413, как только размер превысил MAX_FILE_SIZE.
+        Временный файл лежит в той же папке, поэтому переименование атомарно:
+        по итоговому имени никогда не виден недописанный файл.
+        """
+        target_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = target_dir / f".upload_{uuid.uuid4().hex}.tmp"
+        file_hash = hashlib.md5()
+        size = 0
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise self._too_large()
+                    file_hash.update(chunk)
+                    await f.write(chunk)
+            
+            file_path = target_dir / f"{prefix}_{file_hash.hexdigest()[:12]}{extension}"
+            if file_path.exists():
+                # Тот же файл уже загружен — содержимое совпадает, оставляем его
+                temp_path.unlink()
+            else:
+                os.replace(temp_path, file_path)
+            return file_path
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+    
     async def save_shop_photo(
         self,
         file: UploadFile,
@@ -43,15 +92,9 @@ class MediaService:
         Raises:
             HTTPException: Если файл невалидный
         """
-        # Валидация размера
-        content = await file.read()
-        await file.seek(0)
-        
-        if len(content) > self.max_size:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Файл слишком большой. Максимальный размер: {self.max_size / 1024 / 1024:.1f} MB"
-            )
+        # Валидация размера (если клиент его сообщил; иначе проверяется при записи)
+        if file.size and file.size > self.max_size:
+            raise self._too_large()
         
         # Валидация типа файла
         content_type = file.content_type
@@ -61,9 +104,6 @@ class MediaService:
                 detail=f"Неподдерживаемый тип файла: {content_type}. Разрешены: {', '.join(self.allowed_images)}"
             )
         
-        # Создаём хэш для уникального имени
-        file_hash = hashlib.md5(content).hexdigest()[:12]
-        
         # Определяем расширение файла
         original_filename = file.filename or "file"
         extension = Path(original_filename).suffix.lower()
@@ -76,24 +116,46 @@ class MediaService:
             }
             extension = extension_map.get(content_type, ".jpg")
         
-        # Создаём папку для фото магазинов
-        shops_photos_dir = self.media_dir.parent / "shops"
-        shops_photos_dir.mkdir(parents=True, exist_ok=True)
-        shop_dir = shops_photos_dir / str(shop_id)
-        shop_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Генерируем имя файла
-        filename = f"photo_{file_hash}{extension}"
-        file_path = shop_dir / filename
-        
-        # Сохраняем файл
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        # Сохраняем в uploads/shops/{shop_id}/photo_<хэш>
+        shop_dir = self.media_dir.parent / "shops" / str(shop_id)
+        file_path = await self._store_upload(file, shop_dir, "photo", extension)
         
         # Возвращаем относительный URL и полный путь
-        relative_url = f"/media/shops/{shop_id}/{filename}"
+        relative_url = f"/media/shops/{shop_id}/{file_path.name}"
         return relative_url, str(file_path)
     
+    async def save_file(
+        self,
+        file: UploadFile,
+        folder: str
+    ) -> str:
+        """
+        Сохраняет изображение в uploads/{folder}/ (например, баннеры).
+        
+        Args:
+            file: Загружаемый файл
+            folder: Папка внутри uploads
+            
+        Returns:
+            str: Относительный URL (/media/{folder}/image_<хэш>.<расширение>)
+            
+        Raises:
+            HTTPException: Если файл невалидный
+        """
+        if file.size and file.size > self.max_size:
+            raise self._too_large()
+        
+        extension = Path(file.filename or "").suffix.lower()
+        if extension not in (".jpg", ".jpeg", ".png", ".webp"):
+            raise HTTPException(
+                status_code=400,
+                detail="Неподдерживаемый тип файла. Разрешены: JPG, PNG, WEBP"
+            )
+        
+        # Имя по хэшу содержимого: URL неизменяемый и кэшируется навсегда
+        file_path = await self._store_upload(file, self.media_dir.parent / folder, "image", extension)
+        return f"/media/{folder}/{file_path.name}"
+    
     async def save_media(
         self, 
         file: UploadFile, 
@@ -114,12 +176,9 @@ class MediaService:
         Raises:
             HTTPException: Если файл невалидный
         """
-        # Валидация размера
-        if hasattr(file, 'size') and file.size and file.size > self.max_size:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Файл слишком большой. Максимальный размер: {self.max_size / 1024 / 1024:.1f} MB"
-            )
+        # Валидация размера (если клиент его сообщил; иначе проверяется при записи)
+        if file.size and file.size > self.max_size:
+            raise self._too_large()
         
         # Валидация типа файла
         content_type = file.content_type
@@ -136,20 +195,6 @@ class MediaService:
                        f"Разрешены: {', '.join(self.allowed_images + self.allowed_videos)}"
             )
         
-        # Читаем содержимое для проверки размера и создания хэша
-        content = await file.read()
-        await file.seek(0)  # Возвращаем курсор в начало
-        
-        # Проверка размера по содержимому
-        if len(content) > self.max_size:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Файл слишком большой. Максимальный размер: {self.max_size / 1024 / 1024:.1f} MB"
-            )
-        
-        # Создаём хэш для уникального имени
-        file_hash = hashlib.md5(content).hexdigest()[:12]
-        
         # Определяем расширение файла
         original_filename = file.filename or "file"
         extension = Path(original_filename).suffix.lower()
@@ -165,21 +210,13 @@ class MediaService:
             }
             extension = extension_map.get(content_type, ".bin")
         
-        # Создаём структуру папок: uploads/products/{product_id}/
+        # Сохраняем в uploads/products/{product_id}/{primary|media}_<хэш>
         product_dir = self.media_dir / str(product_id)
-        product_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Генерируем имя файла
         prefix = "primary" if is_primary else "media"
-        filename = f"{prefix}_{file_hash}{extension}"
-        file_path = product_dir / filename
-        
-        # Сохраняем файл
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        file_path = await self._store_upload(file, product_dir, prefix, extension)
         
         # Возвращаем относительный URL и полный путь
-        relative_url = f"/media/products/{product_id}/{filename}"
+        relative_url = f"/media/products/{product_id}/{file_path.name}"
         return relative_url, str(file_path)
     
     async def delete_media(self, url: str) -> bool:
@@ -208,6 +245,9 @@ class MediaService:
         if file_path.exists():
             try:
                 os.remove(file_path)
+                # Уменьшенные копии (image_variants) лежат рядом: <имя>_w<ширина>.<формат>
+                for variant_path in file_path.parent.glob(f"{file_path.stem}_w*"):
+                    variant_path.unlink(missing_ok=True)
                 return True
             except Exception as e:
                 print(f"[ERROR] Ошибка удаления файла {file_path}: {e}")
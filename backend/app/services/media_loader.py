@@ -0,0 +1,57 @@
+"""
+Пакетная загрузка медиа товаров для списков.
+
+Вместо запроса на каждый товар медиа всей страницы выбираются одним
+запросом WHERE product_id IN (...) и группируются по товару в Python.
+"""
+
+from typing import Dict, Iterable, List
+
+from .database import DatabaseService
+from .image_variants import parse_variants
+
+# Лимит параметров SQLite (SQLITE_MAX_VARIABLE_NUMBER) в старых сборках — 999
+MAX_IDS_PER_QUERY = 900
+
+# Видео сначала, затем главное изображение и порядок сортировки
+DISPLAY_ORDER = "CASE WHEN media_type = 'video' THEN 0 ELSE 1 END, is_primary DESC, sort_order"
+# Главное изображение сначала, затем по порядку добавления
+PRIMARY_ORDER = "is_primary DESC, id ASC"
+
+LIST_COLUMNS = "id, media_type, url, is_primary, sort_order, variants"
+
+
+async def load_product_media(
+    db: DatabaseService,
+    product_ids: Iterable[int],
+    columns: str = LIST_COLUMNS,
+    order_by: str = DISPLAY_ORDER
+) -> Dict[int, List[dict]]:
+    """
+    Возвращает {product_id: [медиа, ...]} для переданных товаров.
+
+    Порядок медиа внутри товара задаётся order_by. У товаров без медиа
+    в результате пустой список.
+    """
+    ids = list(dict.fromkeys(pid for pid in product_ids if pid is not None))
+    result: Dict[int, List[dict]] = {pid: [] for pid in ids}
+    if not ids:
+        return result
+
+    for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+        chunk = ids[start:start + MAX_IDS_PER_QUERY]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = await db.fetch_all(
+            f"""SELECT product_id AS media_product_id, {columns}
+                FROM product_media
+                WHERE product_id IN ({placeholders})
+                ORDER BY product_id, {order_by}""",
+            tuple(chunk)
+        )
+        for row in rows:
+            media = dict(row)
+            if "variants" in media:
+                media["variants"] = parse_variants(media["variants"])
+            result[media.pop("media_product_id")].append(media)
+
+    return result
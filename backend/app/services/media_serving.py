@@ -0,0 +1,337 @@
+"""
+Раздача медиа файлов (/media/...): Range-запросы, HEAD и передача файла без Python.
+
+Два режима:
+  - MEDIA_ACCEL_REDIRECT_PREFIX задан — API только проверяет путь и отвечает
+    пустым телом с заголовком X-Accel-Redirect, файл (включая Range и HEAD)
+    отдаёт nginx через sendfile из internal-location (см. nginx/daribri.conf);
+  - иначе файл отдаёт сам API. Если ASGI-сервер поддерживает расширение
+    http.response.zerocopysend, диапазоны передаются через sendfile; если нет —
+    крупными блоками os.pread (MEDIA_CHUNK_SIZE), один переход в поток на блок.
+
+Поддерживаются одиночные, открытые (bytes=500-), суффиксные (bytes=-500)
+и множественные диапазоны (multipart/byteranges), If-Range и 416 для
+недопустимого диапазона.
+
+Кэширование: файлы загрузок называются по хэшу содержимого
+(primary_<md5[:12]>.jpg), новое содержимое всегда получает новый URL. Такие
+ответы помечаются Cache-Control: public, max-age=31536000, immutable, а хэш из
+имени служит сильным ETag. Остальные файлы отдаются с no-cache и ETag по
+mtime и размеру (в том же формате, что у nginx). If-None-Match и
+If-Modified-Since подтверждаются ответом 304 без обращения к файлу.
+"""
+
+import asyncio
+import os
+import re
+import secrets
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from ..config import settings
+from .http_cache import etag_matches
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+    ".gif": "image/gif",
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+}
+
+# Размер блока при отдаче файла без sendfile
+MEDIA_CHUNK_SIZE = 1024 * 1024
+
+# Больше диапазонов в одном запросе не обслуживаем (отдаём файл целиком)
+MAX_RANGES = 16
+
+# Имя файла с хэшем содержимого: <префикс>_<md5[:12]>.<расширение>,
+# у уменьшенных копий (image_variants) — <префикс>_<md5[:12]>_w<ширина>.<формат>
+CONTENT_HASH_NAME = re.compile(r"^[a-z]+(?:_[a-z]+)*_([0-9a-f]{12})(?:_w\d+)?\.[0-9a-z]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Диапазон [start, end) в байтах
+ByteRange = Tuple[int, int]
+
+
+class RangeNotSatisfiable(Exception):
+    """Ни один диапазон не попадает в файл (ответ 416)."""
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[ByteRange]]:
+    """
+    Разбирает заголовок Range. Возвращает отсортированные непересекающиеся
+    диапазоны или None, если заголовок нужно проигнорировать (RFC 9110: отдать файл целиком).
+    """
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or not spec.strip():
+        return None
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges: List[ByteRange] = []
+    for part in parts:
+        first, dash, last = part.partition("-")
+        if not dash:
+            return None
+        first, last = first.strip(), last.strip()
+        try:
+            if not first:
+                # Суффиксный диапазон: последние N байт
+                length = int(last)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size))
+                continue
+            start = int(first)
+            end = int(last) + 1 if last else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end <= start):
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end or size, size)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def resolve_media_path(root: Path, path: str) -> Path:
+    """Путь к файлу внутри root; 404, если файла нет или путь выходит за root."""
+    root = root.resolve()
+    file_path = (root / path).resolve()
+    if root not in file_path.parents or not file_path.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_path
+
+
+def content_hash(file_path: Path) -> Optional[str]:
+    """Хэш содержимого из имени файла или None, если имя не content-addressed."""
+    match = CONTENT_HASH_NAME.match(file_path.name)
+    return match.group(1) if match else None
+
+
+def media_cache_headers(
+    file_path: Path,
+    stat_result: os.stat_result,
+    accel: bool = False,
+    version: Optional[str] = None
+) -> dict:
+    """
+    ETag и Cache-Control для файла. version — неизменяемая версия содержимого,
+    если она известна не из имени файла (ресайз content-addressed оригинала).
+    При X-Accel-Redirect клиент видит ETag nginx ("<mtime>-<size>"),
+    поэтому и API сверяет If-None-Match с ним.
+    """
+    file_hash = version or content_hash(file_path)
+    if file_hash and not accel:
+        etag = f'"{file_hash}"'
+    else:
+        etag = f'"{int(stat_result.st_mtime):x}-{stat_result.st_size:x}"'
+    cache_control = IMMUTABLE_CACHE_CONTROL if file_hash else REVALIDATE_CACHE_CONTROL
+    return {"etag": etag, "cache-control": cache_control}
+
+
+class MediaFileResponse(Response):
+    """Ответ с файлом: Range, HEAD, X-Accel-Redirect или sendfile."""
+
+    def __init__(
+        self,
+        path: Path,
+        stat_result: os.stat_result,
+        media_type: str,
+        accel_redirect: Optional[str] = None,
+        headers: Optional[dict] = None,
+    ):
+        self.path = path
+        self.stat_result = stat_result
+        self.media_type = media_type
+        self.accel_redirect = accel_redirect
+        self.status_code = 200
+        self.background = None
+        self.init_headers(headers)
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers.setdefault("last-modified", formatdate(stat_result.st_mtime, usegmt=True))
+
+    def _not_modified(self, request_headers: Headers) -> bool:
+        """Условный запрос: можно ответить 304 (If-None-Match важнее If-Modified-Since)."""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            etag = self.headers.get("etag")
+            return etag is not None and etag_matches(if_none_match, etag)
+        if_modified_since = request_headers.get("if-modified-since")
+        if not if_modified_since:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(self.stat_result.st_mtime) <= since
+
+    def _if_range_matches(self, if_range: Optional[str]) -> bool:
+        if if_range is None:
+            return True
+        return if_range in (self.headers.get("etag"), self.headers.get("last-modified"))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        head_only = scope["method"] == "HEAD"
+        size = self.stat_result.st_size
+
+        if self._not_modified(request_headers):
+            headers = [
+                (name, value) for name, value in self.raw_headers
+                if name in (b"etag", b"cache-control", b"last-modified")
+            ]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if self.accel_redirect:
+            # Файл и Range обрабатывает nginx; тело ответа API пустое
+            self.headers["x-accel-redirect"] = self.accel_redirect
+            await self._start(send, 200, content_length=0)
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        ranges = None
+        range_header = request_headers.get("range")
+        if range_header and self._if_range_matches(request_headers.get("if-range")):
+            try:
+                ranges = parse_range_header(range_header, size)
+            except RangeNotSatisfiable:
+                await self._start(send, 416, content_length=0, extra={"content-range": f"bytes */{size}"})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if not ranges:
+            await self._start(send, 200, content_length=size)
+            parts = [(b"", 0, size)]
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            await self._start(
+                send, 206, content_length=end - start,
+                extra={"content-range": f"bytes {start}-{end - 1}/{size}"}
+            )
+            parts = [(b"", start, end)]
+        else:
+            boundary = secrets.token_hex(16)
+            parts = []
+            for index, (start, end) in enumerate(ranges):
+                prefix = b"\r\n" if index else b""
+                prefix += (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {self.media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                parts.append((prefix, start, end))
+            closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            content_length = sum(len(prefix) + end - start for prefix, start, end in parts) + len(closing)
+            await self._start(
+                send, 206, content_length=content_length,
+                content_type=f"multipart/byteranges; boundary={boundary}"
+            )
+            parts.append((closing, 0, 0))
+
+        if head_only:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self._send_parts(scope, send, parts)
+
+    async def _start(
+        self,
+        send: Send,
+        status: int,
+        content_length: Optional[int] = None,
+        content_type: Optional[str] = None,
+        extra: Optional[dict] = None,
+    ) -> None:
+        headers = [
+            (name, value) for name, value in self.raw_headers
+            if name not in (b"content-length", b"content-type")
+        ]
+        headers.append((b"content-type", (content_type or self.media_type).encode("latin-1")))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        for name, value in (extra or {}).items():
+            headers.append((name.encode("latin-1"), value.encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+    async def _send_parts(self, scope: Scope, send: Send, parts: List[Tuple[bytes, int, int]]) -> None:
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        with open(self.path, "rb") as file:
+            fd = file.fileno()
+            for index, (prefix, start, end) in enumerate(parts):
+                last_part = index == len(parts) - 1
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zerocopy and end > start:
+                    # sendfile на стороне сервера: данные файла не проходят через Python
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": start,
+                        "count": end - start,
+                        "more_body": not last_part,
+                    })
+                    continue
+                offset = start
+                while offset < end:
+                    chunk = await asyncio.to_thread(os.pread, fd, min(MEDIA_CHUNK_SIZE, end - offset), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": not (last_part and offset >= end),
+                    })
+                if offset < end or (last_part and end == start):
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+                    return
+
+
+def media_file_response(root: Path, file_path: Path, version: Optional[str] = None) -> MediaFileResponse:
+    """Ответ для уже проверенного файла file_path внутри root."""
+    stat_result = file_path.stat()
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+    media_type = MEDIA_TYPES.get(file_path.suffix.lower(), "application/octet-stream")
+
+    accel_redirect = None
+    prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if prefix:
+        relative = file_path.relative_to(root.resolve()).as_posix()
+        accel_redirect = prefix.rstrip("/") + "/" + quote(relative)
+    headers = media_cache_headers(file_path, stat_result, accel=bool(accel_redirect), version=version)
+    return MediaFileResponse(file_path, stat_result, media_type, accel_redirect=accel_redirect, headers=headers)
+
+
+def media_response(root: Path, path: str) -> MediaFileResponse:
+    """Ответ для файла root/path (404, если файла нет)."""
+    return media_file_response(root, resolve_media_path(root, path))
@@ -0,0 +1,254 @@
+"""
+Очередь уведомлений (outbox) для Telegram.
+
+Уведомление о заказе записывается в таблицу notification_outbox в той же
+транзакции, что и сам заказ, поэтому ответ на оформление не ждёт Telegram,
+а уведомление не теряется, если процесс упадёт сразу после commit.
+Фоновая задача run_notification_outbox забирает готовые записи и отправляет их
+через telegram_notifier. Неудачная отправка повторяется с экспоненциальной
+паузой, после NOTIFICATION_MAX_ATTEMPTS попыток запись получает статус dead
+и остаётся в таблице для разбора (retry_dead_notifications возвращает её в очередь).
+Если получатель недоступен (заблокировал бота, чат не найден), повторять
+бесполезно — запись сразу получает статус dead.
+
+Несколько воркеров API разбирают очередь одновременно: запись захватывается
+в транзакции BEGIN IMMEDIATE и до next_attempt_at принадлежит захватившему
+воркеру. Если воркер упал во время отправки, запись вернётся в работу после
+истечения аренды (повторная отправка возможна, потеря — нет).
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from ..config import settings
+from .database import DatabaseService
+from .telegram_notifier import telegram_notifier
+
+# Виды уведомлений → метод telegram_notifier (payload передаётся как именованные аргументы)
+NOTIFICATION_SENDERS = {
+    "order_created": telegram_notifier.send_order_notification,
+    "order_confirmation": telegram_notifier.send_order_confirmation_to_customer,
+    "order_status": telegram_notifier.send_order_status_notification,
+}
+
+# Сколько записей забирать за один проход
+OUTBOX_BATCH_SIZE = 20
+
+# Сколько секунд захваченная запись принадлежит воркеру
+OUTBOX_LEASE_SECONDS = 120
+
+# Пауза перед повтором: base * 2^(attempts-1), но не больше max, секунд
+OUTBOX_RETRY_BASE_SECONDS = 15
+OUTBOX_RETRY_MAX_SECONDS = 3600
+
+# Сколько хранить отправленные записи
+OUTBOX_RETENTION = "-7 days"
+
+# Как часто удалять старые записи, секунд
+OUTBOX_PRUNE_INTERVAL = 3600
+
+# Пробуждение фоновой задачи после оформления заказа в этом процессе
+_wakeup: Optional[asyncio.Event] = None
+
+
+async def ensure_notification_outbox(db: DatabaseService) -> None:
+    """Создаёт таблицу очереди уведомлений, если её ещё нет."""
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS notification_outbox (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               kind TEXT NOT NULL,
+               payload TEXT NOT NULL,
+               status TEXT NOT NULL DEFAULT 'pending',
+               attempts INTEGER NOT NULL DEFAULT 0,
+               next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+               last_error TEXT,
+               claimed_by INTEGER,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               sent_at TIMESTAMP
+           )"""
+    )
+
+
+async def enqueue_notification(
+    db: DatabaseService,
+    kind: str,
+    payload: dict,
+    commit: bool = False
+) -> Optional[int]:
+    """
+    Ставит уведомление в очередь. По умолчанию без commit — запись
+    фиксируется вместе с транзакцией вызывающего кода.
+    """
+    if kind not in NOTIFICATION_SENDERS:
+        raise ValueError(f"Unknown notification kind: {kind}")
+    if not settings.BOT_TOKEN:
+        print(f"[WARNING] BOT_TOKEN not configured, {kind} notification not queued")
+        return None
+    return await db.insert(
+        "notification_outbox",
+        {"kind": kind, "payload": json.dumps(payload, ensure_ascii=False, default=str)},
+        commit=commit
+    )
+
+
+def wake_notification_outbox() -> None:
+    """Будит фоновую задачу этого процесса, не дожидаясь интервала опроса."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def retry_delay(attempts: int) -> int:
+    """Пауза перед следующей попыткой после attempts неудачных, секунд."""
+    return min(OUTBOX_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), OUTBOX_RETRY_MAX_SECONDS)
+
+
+async def _claim_batch(db: DatabaseService) -> list:
+    """Захватывает готовые к отправке записи (и записи с истёкшей арендой)."""
+    async with db.transaction() as tx:
+        rows = await tx.fetch_all(
+            """SELECT id, kind, payload, attempts FROM notification_outbox
+               WHERE status IN ('pending', 'sending') AND next_attempt_at <= datetime('now')
+               ORDER BY id LIMIT ?""",
+            (OUTBOX_BATCH_SIZE,)
+        )
+        if rows:
+            await tx.executemany(
+                f"""UPDATE notification_outbox
+                   SET status = 'sending', attempts = attempts + 1, claimed_by = ?,
+                       next_attempt_at = datetime('now', '+{OUTBOX_LEASE_SECONDS} seconds')
+                   WHERE id = ?""",
+                [(os.getpid(), row["id"]) for row in rows]
+            )
+    return rows
+
+
+async def _deliver(row: dict) -> Tuple[Optional[str], bool]:
+    """
+    Отправляет одно уведомление. Возвращает (текст ошибки или None, повторять ли):
+    получателю, заблокировавшему бота или не найденному, повторная отправка не поможет.
+    """
+    sender = NOTIFICATION_SENDERS.get(row["kind"])
+    if sender is None:
+        return f"unknown kind {row['kind']}", False
+    try:
+        if await sender(**json.loads(row["payload"])):
+            return None, False
+        return "not sent: bot is not configured", True
+    except TelegramForbiddenError as e:
+        return f"{type(e).__name__}: {e}", False
+    except TelegramBadRequest as e:
+        return f"{type(e).__name__}: {e}", "chat not found" not in str(e).lower()
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", True
+
+
+async def _record_result(db: DatabaseService, row: dict, error: Optional[str], retry: bool = True) -> None:
+    attempts = row["attempts"] + 1
+    if error is None:
+        await db.execute(
+            """UPDATE notification_outbox
+               SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL
+               WHERE id = ?""",
+            (row["id"],)
+        )
+    elif not retry or attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        print(f"[OUTBOX] Notification {row['id']} ({row['kind']}) dead after {attempts} attempts: {error}")
+        await db.execute(
+            "UPDATE notification_outbox SET status = 'dead', last_error = ? WHERE id = ?",
+            (error, row["id"])
+        )
+    else:
+        await db.execute(
+            """UPDATE notification_outbox
+               SET status = 'pending', last_error = ?, next_attempt_at = datetime('now', ?)
+               WHERE id = ?""",
+            (error, f"+{retry_delay(attempts)} seconds", row["id"])
+        )
+    await db.commit()
+
+
+async def drain_notification_outbox(db: DatabaseService) -> int:
+    """Отправляет все готовые уведомления. Возвращает число отправленных."""
+    sent = 0
+    while True:
+        rows = await _claim_batch(db)
+        if not rows:
+            return sent
+        for row in rows:
+            error, retry = await _deliver(row)
+            await _record_result(db, row, error, retry)
+            if error is None:
+                sent += 1
+        if len(rows) < OUTBOX_BATCH_SIZE:
+            return sent
+
+
+async def _prune_outbox(db: DatabaseService) -> None:
+    await db.execute(
+        f"""DELETE FROM notification_outbox
+            WHERE status = 'sent' AND sent_at < datetime('now', '{OUTBOX_RETENTION}')"""
+    )
+    await db.commit()
+
+
+async def notification_stats(db: DatabaseService) -> Dict[str, int]:
+    """Число записей очереди по статусам."""
+    rows = await db.fetch_all(
+        "SELECT status, COUNT(*) as count FROM notification_outbox GROUP BY status"
+    )
+    return {row["status"]: row["count"] for row in rows}
+
+
+async def retry_dead_notifications(db: DatabaseService) -> int:
+    """Возвращает уведомления со статусом dead в очередь. Возвращает их число."""
+    cursor = await db.execute(
+        """UPDATE notification_outbox
+           SET status = 'pending', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP
+           WHERE status = 'dead'"""
+    )
+    await db.commit()
+    wake_notification_outbox()
+    return cursor.rowcount
+
+
+async def run_notification_outbox(interval_seconds: float) -> None:
+    """
+    Фоновая задача: разбирает очередь уведомлений. Работает на своём соединении,
+    чтобы отправка не занимала соединение запросов.
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+    db = DatabaseService(db_path=settings.DATABASE_PATH)
+    await db.connect()
+    try:
+        await _prune_outbox(db)
+        pruned_at = time.monotonic()
+        while True:
+            try:
+                sent = await drain_notification_outbox(db)
+                if sent:
+                    print(f"[OUTBOX] Sent {sent} notifications")
+                if time.monotonic() - pruned_at > OUTBOX_PRUNE_INTERVAL:
+                    await _prune_outbox(db)
+                    pruned_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[OUTBOX] Drain failed: {e}")
+                try:
+                    await db.rollback()
+                except Exception:
+                    pass
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+    finally:
+        _wakeup = None
+        await db.disconnect()
@@ -0,0 +1,138 @@
+"""
+Загрузка заказов вместе с товарами.
+
+Страница заказов собирается фиксированным числом запросов независимо от её
+размера: заказы, позиции всех заказов (WHERE order_id IN (...)) и главные
+изображения всех товаров (WHERE product_id IN (...)).
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..models.order import OrderItem, OrderWithItems
+from .database import DatabaseService
+from .pagination import keyset_condition, next_cursor
+
+# Лимит параметров SQLite (SQLITE_MAX_VARIABLE_NUMBER) в старых сборках — 999
+MAX_IDS_PER_QUERY = 900
+
+ORDER_SELECT = """SELECT o.*, s.name as shop_name
+                  FROM orders o
+                  JOIN shops s ON o.shop_id = s.id"""
+
+# Ключ сортировки заказов (новые сначала) для курсорной пагинации
+ORDER_SORT_KEY = ("created_at", "id")
+
+
+def _chunks(ids: List[int]):
+    for start in range(0, len(ids), MAX_IDS_PER_QUERY):
+        yield ids[start:start + MAX_IDS_PER_QUERY]
+
+
+async def load_primary_images(db: DatabaseService, product_ids: Iterable[int]) -> Dict[int, str]:
+    """Возвращает {product_id: url главного изображения}."""
+    ids = list(dict.fromkeys(pid for pid in product_ids if pid is not None))
+    images: Dict[int, str] = {}
+    for chunk in _chunks(ids):
+        placeholders = ", ".join("?" * len(chunk))
+        rows = await db.fetch_all(
+            f"""SELECT product_id, url
+                FROM product_media
+                WHERE product_id IN ({placeholders}) AND is_primary = 1
+                ORDER BY product_id, sort_order, id""",
+            tuple(chunk)
+        )
+        for row in rows:
+            images.setdefault(row["product_id"], row["url"])
+    return images
+
+
+async def load_order_items(db: DatabaseService, order_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """Возвращает {order_id: [позиции заказа]} с названием и изображением товара."""
+    ids = list(dict.fromkeys(order_ids))
+    items_by_order: Dict[int, List[dict]] = {order_id: [] for order_id in ids}
+    items: List[dict] = []
+    for chunk in _chunks(ids):
+        placeholders = ", ".join("?" * len(chunk))
+        rows = await db.fetch_all(
+            f"""SELECT oi.*,
+                       COALESCE(oi.product_name, p.name, 'Товар удалён') as product_name,
+                       p.id as existing_product_id
+                FROM order_items oi
+                LEFT JOIN products p ON oi.product_id = p.id
+                WHERE oi.order_id IN ({placeholders})
+                ORDER BY oi.order_id, oi.id""",
+            tuple(chunk)
+        )
+        items.extend(dict(row) for row in rows)
+
+    images = await load_primary_images(db, (item["existing_product_id"] for item in items))
+    for item in items:
+        # Изображение только у товаров, которые ещё существуют
+        product_id = item.pop("existing_product_id")
+        item["product_image_url"] = images.get(product_id) if product_id is not None else None
+        items_by_order[item["order_id"]].append(item)
+    return items_by_order
+
+
+def build_order_items(order_id: int, items: Sequence[dict]) -> List[OrderItem]:
+    """Создаёт OrderItem из строк, пропуская позиции с некорректными данными."""
+    order_items = []
+    for item in items:
+        try:
+            order_items.append(OrderItem(**item))
+        except Exception as e:
+            print(f"[ERROR] Failed to create OrderItem: {e}, item data: {item}")
+            try:
+                order_items.append(OrderItem(
+                    id=item.get('id', 0),
+                    order_id=item.get('order_id', order_id),
+                    product_id=item.get('product_id'),
+                    quantity=item.get('quantity', 1),
+                    price=item.get('price', 0),
+                    discount_price=item.get('discount_price'),
+                    product_name=item.get('product_name', 'Товар удалён'),
+                    product_image_url=item.get('product_image_url')
+                ))
+            except Exception as e2:
+                print(f"[ERROR] Failed to create fallback OrderItem: {e2}")
+                continue
+    return order_items
+
+
+async def hydrate_orders(db: DatabaseService, orders: Sequence) -> List[OrderWithItems]:
+    """Добавляет товары к уже выбранным заказам (строки orders + shop_name)."""
+    items_by_order = await load_order_items(db, [order["id"] for order in orders])
+    return [
+        OrderWithItems(
+            **dict(order),
+            items=build_order_items(order["id"], items_by_order.get(order["id"], []))
+        )
+        for order in orders
+    ]
+
+
+async def fetch_orders_page(
+    db: DatabaseService,
+    where_clause: str,
+    params: Sequence,
+    limit: int,
+    skip: int = 0,
+    cursor_values: Optional[Sequence] = None
+) -> Tuple[List[OrderWithItems], Optional[str]]:
+    """
+    Выбирает страницу заказов (новые сначала) с товарами.
+    Возвращает заказы и курсор следующей страницы; с курсором skip не используется.
+    """
+    params = list(params)
+    if cursor_values:
+        where_clause = f"({where_clause}) AND {keyset_condition([f'o.{key}' for key in ORDER_SORT_KEY])}"
+        params.extend(cursor_values)
+        skip = 0
+    orders = await db.fetch_all(
+        f"""{ORDER_SELECT}
+            WHERE {where_clause}
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT ? OFFSET ?""",
+        tuple(params) + (limit, skip)
+    )
+    return await hydrate_orders(db, orders), next_cursor(orders, limit, ORDER_SORT_KEY)
@@ -0,0 +1,67 @@
+"""
+Курсорная (keyset) пагинация списков.
+
+Курсор — непрозрачный токен с ключом сортировки последней строки страницы
+(например, is_trending, created_at, id). Следующая страница выбирается условием
+(a, b, id) < (?, ?, ?) по индексу вместо OFFSET, поэтому страница N стоит
+столько же, сколько первая. Курсор следующей страницы отдаётся в заголовке
+X-Next-Cursor (тело ответа — прежний список).
+"""
+
+import base64
+import json
+from typing import List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Кодирует ключ сортировки в токен."""
+    raw = json.dumps(list(values), separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> List:
+    """Раскодирует токен; ValueError, если он повреждён или другого размера."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor: unexpected key size")
+    if any(not isinstance(value, (int, float, str)) for value in values):
+        raise ValueError("Invalid cursor: unexpected value type")
+    return values
+
+
+def parse_cursor(cursor: Optional[str], columns: Sequence[str]) -> Optional[List]:
+    """Значения курсора для колонок сортировки или None; 400 при неверном токене."""
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor, len(columns))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_condition(columns: Sequence[str]) -> str:
+    """Условие «строки после курсора» для сортировки по columns по убыванию."""
+    placeholders = ", ".join("?" * len(columns))
+    return f"({', '.join(columns)}) < ({placeholders})"
+
+
+def next_cursor(rows: Sequence, limit: int, keys: Sequence[str]) -> Optional[str]:
+    """Курсор следующей страницы или None, если страница неполная."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor([last[key] for key in keys])
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    """Пишет курсор следующей страницы в заголовок ответа."""
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
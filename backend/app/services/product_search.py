@@ -0,0 +1,116 @@
+"""
+Полнотекстовый поиск по каталогу на SQLite FTS5.
+
+Таблица products_fts (rowid = products.id) содержит название и описание товара,
+название магазина и категории. Токенизатор unicode61 приводит к нижнему регистру
+в том числе кириллицу; «ё» заменяется на «е» и при индексации, и в запросе.
+Синхронизация — триггерами на products, shops и categories.
+"""
+
+import re
+from typing import Optional
+
+from .database import DatabaseService
+from .schema_versions import get_schema_version, set_schema_version
+
+FTS_VERSION = 1
+
+# Веса колонок для bm25: name, description, shop_name, category_name
+BM25_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+RANK_EXPRESSION = "bm25(products_fts, {})".format(", ".join(str(w) for w in BM25_WEIGHTS))
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _fold(expr: str) -> str:
+    """SQL-выражение: текст без NULL и с «ё» → «е»."""
+    return f"replace(replace(COALESCE({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _row_values(product: str) -> str:
+    """Значения строки products_fts для товара (NEW или алиас таблицы products)."""
+    return (
+        f"{product}.id, "
+        f"{_fold(product + '.name')}, "
+        f"{_fold(product + '.description')}, "
+        f"{_fold(f'(SELECT name FROM shops WHERE id = {product}.shop_id)')}, "
+        f"{_fold(f'(SELECT name FROM categories WHERE id = {product}.category_id)')}"
+    )
+
+
+FTS_COLUMNS = "rowid, name, description, shop_name, category_name"
+
+TRIGGERS = {
+    "products_fts_ai": f"""
+        CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts ({FTS_COLUMNS}) VALUES ({_row_values('NEW')});
+        END""",
+    "products_fts_au": f"""
+        CREATE TRIGGER products_fts_au AFTER UPDATE OF name, description, shop_id, category_id ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+            INSERT INTO products_fts ({FTS_COLUMNS}) VALUES ({_row_values('NEW')});
+        END""",
+    "products_fts_ad": """
+        CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+        END""",
+    "products_fts_shop_au": f"""
+        CREATE TRIGGER products_fts_shop_au AFTER UPDATE OF name ON shops BEGIN
+            UPDATE products_fts SET shop_name = {_fold('NEW.name')}
+            WHERE rowid IN (SELECT id FROM products WHERE shop_id = NEW.id);
+        END""",
+    "products_fts_category_au": f"""
+        CREATE TRIGGER products_fts_category_au AFTER UPDATE OF name ON categories BEGIN
+            UPDATE products_fts SET category_name = {_fold('NEW.name')}
+            WHERE rowid IN (SELECT id FROM products WHERE category_id = NEW.id);
+        END""",
+    "products_fts_category_ad": """
+        CREATE TRIGGER products_fts_category_ad AFTER DELETE ON categories BEGIN
+            UPDATE products_fts SET category_name = ''
+            WHERE rowid IN (SELECT id FROM products WHERE category_id = OLD.id);
+        END""",
+}
+
+
+async def ensure_products_fts(db: DatabaseService) -> bool:
+    """
+    Создаёт (или пересоздаёт при смене FTS_VERSION) products_fts и триггеры,
+    заполняет индекс из products. Возвращает True, если индекс перестроен.
+    """
+    applied_version = await get_schema_version(db, "products_fts")
+    exists = await db.fetch_one(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+    )
+    if applied_version == FTS_VERSION and exists:
+        return False
+
+    for name in TRIGGERS:
+        await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+    await db.execute("DROP TABLE IF EXISTS products_fts")
+    await db.execute(
+        """CREATE VIRTUAL TABLE products_fts USING fts5(
+               name, description, shop_name, category_name,
+               tokenize = 'unicode61 remove_diacritics 2'
+           )"""
+    )
+    for statement in TRIGGERS.values():
+        await db.execute(statement)
+    await db.execute(
+        f"INSERT INTO products_fts ({FTS_COLUMNS}) SELECT {_row_values('p')} FROM products p"
+    )
+    await set_schema_version(db, "products_fts", FTS_VERSION)
+    await db.commit()
+    return True
+
+
+def build_match_query(search: str) -> Optional[str]:
+    """
+    Превращает пользовательский запрос в выражение MATCH: все слова обязательны,
+    каждое ищется как префикс («роз» находит «розы»). None — если слов нет.
+    """
+    folded = search.replace("ё", "е").replace("Ё", "Е")
+    tokens = TOKEN_RE.findall(folded)
+    if not tokens:
+        return None
+    # Кавычки экранируют операторы FTS5 (AND, OR, NOT, NEAR) внутри запроса
+    return " ".join(f'"{token}"*' for token in tokens)
@@ -18,6 +18,7 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from backend.app.services.database import DatabaseService
+from backend.app.services.telegram_sender import use_send_scheduler
 from backend.app.config import settings
 
 
@@ -35,10 +36,10 @@ class ReminderService:
         
         if cls._bot is None:
             print(f"[REMINDER SERVICE] Creating bot instance")
-            cls._bot = Bot(
+            cls._bot = use_send_scheduler(Bot(
                 token=settings.BOT_TOKEN,
                 default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-            )
+            ))
         
         return cls._bot
     
@@ -86,13 +87,12 @@ class ReminderService:
                 await db.disconnect()
                 return
             
-            sent_count = 0
-            for reminder in reminders:
+            async def send_reminder(reminder) -> bool:
                 try:
                     telegram_id = reminder.get("telegram_id")
                     if not telegram_id:
                         print(f"[REMINDER SERVICE] No telegram_id for reminder {reminder.get('id')}")
-                        continue
+                        return False
                     
                     event_description = reminder.get("event_description", "Событие")
                     event_date_str = reminder.get("event_date")
@@ -138,14 +138,18 @@ class ReminderService:
                         (datetime.now().isoformat(), reminder.get("id"))
                     )
                     
-                    sent_count += 1
                     print(f"[REMINDER SERVICE] Sent reminder {reminder.get('id')} to user {telegram_id}")
+                    return True
                     
                 except Exception as e:
                     print(f"[REMINDER SERVICE] Error sending reminder {reminder.get('id')}: {e}")
                     import traceback
                     traceback.print_exc()
-                    continue
+                    return False
+            
+            # Отправки идут конкурентно: темп и лимиты Bot API выдерживает планировщик отправки
+            results = await asyncio.gather(*(send_reminder(reminder) for reminder in reminders))
+            sent_count = sum(results)
             
             if sent_count > 0:
                 await db.commit()
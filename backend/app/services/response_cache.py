@@ -0,0 +1,186 @@
+"""
+Кэш ответов публичных GET-эндпоинтов: TTL на маршрут и инвалидация по тегам.
+
+Эндпоинт отдаёт загрузку через get_or_load(route, key, loader, ttl, tags).
+Теги описывают, от чего зависит ответ («banners», «products», «shop:{id}»);
+пути записи вызывают publish_invalidation (services/cache_invalidation.py),
+который сбрасывает теги здесь и в других процессах. Счётчики попаданий
+и промахов ведутся по маршрутам (GET /api/admin/cache/stats).
+
+Каждая запись получает номер версии. Если запрос идёт под записью зависимостей
+(dependencies_var, её ставит ConditionalGetMiddleware), кэш отмечает, какие версии
+записей отдал; пока они не сменились, ETag ответа можно подтвердить без эндпоинта.
+"""
+
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import (
+    Any, Awaitable, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+)
+
+# Предел числа записей: самые давно использованные вытесняются
+MAX_ENTRIES = 2048
+
+CacheKey = Tuple[str, Hashable]
+
+# (ключ, версия записи); версия None — значение отдано не из сохранённой записи
+Dependency = Tuple[CacheKey, Optional[int]]
+
+# Список, в который get_or_load дописывает зависимости текущего запроса
+dependencies_var: ContextVar[Optional[List[Dependency]]] = ContextVar(
+    "response_cache_dependencies", default=None
+)
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: float
+    tags: Tuple[str, ...]
+    version: int
+
+
+class ResponseCache:
+    """In-process кэш ответов с TTL, тегами и статистикой по маршрутам."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._tag_keys: Dict[str, Set[CacheKey]] = {}
+        # Одновременные промахи по одному ключу ждут одну загрузку
+        self._loading: Dict[CacheKey, asyncio.Future] = {}
+        # Увеличивается при каждой инвалидации: загрузка, начатая до неё, не кэшируется
+        self._generation = 0
+        self._versions = itertools.count(1)
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, route: str, field: str) -> None:
+        stats = self._stats.setdefault(route, {"hits": 0, "misses": 0})
+        stats[field] += 1
+
+    def _drop(self, cache_key: CacheKey) -> None:
+        entry = self._entries.pop(cache_key, None)
+        if not entry:
+            return
+        for tag in entry.tags:
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self._tag_keys[tag]
+
+    def _store(self, cache_key: CacheKey, value: Any, ttl: float, tags: Iterable[str]) -> None:
+        self._drop(cache_key)
+        entry = _Entry(value, time.monotonic() + ttl, tuple(dict.fromkeys(tags)), next(self._versions))
+        self._entries[cache_key] = entry
+        for tag in entry.tags:
+            self._tag_keys.setdefault(tag, set()).add(cache_key)
+        while len(self._entries) > self._max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _live_entry(self, cache_key: CacheKey) -> Optional[_Entry]:
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._drop(cache_key)
+            return None
+        return entry
+
+    def _record(self, cache_key: CacheKey, value: Any) -> None:
+        dependencies = dependencies_var.get()
+        if dependencies is None:
+            return
+        entry = self._entries.get(cache_key)
+        version = entry.version if entry is not None and entry.value is value else None
+        dependencies.append((cache_key, version))
+
+    async def get_or_load(
+        self,
+        route: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float,
+        tags: Iterable[str] = ()
+    ) -> Any:
+        """Возвращает закэшированный ответ маршрута или загружает и кэширует его."""
+        cache_key = (route, key)
+        entry = self._live_entry(cache_key)
+        if entry is not None:
+            self._entries.move_to_end(cache_key)
+            self._count(route, "hits")
+            self._record(cache_key, entry.value)
+            return entry.value
+
+        pending = self._loading.get(cache_key)
+        while pending is not None:
+            try:
+                value = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # Отменён запрос, который загружал значение (клиент отключился):
+                # загрузчик работает на его соединении с базой, поэтому загружаем сами
+                pending = self._loading.get(cache_key)
+                continue
+            self._count(route, "hits")
+            self._record(cache_key, value)
+            return value
+
+        self._count(route, "misses")
+        generation = self._generation
+        future = asyncio.get_running_loop().create_future()
+        self._loading[cache_key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; не оставляем его «неполученным»
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(cache_key, None)
+        future.set_result(value)
+        if generation == self._generation:
+            self._store(cache_key, value, ttl, tags)
+        self._record(cache_key, value)
+        return value
+
+    def is_current(self, dependencies: Iterable[Dependency]) -> bool:
+        """Все ли записи из зависимостей ещё в кэше в тех же версиях."""
+        for cache_key, version in dependencies:
+            entry = self._live_entry(cache_key)
+            if version is None or entry is None or entry.version != version:
+                return False
+        return True
+
+    def invalidate(self, *tags: str) -> int:
+        """Удаляет записи с любым из тегов. Возвращает число удалённых записей."""
+        self._generation += 1
+        keys = set()
+        for tag in tags:
+            keys |= self._tag_keys.get(tag, set())
+        for cache_key in keys:
+            self._drop(cache_key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._tag_keys.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Попадания, промахи и число записей по маршрутам."""
+        entries: Dict[str, int] = {}
+        for route, _ in self._entries:
+            entries[route] = entries.get(route, 0) + 1
+        return {
+            route: {**counters, "entries": entries.get(route, 0)}
+            for route, counters in sorted(self._stats.items())
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,131 @@
+"""
+Стеммер русского языка (алгоритм Snowball, https://snowballstem.org/algorithms/russian/stemmer.html).
+
+Приводит словоформы к общей основе: «роза», «розы», «розу» → «роз».
+Без внешних зависимостей; результаты кэшируются, так как словарь каталога невелик.
+"""
+
+from functools import lru_cache
+
+VOWELS = "аеиоуыэюя"
+
+PERFECTIVE_GERUND_1 = ("в", "вши", "вшись")
+PERFECTIVE_GERUND_2 = ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+
+ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+
+PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+
+REFLEXIVE = ("ся", "сь")
+
+VERB_1 = (
+    "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны",
+    "ть", "ешь", "нно",
+)
+VERB_2 = (
+    "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им",
+    "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть",
+    "ишь", "ую", "ю",
+)
+
+NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей",
+    "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы",
+    "ь", "ию", "ью", "ю", "ия", "ья", "я",
+)
+
+DERIVATIONAL = ("ост", "ость")
+SUPERLATIVE = ("ейш", "ейше")
+
+
+def _regions(word: str):
+    """Возвращает начала областей RV и R2."""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _strip(rv: str, endings_1=(), endings_2=()):
+    """
+    Ищет самое длинное окончание из обеих групп. Окончания первой группы
+    удаляются, только если перед ними стоит «а» или «я».
+    Возвращает строку без окончания или None.
+    """
+    best = ""
+    for ending in endings_1 + endings_2:
+        if len(ending) > len(best) and rv.endswith(ending):
+            best = ending
+    if not best:
+        return None
+    if best in endings_1 and best not in endings_2:
+        if len(rv) <= len(best) or rv[-len(best) - 1] not in "ая":
+            return None
+    return rv[:-len(best)]
+
+
+@lru_cache(maxsize=200_000)
+def stem(word: str) -> str:
+    """Возвращает основу слова (в нижнем регистре, «ё» → «е»)."""
+    word = word.lower().replace("ё", "е")
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1
+    result = _strip(rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if result is None:
+        reflexive = _strip(rv, (), REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        adjective = _strip(rv, (), ADJECTIVE)
+        if adjective is not None:
+            participle = _strip(adjective, PARTICIPLE_1, PARTICIPLE_2)
+            rv = participle if participle is not None else adjective
+        else:
+            verb = _strip(rv, VERB_1, VERB_2)
+            if verb is not None:
+                rv = verb
+            else:
+                noun = _strip(rv, (), NOUN)
+                if noun is not None:
+                    rv = noun
+    else:
+        rv = result
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательное окончание в R2
+    for ending in DERIVATIONAL[::-1]:
+        if rv.endswith(ending) and len(prefix) + len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    superlative = _strip(rv, (), SUPERLATIVE)
+    if superlative is not None:
+        rv = superlative
+        if rv.endswith("нн"):
+            rv = rv[:-1]
+    elif rv.endswith("нн"):
+        rv = rv[:-1]
+    elif rv.endswith("ь"):
+        rv = rv[:-1]
+
+    return prefix + rv
@@ -0,0 +1,41 @@
+"""
+Версии служебных частей схемы базы данных (индексы, триггеры, виртуальные таблицы).
+"""
+
+from typing import Optional
+
+from .database import DatabaseService
+
+
+async def ensure_schema_versions_table(db: DatabaseService) -> None:
+    """Создаёт таблицу версий, если её ещё нет."""
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS schema_versions (
+               component TEXT PRIMARY KEY,
+               version INTEGER NOT NULL,
+               updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )"""
+    )
+
+
+async def get_schema_version(db: DatabaseService, component: str) -> Optional[int]:
+    """Возвращает применённую версию компонента схемы или None."""
+    await ensure_schema_versions_table(db)
+    row = await db.fetch_one(
+        "SELECT version FROM schema_versions WHERE component = ?",
+        (component,)
+    )
+    return row["version"] if row else None
+
+
+async def set_schema_version(db: DatabaseService, component: str, version: int) -> None:
+    """Запоминает применённую версию компонента схемы (без commit)."""
+    await ensure_schema_versions_table(db)
+    await db.execute(
+        """INSERT INTO schema_versions (component, version, updated_at)
+           VALUES (?, ?, datetime('now'))
+           ON CONFLICT(component) DO UPDATE SET
+               version = excluded.version,
+               updated_at = excluded.updated_at""",
+        (component, version)
+    )
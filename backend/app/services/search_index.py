@@ -0,0 +1,376 @@
+"""
+In-memory поисковый индекс каталога с учётом русской морфологии.
+
+- Слова приводятся к основе стеммером (russian_stemmer), поэтому «розы», «розу»
+  и «роза» находят одно и то же. Стеммер отрезает окончания не всегда
+  одинаково («тюльпаны» → «тюльпа», «тюльпанов» → «тюльпан»), поэтому
+  основы, отличающиеся на одну-две буквы в конце, тоже считаются совпадением.
+- Последнее слово запроса ищется как префикс (поиск по мере ввода) —
+  по отсортированному словарю основ через bisect.
+- Слова, которых нет в словаре, ищутся с опечаткой в одну правку
+  через триграммный индекс словоформ каталога («рлза» → «роза» → «роз»).
+
+Индекс хранит только тексты (название, описание, магазин, категория);
+видимость товара (активность, наличие, подписка) проверяется запросом к базе.
+Изменения товаров приходят через catalog_events, полная перестройка — периодически.
+"""
+
+import asyncio
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .catalog_events import CATALOG_PRODUCTS_QUERY, add_product_listener
+from .database import DatabaseService
+from .russian_stemmer import stem
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Веса полей (как у bm25 в products_fts)
+FIELD_WEIGHTS = (("name", 10.0), ("description", 5.0), ("shop_name", 3.0), ("category_name", 1.0))
+
+# Множители совпадений: точная основа, основа с другим окончанием, префикс, опечатка
+EXACT_MATCH = 1.0
+STEM_MATCH = 0.9
+PREFIX_MATCH = 0.8
+TYPO_MATCH = 0.5
+
+# Основы с другим окончанием: различие до MAX_STEM_OVERHANG букв в конце,
+# короче MIN_STEM_LENGTH не сравниваем («роз» и «ро» — разные слова)
+MAX_STEM_OVERHANG = 2
+MIN_STEM_LENGTH = 4
+
+# Префиксный поиск — со второго символа; для короткого префикса
+# подставляются самые частые основы, пока не наберётся MAX_PREFIX_POSTINGS товаров
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSIONS = 64
+MAX_PREFIX_POSTINGS = 20000
+# Опечатки ищутся для слов не короче
+MIN_TYPO_LENGTH = 3
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Разбивает текст на слова в нижнем регистре."""
+    if not text:
+        return []
+    return WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+def trigrams(word: str) -> Set[str]:
+    """Триграммы слова с границами (две позиции отступа с каждой стороны)."""
+    padded = f"^^{word}$$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Расстояние Дамерау—Левенштейна между a и b не больше 1."""
+    if a == b:
+        return True
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > 1:
+        return False
+    i = 0
+    while i < min(len_a, len_b) and a[i] == b[i]:
+        i += 1
+    if len_a == len_b:
+        # Замена или перестановка соседних символов
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:]
+    if len_a > len_b:
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+class ProductSearchIndex:
+    """Инвертированный индекс основ: основа → {product_id: вес}."""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # product_id → (веса основ, словоформы товара)
+        self._documents: Dict[int, Tuple[Dict[str, float], Set[str]]] = {}
+        # Словоформа → число товаров с ней; триграммы словоформ для опечаток
+        self._words: Dict[str, int] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    # ---------- Обновление ----------
+
+    def add_product(self, product: dict) -> None:
+        """Индексирует товар (dict с id, name, description, shop_name, category_name)."""
+        product_id = product["id"]
+        self.remove_product(product_id)
+
+        weights: Dict[str, float] = {}
+        words: Set[str] = set()
+        for field, weight in FIELD_WEIGHTS:
+            field_words = set(tokenize(product.get(field)))
+            words |= field_words
+            for term in {stem(word) for word in field_words}:
+                weights[term] = weights.get(term, 0.0) + weight
+
+        self._documents[product_id] = (weights, words)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._vocabulary_dirty = True
+            postings[product_id] = weight
+        for word in words:
+            count = self._words.get(word, 0)
+            if not count:
+                for gram in trigrams(word):
+                    self._trigrams.setdefault(gram, set()).add(word)
+            self._words[word] = count + 1
+
+    def remove_product(self, product_id: int) -> None:
+        """Удаляет товар из индекса."""
+        document = self._documents.pop(product_id, None)
+        if not document:
+            return
+        weights, words = document
+        for term in weights:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_dirty = True
+        for word in words:
+            count = self._words.get(word, 0) - 1
+            if count > 0:
+                self._words[word] = count
+                continue
+            self._words.pop(word, None)
+            for gram in trigrams(word):
+                grams_words = self._trigrams.get(gram)
+                if grams_words is not None:
+                    grams_words.discard(word)
+                    if not grams_words:
+                        del self._trigrams[gram]
+
+    @classmethod
+    def build(cls, products: Iterable[dict]) -> "ProductSearchIndex":
+        """Строит индекс по списку товаров."""
+        index = cls()
+        for product in products:
+            index.add_product(product)
+        index._refresh_vocabulary()
+        index.ready = True
+        return index
+
+    # ---------- Поиск ----------
+
+    def _refresh_vocabulary(self) -> None:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        """Основы словаря, начинающиеся с prefix: самые частые в пределах лимитов."""
+        self._refresh_vocabulary()
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + "\uffff", start)
+        terms = heapq.nlargest(
+            MAX_PREFIX_EXPANSIONS, self._vocabulary[start:end], key=lambda t: len(self._postings[t])
+        )
+        selected = []
+        postings = 0
+        for term in terms:
+            if selected and postings + len(self._postings[term]) > MAX_PREFIX_POSTINGS:
+                break
+            selected.append(term)
+            postings += len(self._postings[term])
+        return selected
+
+    def _stem_variants(self, term: str) -> List[str]:
+        """Основы словаря, которые отличаются от term только последними буквами."""
+        if len(term) < MIN_STEM_LENGTH:
+            return []
+        # Основа словаря — начало основы запроса («тюльпанов» → «тюльпан» → «тюльпа»)
+        variants = [
+            term[:length] for length in range(max(MIN_STEM_LENGTH, len(term) - MAX_STEM_OVERHANG), len(term))
+            if term[:length] in self._postings
+        ]
+        # Основа запроса — начало основы словаря («хризантем» → «хризант» → «хризантем»)
+        self._refresh_vocabulary()
+        start = bisect_left(self._vocabulary, term)
+        end = bisect_left(self._vocabulary, term + "\uffff", start)
+        variants.extend(
+            candidate for candidate in self._vocabulary[start:end]
+            if candidate != term and len(candidate) - len(term) <= MAX_STEM_OVERHANG
+        )
+        return variants
+
+    def _typo_terms(self, word: str) -> Set[str]:
+        """Основы словоформ каталога на расстоянии одной правки от word."""
+        if len(word) < MIN_TYPO_LENGTH:
+            return set()
+        grams = trigrams(word)
+        # Одна правка меняет не больше трёх триграмм
+        threshold = max(1, len(grams) - 3)
+        counts: Counter = Counter()
+        for gram in grams:
+            counts.update(self._trigrams.get(gram, ()))
+        return {
+            stem(candidate) for candidate, shared in counts.items()
+            if shared >= threshold and candidate != word and within_one_edit(candidate, word)
+        }
+
+    def _word_scores(self, word: str, is_prefix: bool) -> Dict[int, float]:
+        """Оценки товаров для одного слова запроса."""
+        term = stem(word)
+        matches: List[Tuple[str, float]] = []
+        if term in self._postings:
+            matches.append((term, EXACT_MATCH))
+        matches.extend((candidate, STEM_MATCH) for candidate in self._stem_variants(term))
+        if is_prefix and len(word) >= MIN_PREFIX_LENGTH:
+            # Префикс и по основе, и по введённому слову («розо» → «розов»)
+            for prefix in {term, word}:
+                matches.extend(
+                    (candidate, PREFIX_MATCH) for candidate in self._prefix_terms(prefix)
+                    if candidate != term
+                )
+        if not matches:
+            matches.extend(
+                (candidate, TYPO_MATCH) for candidate in self._typo_terms(word)
+                if candidate in self._postings
+            )
+
+        if not matches:
+            return {}
+        if len(matches) == 1 and matches[0][1] == EXACT_MATCH:
+            # Частый случай: одна точная основа — список товаров без копирования
+            return self._postings[matches[0][0]]
+
+        # Точная основа (или самый длинный список) копируется целиком, остальные — поштучно
+        matches.sort(key=lambda match: (match[1] == EXACT_MATCH, len(self._postings[match[0]])), reverse=True)
+        first, first_factor = matches[0]
+        if first_factor == EXACT_MATCH:
+            scores = dict(self._postings[first])
+        else:
+            scores = {pid: weight * first_factor for pid, weight in self._postings[first].items()}
+        for candidate, factor in matches[1:]:
+            for product_id, weight in self._postings[candidate].items():
+                score = weight * factor
+                if score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return scores
+
+    def search(self, query: str) -> Dict[int, float]:
+        """
+        Возвращает {product_id: релевантность} для товаров, где найдены все слова запроса.
+        Последнее слово ищется как префикс, если запрос не заканчивается пробелом.
+        Результат только для чтения: может быть списком самого индекса.
+        """
+        words = tokenize(query)
+        if not words:
+            return {}
+        last_is_prefix = not query[-1:].isspace()
+
+        per_word = [
+            self._word_scores(word, is_prefix=last_is_prefix and i == len(words) - 1)
+            for i, word in enumerate(words)
+        ]
+        per_word.sort(key=len)
+        result = per_word[0]
+        for scores in per_word[1:]:
+            result = {pid: score + scores[pid] for pid, score in result.items() if pid in scores}
+            if not result:
+                break
+        return result
+
+    @staticmethod
+    def top(scores: Dict[int, float], count: int) -> List[int]:
+        """Возвращает count лучших id (при равной оценке — более новые товары)."""
+        # Различных оценок немного (сочетания весов полей), поэтому сначала
+        # находим порог по гистограмме, а сортируем только прошедших порог
+        threshold = 0.0
+        seen = 0
+        histogram = Counter(scores.values())
+        for score in sorted(histogram, reverse=True):
+            threshold = score
+            seen += histogram[score]
+            if seen >= count:
+                break
+        candidates = [(score, pid) for pid, score in scores.items() if score >= threshold]
+        candidates.sort(reverse=True)
+        return [pid for _, pid in candidates[:count]]
+
+
+class CatalogIndexHolder:
+    """
+    Держит актуальный экземпляр in-memory индекса каталога: перестраивает его
+    из базы и применяет точечные изменения товаров (catalog_events).
+    """
+
+    def __init__(self, index_class, load: Callable[[DatabaseService], Awaitable]):
+        self._index_class = index_class
+        self._load = load
+        self.index = index_class()
+        self._lock = asyncio.Lock()
+        # Изменения, пришедшие во время перестройки: применяются к новому индексу
+        self._changes_during_rebuild: Optional[Dict[int, Optional[dict]]] = None
+
+    async def rebuild(self, db: DatabaseService) -> int:
+        """Перестраивает индекс. До замены запросы обслуживает старый индекс."""
+        async with self._lock:
+            self._changes_during_rebuild = {}
+            try:
+                data = await self._load(db)
+                # Построение — в отдельном потоке, чтобы не держать event loop
+                index = await asyncio.to_thread(self._index_class.build, data)
+                for product_id, product in self._changes_during_rebuild.items():
+                    self._apply(index, product_id, product)
+                self.index = index
+            finally:
+                self._changes_during_rebuild = None
+            return len(index)
+
+    @staticmethod
+    def _apply(index, product_id: int, product: Optional[dict]) -> None:
+        if product is None:
+            index.remove_product(product_id)
+        else:
+            index.add_product(product)
+
+    def apply_product(self, product_id: int, product: Optional[dict]) -> None:
+        """Слушатель catalog_events: обновляет один товар в индексе."""
+        self._apply(self.index, product_id, product)
+        if self._changes_during_rebuild is not None:
+            self._changes_during_rebuild[product_id] = product
+
+
+async def _load_products(db: DatabaseService) -> List[dict]:
+    rows = await db.fetch_all(CATALOG_PRODUCTS_QUERY)
+    return [dict(row) for row in rows]
+
+
+search_index = CatalogIndexHolder(ProductSearchIndex, _load_products)
+add_product_listener(search_index.apply_product)
+
+
+async def run_catalog_index_refresh(
+    db: DatabaseService,
+    interval_seconds: int,
+    holders: Iterable[CatalogIndexHolder]
+) -> None:
+    """Фоновая задача: периодически перестраивает in-memory индексы каталога."""
+    holders = list(holders)
+    while True:
+        await asyncio.sleep(interval_seconds)
+        for holder in holders:
+            try:
+                await holder.rebuild(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[SEARCH] Index refresh failed: {e}")
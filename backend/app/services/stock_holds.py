@@ -0,0 +1,106 @@
+"""
+Резерв остатков на время оформления заказа.
+
+Корзина, перешедшая к оформлению, держит товары STOCK_HOLD_MINUTES минут
+(POST /api/orders/hold). Пока резерв действует, другим покупателям доступно
+quantity минус чужие резервы. Заказ списывает остаток условным UPDATE с тем же
+учётом чужих резервов (проверка по rowcount) и снимает резервы покупателя,
+поэтому остаток не уходит в минус даже при одновременных заказах из разных воркеров.
+"""
+
+from typing import Dict, List
+
+from fastapi import HTTPException
+
+from ..config import settings
+from .database import DatabaseService
+
+# Сколько товара p держат действующие резервы других покупателей (параметр — user_id)
+HELD_BY_OTHERS = """(SELECT COALESCE(SUM(h.quantity), 0) FROM stock_holds h
+                     WHERE h.product_id = {product} AND h.user_id != ?
+                       AND h.expires_at > datetime('now'))"""
+
+
+def held_by_others(product: str = "products.id") -> str:
+    """Подзапрос «зарезервировано другими» для товара product."""
+    return HELD_BY_OTHERS.format(product=product)
+
+
+async def ensure_stock_holds(db: DatabaseService) -> None:
+    """Создаёт таблицу резервов, если её ещё нет."""
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS stock_holds (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+               user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+               quantity INTEGER NOT NULL CHECK (quantity > 0),
+               expires_at TIMESTAMP NOT NULL,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )"""
+    )
+
+
+async def load_available_products(
+    db: DatabaseService,
+    user_id: int,
+    shop_id: int,
+    product_ids: List[int]
+) -> Dict[int, dict]:
+    """
+    Активные товары магазина одним запросом; available — остаток за вычетом
+    чужих резервов.
+    """
+    placeholders = ",".join(["?" for _ in product_ids])
+    rows = await db.fetch_all(
+        f"""SELECT p.*, p.quantity - {held_by_others('p.id')} as available
+            FROM products p
+            WHERE p.id IN ({placeholders}) AND p.shop_id = ? AND p.is_active = 1""",
+        (user_id,) + tuple(product_ids) + (shop_id,)
+    )
+    return {row["id"]: row for row in rows}
+
+
+async def release_holds(db: DatabaseService, user_id: int, commit: bool = True) -> int:
+    """Снимает резервы покупателя. Возвращает число снятых резервов."""
+    return await db.delete("stock_holds", "user_id = ?", (user_id,), commit=commit)
+
+
+async def hold_items(db: DatabaseService, user_id: int, shop_id: int, items) -> dict:
+    """
+    Резервирует товары (прежние резервы покупателя заменяются).
+    409, если товара уже не хватает с учётом чужих резервов.
+    """
+    requested: Dict[int, int] = {}
+    for item in items:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+
+    async with db.transaction() as tx:
+        await tx.execute("DELETE FROM stock_holds WHERE expires_at <= datetime('now')")
+        await release_holds(tx, user_id, commit=False)
+
+        products = await load_available_products(tx, user_id, shop_id, list(requested))
+        for product_id, quantity in requested.items():
+            product = products.get(product_id)
+            if not product:
+                raise HTTPException(status_code=400, detail=f"Товар {product_id} не найден в магазине")
+            if product["available"] < quantity:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Недостаточно товара '{product['name']}' на складе. Доступно: {max(product['available'], 0)}, требуется: {quantity}"
+                )
+
+        modifier = f"+{int(settings.STOCK_HOLD_MINUTES)} minutes"
+        await tx.executemany(
+            """INSERT INTO stock_holds (product_id, user_id, quantity, expires_at)
+               VALUES (?, ?, ?, datetime('now', ?))""",
+            [(product_id, user_id, quantity, modifier) for product_id, quantity in requested.items()]
+        )
+        row = await tx.fetch_one("SELECT datetime('now', ?) as expires_at", (modifier,))
+
+    return {
+        "expires_at": row["expires_at"],
+        "items": [
+            {"product_id": product_id, "quantity": quantity}
+            for product_id, quantity in requested.items()
+        ],
+    }
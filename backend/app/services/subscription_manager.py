@@ -1,10 +1,71 @@
 """
 Сервис для управления подписками и автоматической деактивации/активации товаров.
+
+Видимость магазина на витрине денормализована в shops.visible_until — конец самой
+поздней активной подписки. Колонку поддерживают триггеры на shop_subscriptions
+(любой процесс: API, бот, скрипты), а граница end_date отрабатывается сравнением
+с текущим временем, поэтому каталог проверяет подписку без подзапроса на каждый товар.
 """
 
 from datetime import datetime
 from typing import Optional, Tuple
 from ..services.database import DatabaseService
+from . import catalog_events
+from .cache_invalidation import publish_invalidation, shop_tags
+from .schema_versions import get_schema_version, set_schema_version
+
+VISIBILITY_VERSION = 1
+
+# Условие витрины для магазина s: есть действующая подписка
+SHOP_VISIBLE_CONDITION = "s.visible_until > datetime('now')"
+
+
+def _visible_until(shop_id: str) -> str:
+    """SQL-выражение: конец самой поздней активной подписки магазина."""
+    return (
+        "(SELECT MAX(end_date) FROM shop_subscriptions "
+        f"WHERE shop_id = {shop_id} AND is_active = 1)"
+    )
+
+
+VISIBILITY_TRIGGERS = {
+    "shop_visibility_ai": f"""
+        CREATE TRIGGER shop_visibility_ai AFTER INSERT ON shop_subscriptions BEGIN
+            UPDATE shops SET visible_until = {_visible_until('NEW.shop_id')} WHERE id = NEW.shop_id;
+        END""",
+    "shop_visibility_au": f"""
+        CREATE TRIGGER shop_visibility_au AFTER UPDATE OF shop_id, is_active, end_date ON shop_subscriptions BEGIN
+            UPDATE shops SET visible_until = {_visible_until('shops.id')}
+            WHERE id IN (OLD.shop_id, NEW.shop_id);
+        END""",
+    "shop_visibility_ad": f"""
+        CREATE TRIGGER shop_visibility_ad AFTER DELETE ON shop_subscriptions BEGIN
+            UPDATE shops SET visible_until = {_visible_until('OLD.shop_id')} WHERE id = OLD.shop_id;
+        END""",
+}
+
+
+async def ensure_shop_visibility(db: DatabaseService) -> bool:
+    """
+    Добавляет shops.visible_until, (пере)создаёт триггеры при смене VISIBILITY_VERSION
+    и заполняет колонку. Возвращает True, если схема обновлена.
+    """
+    applied_version = await get_schema_version(db, "shop_visibility")
+    columns = await db.fetch_all("PRAGMA table_info(shops)")
+    has_column = any(col["name"] == "visible_until" for col in columns)
+    if applied_version == VISIBILITY_VERSION and has_column:
+        return False
+
+    if not has_column:
+        await db.execute("ALTER TABLE shops ADD COLUMN visible_until TIMESTAMP")
+    for name in VISIBILITY_TRIGGERS:
+        await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for statement in VISIBILITY_TRIGGERS.values():
+        await db.execute(statement)
+    await SubscriptionManager.refresh_shop_visibility(db, commit=False)
+    await set_schema_version(db, "shop_visibility", VISIBILITY_VERSION)
+    await db.commit()
+    return True
 
 
 class SubscriptionManager:
@@ -22,6 +83,22 @@ class SubscriptionManager:
         )
         return subscription is not None
     
+    @staticmethod
+    async def refresh_shop_visibility(db: DatabaseService, shop_id: Optional[int] = None, commit: bool = True) -> None:
+        """
+        Пересчитывает shops.visible_until (для одного магазина или всех).
+        Обычно это делают триггеры; нужен для заполнения и ручных правок базы.
+        """
+        if shop_id is None:
+            await db.execute(f"UPDATE shops SET visible_until = {_visible_until('shops.id')}")
+        else:
+            await db.execute(
+                f"UPDATE shops SET visible_until = {_visible_until('shops.id')} WHERE id = ?",
+                (shop_id,)
+            )
+        if commit:
+            await db.commit()
+    
     @staticmethod
     async def check_and_update_products_status(db: DatabaseService, shop_id: int) -> Tuple[int, int]:
         """
@@ -46,6 +123,9 @@ class SubscriptionManager:
             deactivated = result.rowcount if result else 0
             
             await db.commit()
+            if activated or deactivated:
+                await catalog_events.shop_products_changed(db, shop_id)
+                await publish_invalidation(db, *shop_tags(shop_id))
             return (activated, deactivated)
         else:
             # Подписка неактивна - деактивируем все товары
@@ -55,6 +135,9 @@ class SubscriptionManager:
             )
             deactivated = result.rowcount if result else 0
             await db.commit()
+            if deactivated:
+                await catalog_events.shop_products_changed(db, shop_id)
+                await publish_invalidation(db, *shop_tags(shop_id))
             return (0, deactivated)
     
     @staticmethod
@@ -71,6 +154,9 @@ class SubscriptionManager:
         )
         activated = result.rowcount if result else 0
         await db.commit()
+        if activated:
+            await catalog_events.shop_products_changed(db, shop_id)
+            await publish_invalidation(db, *shop_tags(shop_id))
         return activated
     
     @staticmethod
@@ -85,6 +171,9 @@ class SubscriptionManager:
         )
         deactivated = result.rowcount if result else 0
         await db.commit()
+        if deactivated:
+            await catalog_events.shop_products_changed(db, shop_id)
+            await publish_invalidation(db, *shop_tags(shop_id))
         return deactivated
     
     @staticmethod
@@ -0,0 +1,209 @@
+"""
+Подсказки при вводе (/api/products/suggest) из in-memory префиксного индекса.
+
+Индекс — отсортированный массив ключей: нормализованное название, начиная
+с каждого слова («букет роз», «роз»), поэтому подсказка находится и по началу
+названия, и по началу любого слова. Поиск — bisect по префиксу, без обращения к базе.
+В индексе только видимые на витрине товары, активные магазины и категории.
+Срок подписки магазина (visible_until) хранится вместе с подсказкой и
+проверяется при запросе, поэтому истёкшие магазины пропадают без перестройки.
+"""
+
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .catalog_events import CATALOG_PRODUCTS_QUERY, add_product_listener
+from .database import DatabaseService
+from .search_index import WORD_RE, CatalogIndexHolder
+from .subscription_manager import SHOP_VISIBLE_CONDITION
+
+# Порядок типов в выдаче при прочих равных
+KIND_PRIORITY = {"category": 0, "shop": 1, "product": 2}
+
+# Сколько совпадений просматривать для короткого префикса
+MAX_SCANNED = 500
+
+
+class SuggestData(NamedTuple):
+    """Данные для полной перестройки индекса."""
+    products: List[dict]
+    shops: List[dict]
+    categories: List[dict]
+
+
+def normalize(text: Optional[str]) -> str:
+    """Нижний регистр, «ё» → «е», одиночные пробелы между словами."""
+    if not text:
+        return ""
+    return " ".join(WORD_RE.findall(text.lower().replace("ё", "е")))
+
+
+def sql_now() -> str:
+    """Текущее время UTC в формате datetime('now') SQLite (для сравнения со строками дат)."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def word_suffixes(text: str) -> List[Tuple[str, int]]:
+    """Ключи для названия: с начала и с каждого следующего слова (ключ, номер слова)."""
+    words = text.split(" ")
+    return [(" ".join(words[i:]), i) for i in range(len(words)) if words[i]]
+
+
+class SuggestIndex:
+    """Отсортированный массив (ключ, тип, id, номер слова) и тексты подсказок."""
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str, int, int]] = []
+        # (тип, id) → (текст, популярность, ключи в _entries)
+        self._items: Dict[Tuple[str, int], Tuple[str, int, List[Tuple[str, str, int, int]]]] = {}
+        # (тип, id) → конец подписки магазина для товаров и магазинов
+        self._visible_until: Dict[Tuple[str, int], str] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # ---------- Обновление ----------
+
+    def _add(
+        self,
+        kind: str,
+        item_id: int,
+        text: Optional[str],
+        popularity: int = 0,
+        bulk: bool = False,
+        visible_until: Optional[str] = None
+    ) -> None:
+        self._remove(kind, item_id)
+        key = normalize(text)
+        if not key:
+            return
+        entries = [(suffix, kind, item_id, position) for suffix, position in word_suffixes(key)]
+        self._items[(kind, item_id)] = (text.strip(), popularity or 0, entries)
+        if visible_until is not None:
+            self._visible_until[(kind, item_id)] = visible_until
+        if bulk:
+            self._entries.extend(entries)
+        else:
+            for entry in entries:
+                insort(self._entries, entry)
+
+    def _remove(self, kind: str, item_id: int) -> None:
+        item = self._items.pop((kind, item_id), None)
+        self._visible_until.pop((kind, item_id), None)
+        if not item:
+            return
+        for entry in item[2]:
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+
+    @staticmethod
+    def is_visible(product: dict) -> bool:
+        """Товар показывается на витрине (активен сам и его магазин, подписка не истекла)."""
+        return (
+            bool(product.get("is_active"))
+            and product.get("shop_is_active") != 0
+            and (product.get("shop_visible_until") or "") > sql_now()
+        )
+
+    def add_product(self, product: dict, bulk: bool = False) -> None:
+        if not self.is_visible(product):
+            self._remove("product", product["id"])
+            return
+        self._add(
+            "product", product["id"], product.get("name"), product.get("views_count"), bulk,
+            visible_until=product["shop_visible_until"]
+        )
+
+    def remove_product(self, product_id: int) -> None:
+        self._remove("product", product_id)
+
+    @classmethod
+    def build(cls, data: SuggestData) -> "SuggestIndex":
+        index = cls()
+        for product in data.products:
+            index.add_product(product, bulk=True)
+        for shop in data.shops:
+            index._add(
+                "shop", shop["id"], shop["name"], shop.get("views_count"), bulk=True,
+                visible_until=shop["visible_until"]
+            )
+        for category in data.categories:
+            index._add("category", category["id"], category["name"], bulk=True)
+        index._entries.sort()
+        index.ready = True
+        return index
+
+    # ---------- Поиск ----------
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Подсказки для префикса: сначала совпадения с начала названия, затем по
+        слову внутри; при равенстве — категории, магазины, товары, популярные выше.
+        Одинаковые названия товаров схлопываются в одну подсказку.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        # Пробел в конце ввода — последнее слово уже дописано
+        whole_word = query[-1:].isspace()
+
+        now = sql_now()
+        start = bisect_left(self._entries, (prefix,))
+        matches = {}
+        for key, kind, item_id, position in self._entries[start:start + MAX_SCANNED]:
+            if whole_word:
+                if key != prefix and not key.startswith(prefix + " "):
+                    break
+            elif not key.startswith(prefix):
+                break
+            visible_until = self._visible_until.get((kind, item_id))
+            if visible_until is not None and visible_until <= now:
+                # Подписка магазина истекла после загрузки в индекс
+                continue
+            best = matches.get((kind, item_id))
+            if best is None or position < best:
+                matches[(kind, item_id)] = position
+
+        ranked = sorted(
+            matches.items(),
+            key=lambda match: (
+                match[1] > 0,
+                KIND_PRIORITY[match[0][0]],
+                -self._items[match[0]][1],
+                len(self._items[match[0]][0]),
+            )
+        )
+
+        result = []
+        seen_texts = set()
+        for (kind, item_id), _ in ranked:
+            text = self._items[(kind, item_id)][0]
+            dedupe_key = (kind, text.lower())
+            if dedupe_key in seen_texts:
+                continue
+            seen_texts.add(dedupe_key)
+            result.append({"type": kind, "id": item_id, "text": text})
+            if len(result) >= limit:
+                break
+        return result
+
+
+async def _load_suggest_data(db: DatabaseService) -> SuggestData:
+    products = await db.fetch_all(CATALOG_PRODUCTS_QUERY)
+    shops = await db.fetch_all(
+        f"""SELECT s.id, s.name, s.views_count, s.visible_until FROM shops s
+            WHERE s.is_active = 1 AND {SHOP_VISIBLE_CONDITION}"""
+    )
+    categories = await db.fetch_all("SELECT id, name FROM categories WHERE is_active = 1")
+    return SuggestData(
+        products=[dict(row) for row in products],
+        shops=[dict(row) for row in shops],
+        categories=[dict(row) for row in categories],
+    )
+
+
+suggest_index = CatalogIndexHolder(SuggestIndex, _load_suggest_data)
+add_product_listener(suggest_index.apply_product)
@@ -3,7 +3,7 @@
 """
 
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 from aiogram import Bot
 from aiogram.enums import ParseMode
@@ -11,6 +11,7 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from ..config import settings
+from .telegram_sender import use_send_scheduler
 
 
 class TelegramNotifier:
@@ -27,10 +28,10 @@ class TelegramNotifier:
         
         if cls._bot is None:
             print(f"[TELEGRAM] Creating bot instance with token: {settings.BOT_TOKEN[:10]}...")
-            cls._bot = Bot(
+            cls._bot = use_send_scheduler(Bot(
                 token=settings.BOT_TOKEN,
                 default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-            )
+            ))
         
         return cls._bot
     
@@ -50,23 +51,20 @@ class TelegramNotifier:
             parse_mode: Режим парсинга (HTML, Markdown)
             
         Returns:
-            bool: True если сообщение отправлено успешно
+            bool: True если сообщение отправлено, False если бот не настроен.
+            Ошибки Telegram пробрасываются: повторять ли отправку, решает очередь.
         """
         bot = cls.get_bot()
         if not bot:
             print(f"[WARNING] BOT_TOKEN not configured, message not sent to {chat_id}")
             return False
         
-        try:
-            await bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode=parse_mode or ParseMode.HTML
-            )
-            return True
-        except Exception as e:
-            print(f"[ERROR] Failed to send Telegram message to {chat_id}: {e}")
-            return False
+        await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode=parse_mode or ParseMode.HTML
+        )
+        return True
     
     @classmethod
     async def send_order_notification(
@@ -85,7 +83,8 @@ class TelegramNotifier:
         delivery_time: Optional[str] = None,
         customer_telegram_id: Optional[int] = None,
         delivery_type: str = "delivery",
-        gift_message: Optional[str] = None
+        gift_message: Optional[str] = None,
+        created_at: Optional[str] = None
     ) -> bool:
         """
         Отправляет уведомление о новом заказе владельцу магазина.
@@ -105,6 +104,7 @@ class TelegramNotifier:
             delivery_time: Время доставки
             customer_telegram_id: Telegram ID клиента (для ссылки)
             gift_message: Текст для открытки (если указан)
+            created_at: Время оформления заказа (orders.created_at, UTC)
             
         Returns:
             bool: True если уведомление отправлено
@@ -146,8 +146,12 @@ class TelegramNotifier:
             if promo_discount > 0:
                 promo_info += f" (скидка {promo_discount:.2f} ₽)"
         
-        # Текущее время
-        order_time = datetime.now().strftime("%d.%m.%Y %H:%M")
+        # Время оформления заказа (уведомление может уйти позже — из очереди)
+        if created_at:
+            order_datetime = datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc).astimezone()
+        else:
+            order_datetime = datetime.now()
+        order_time = order_datetime.strftime("%d.%m.%Y %H:%M")
         
         # Определяем заголовок адреса
         if is_pickup:
@@ -262,20 +266,14 @@ class TelegramNotifier:
         print(f"[TELEGRAM] Sending status notification to customer {customer_telegram_id}")
         print(f"[TELEGRAM] Status: {new_status}, Shop: {shop_name}, Order: {order_number}")
         
-        try:
-            await bot.send_message(
-                chat_id=customer_telegram_id,
-                text=message,
-                parse_mode=ParseMode.HTML,
-                reply_markup=keyboard
-            )
-            print(f"[TELEGRAM] Status notification sent successfully!")
-            return True
-        except Exception as e:
-            print(f"[ERROR] Failed to send order status notification to {customer_telegram_id}: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        await bot.send_message(
+            chat_id=customer_telegram_id,
+            text=message,
+            parse_mode=ParseMode.HTML,
+            reply_markup=keyboard
+        )
+        print(f"[TELEGRAM] Status notification sent successfully!")
+        return True
 
 
     @classmethod
@@ -405,20 +403,14 @@ class TelegramNotifier:
         if shop_owner_username:
             print(f"[TELEGRAM] Adding seller link button for shop owner @{shop_owner_username} with pre-filled text")
         
-        try:
-            await bot.send_message(
-                chat_id=customer_telegram_id,
-                text=message,
-                parse_mode=ParseMode.HTML,
-                reply_markup=keyboard
-            )
-            print(f"[TELEGRAM] Order confirmation sent successfully!")
-            return True
-        except Exception as e:
-            print(f"[ERROR] Failed to send order confirmation to {customer_telegram_id}: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+        await bot.send_message(
+            chat_id=customer_telegram_id,
+            text=message,
+            parse_mode=ParseMode.HTML,
+            reply_markup=keyboard
+        )
+        print(f"[TELEGRAM] Order confirmation sent successfully!")
+        return True
 
 
 # Глобальный экземпляр
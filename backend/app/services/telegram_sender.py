@@ -0,0 +1,254 @@
+"""
+Планировщик отправки в Telegram с учётом лимитов Bot API.
+
+TelegramSendScheduler — middleware сессии aiogram: через него проходит каждый
+запрос бота, к которому он подключён (use_send_scheduler). Отправка сообщений
+(send*, copy*, forward*) ограничивается:
+  - общим ведром токенов (TELEGRAM_GLOBAL_RATE сообщений в секунду);
+  - интервалом для одного чата (TELEGRAM_CHAT_INTERVAL, для групп —
+    TELEGRAM_GROUP_CHAT_INTERVAL);
+  - числом одновременных запросов (TELEGRAM_MAX_IN_FLIGHT).
+Ответ 429 (TelegramRetryAfter) приостанавливает все отправки процесса на
+retry_after секунд, после чего запрос повторяется (до TELEGRAM_MAX_RETRIES раз).
+Остальные методы (getUpdates, answerCallbackQuery, edit*) не ждут лимитов,
+но тоже повторяются после retry_after.
+
+Бот и каждый воркер API — отдельные процессы со своим экземпляром планировщика,
+а лимит Telegram — на токен бота. Поэтому общее ведро хранится в SQLite
+(таблица telegram_send_budget, одна строка): процесс забирает из него по
+несколько токенов (BUDGET_CLAIM) в транзакции BEGIN IMMEDIATE, туда же пишется
+пауза после 429. Если общее ведро недоступно (TELEGRAM_SHARED_BUDGET=false или
+ошибка базы), процесс держит TELEGRAM_GLOBAL_RATE сам. Интервалы чатов
+и число одновременных запросов — по-прежнему на процесс.
+Чтобы отправки шли параллельно, вызывающий код запускает их конкурентно
+(asyncio.gather) — планировщик сам выдерживает темп.
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from ..config import settings
+from .database import DatabaseService
+
+# Методы, на которые распространяются лимиты отправки
+_SEND_PREFIXES = ("send", "copyMessage", "forwardMessage")
+
+# Через сколько секунд простоя забывать чат
+_CHAT_FORGET_SECONDS = 60
+
+# Сколько токенов общего ведра процесс забирает за один раз
+BUDGET_CLAIM = 3
+
+
+class TelegramSendScheduler(BaseRequestMiddleware):
+    """Общий темп отправки сообщений и обработка RetryAfter."""
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        chat_interval: Optional[float] = None,
+        group_chat_interval: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        shared: Optional[bool] = None,
+    ):
+        self.rate = rate or settings.TELEGRAM_GLOBAL_RATE
+        self.chat_interval = chat_interval if chat_interval is not None else settings.TELEGRAM_CHAT_INTERVAL
+        self.group_chat_interval = (
+            group_chat_interval if group_chat_interval is not None else settings.TELEGRAM_GROUP_CHAT_INTERVAL
+        )
+        self.max_retries = max_retries if max_retries is not None else settings.TELEGRAM_MAX_RETRIES
+        self._max_in_flight = max_in_flight or settings.TELEGRAM_MAX_IN_FLIGHT
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket_lock: Optional[asyncio.Lock] = None
+        self.shared = shared if shared is not None else settings.TELEGRAM_SHARED_BUDGET
+        self._budget_db: Optional[DatabaseService] = None
+        # Токены процесса: забранные из общего ведра или своё ведро, если общего нет
+        self._tokens = 0.0 if self.shared else float(self.rate)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._chat_next_at: Dict[int, float] = {}
+        self._pruned_at = time.monotonic()
+        self.sent = 0
+        self.retried = 0
+
+    def _primitives(self):
+        # Создаются при первом запросе — в цикле событий процесса
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_in_flight)
+            self._bucket_lock = asyncio.Lock()
+        return self._semaphore, self._bucket_lock
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает отправки на seconds секунд (ответ 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def _wait_for_chat(self, chat_id) -> None:
+        """Бронирует ближайшее свободное окно отправки в чат и ждёт его."""
+        interval = self.chat_interval
+        if isinstance(chat_id, str) or chat_id < 0:
+            interval = self.group_chat_interval
+        now = time.monotonic()
+        slot = max(now, self._chat_next_at.get(chat_id, 0.0))
+        self._chat_next_at[chat_id] = slot + interval
+        if now - self._pruned_at > _CHAT_FORGET_SECONDS:
+            self._chat_next_at = {
+                chat: next_at for chat, next_at in self._chat_next_at.items()
+                if next_at > now - _CHAT_FORGET_SECONDS
+            }
+            self._pruned_at = now
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _budget(self) -> DatabaseService:
+        """Соединение с общим ведром (таблица создаётся при первом обращении)."""
+        if self._budget_db is None:
+            db = DatabaseService(db_path=settings.DATABASE_PATH)
+            await db.connect()
+            try:
+                await db.execute(
+                    """CREATE TABLE IF NOT EXISTS telegram_send_budget (
+                           id INTEGER PRIMARY KEY CHECK (id = 1),
+                           tokens REAL NOT NULL,
+                           updated_at REAL NOT NULL,
+                           paused_until REAL NOT NULL DEFAULT 0
+                       )"""
+                )
+                await db.execute(
+                    "INSERT OR IGNORE INTO telegram_send_budget (id, tokens, updated_at) VALUES (1, ?, ?)",
+                    (float(self.rate), time.time())
+                )
+                await db.commit()
+            except Exception:
+                await db.disconnect()
+                raise
+            self._budget_db = db
+        return self._budget_db
+
+    async def _claim_shared(self) -> float:
+        """
+        Забирает до BUDGET_CLAIM токенов общего ведра. Возвращает 0, если токены
+        получены, иначе — сколько секунд подождать до следующей попытки.
+        """
+        db = await self._budget()
+        async with db.transaction():
+            row = await db.fetch_one("SELECT tokens, updated_at, paused_until FROM telegram_send_budget WHERE id = 1")
+            now = time.time()
+            if row["paused_until"] > now:
+                return row["paused_until"] - now
+            tokens = min(float(self.rate), row["tokens"] + max(0.0, now - row["updated_at"]) * self.rate)
+            taken = min(BUDGET_CLAIM, int(tokens))
+            await db.execute(
+                "UPDATE telegram_send_budget SET tokens = ?, updated_at = ? WHERE id = 1",
+                (tokens - taken, now)
+            )
+        if taken:
+            self._tokens += taken
+            return 0.0
+        return (1 - tokens) / self.rate
+
+    async def _share_pause(self, seconds: float) -> None:
+        """Передаёт паузу после 429 остальным процессам."""
+        if not self.shared:
+            return
+        try:
+            db = await self._budget()
+            await db.execute(
+                "UPDATE telegram_send_budget SET paused_until = MAX(paused_until, ?) WHERE id = 1",
+                (time.time() + seconds,)
+            )
+            await db.commit()
+        except Exception as e:
+            print(f"[TELEGRAM] Failed to share flood control pause: {e}")
+
+    async def _take_token(self, lock: asyncio.Lock) -> None:
+        """Берёт токен ведра (очередь по порядку прихода)."""
+        async with lock:
+            while True:
+                now = time.monotonic()
+                if self._paused_until > now:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.shared:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    try:
+                        delay = await self._claim_shared()
+                    except Exception as e:
+                        print(f"[TELEGRAM] Shared send budget unavailable, limiting this process only: {e}")
+                        self.shared = False
+                        self._refilled_at = time.monotonic()
+                        continue
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    continue
+                self._tokens = min(float(self.rate), self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def _wait_for_pause(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __call__(self, make_request, bot: Bot, method):
+        api_method = getattr(method, "__api_method__", "")
+        limited = api_method.startswith(_SEND_PREFIXES)
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            try:
+                if not limited:
+                    await self._wait_for_pause()
+                    return await make_request(bot, method)
+                semaphore, lock = self._primitives()
+                if chat_id is not None:
+                    await self._wait_for_chat(chat_id)
+                await self._take_token(lock)
+                async with semaphore:
+                    result = await make_request(bot, method)
+                self.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.pause(e.retry_after)
+                await self._share_pause(e.retry_after)
+                if attempt > self.max_retries:
+                    raise
+                self.retried += 1
+                print(f"[TELEGRAM] {api_method} to {chat_id}: flood control, retry in {e.retry_after}s")
+
+    async def close(self) -> None:
+        """Закрывает соединение с общим ведром (при завершении процесса)."""
+        if self._budget_db is not None:
+            await self._budget_db.disconnect()
+            self._budget_db = None
+
+    def stats(self) -> dict:
+        """Счётчики планировщика в текущем процессе."""
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "shared_budget": self.shared,
+            "paused_for": max(0.0, round(self._paused_until - time.monotonic(), 1)),
+        }
+
+
+# Глобальный экземпляр (один на процесс)
+telegram_send_scheduler = TelegramSendScheduler()
+
+
+def use_send_scheduler(bot: Bot) -> Bot:
+    """Подключает планировщик к сессии бота (повторный вызов ничего не меняет)."""
+    if telegram_send_scheduler not in bot.session.middleware:
+        bot.session.middleware(telegram_send_scheduler)
+    return bot
@@ -618,7 +618,8 @@ async def approve_shop_request(callback: CallbackQuery, bot: Bot):
                 if old_path.exists():
                     shops_photos_dir = settings.UPLOADS_DIR / "shops" / str(shop_id)
                     shops_photos_dir.mkdir(parents=True, exist_ok=True)
-                    new_filename = f"photo_{hashlib.md5(str(shop_id).encode()).hexdigest()[:12]}{old_path.suffix}"
+                    # Имя по хэшу содержимого: URL неизменяемый и кэшируется навсегда
+                    new_filename = f"photo_{hashlib.md5(old_path.read_bytes()).hexdigest()[:12]}{old_path.suffix}"
                     new_path = shops_photos_dir / new_filename
                     shutil.copy2(old_path, new_path)
                     shop_update_data["photo_url"] = f"/media/shops/{shop_id}/{new_filename}"
@@ -650,7 +651,8 @@ async def approve_shop_request(callback: CallbackQuery, bot: Bot):
                     
                     shops_photos_dir = settings.UPLOADS_DIR / "shops" / str(shop_id)
                     shops_photos_dir.mkdir(parents=True, exist_ok=True)
-                    new_filename = f"photo_{hashlib.md5(str(shop_id).encode()).hexdigest()[:12]}{old_path.suffix}"
+                    # Имя по хэшу содержимого: URL неизменяемый и кэшируется навсегда
+                    new_filename = f"photo_{hashlib.md5(old_path.read_bytes()).hexdigest()[:12]}{old_path.suffix}"
                     new_path = shops_photos_dir / new_filename
                     shutil.copy2(old_path, new_path)
                     shop_photo_url = f"/media/shops/{shop_id}/{new_filename}"
@@ -1047,9 +1049,12 @@ async def successful_payment_handler_add_shop(message: Message, bot: Bot):
             
             # Активируем товары магазина при активации подписки
             from backend.app.services.subscription_manager import SubscriptionManager
+            from backend.app.services.cache_invalidation import publish_invalidation, shop_tags
             activated = await SubscriptionManager.activate_shop_products(db, shop_id)
             if activated > 0:
                 print(f"[SUBSCRIPTION] Activated {activated} products for shop {shop_id}")
+            # Подписка меняет видимость магазина на витрине
+            await publish_invalidation(db, *shop_tags(shop_id))
             
             await db.disconnect()
             
@@ -686,7 +686,8 @@ async def approve_request(callback: CallbackQuery, bot: Bot, request_id: int):
                 if old_path.exists():
                     shops_photos_dir = settings.UPLOADS_DIR / "shops" / str(shop_id)
                     shops_photos_dir.mkdir(parents=True, exist_ok=True)
-                    new_filename = f"photo_{hashlib.md5(str(shop_id).encode()).hexdigest()[:12]}{old_path.suffix}"
+                    # Имя по хэшу содержимого: URL неизменяемый и кэшируется навсегда
+                    new_filename = f"photo_{hashlib.md5(old_path.read_bytes()).hexdigest()[:12]}{old_path.suffix}"
                     new_path = shops_photos_dir / new_filename
                     shutil.copy2(old_path, new_path)
                     shop_update_data["photo_url"] = f"/media/shops/{shop_id}/{new_filename}"
@@ -719,7 +720,8 @@ async def approve_request(callback: CallbackQuery, bot: Bot, request_id: int):
                     
                     shops_photos_dir = settings.UPLOADS_DIR / "shops" / str(shop_id)
                     shops_photos_dir.mkdir(parents=True, exist_ok=True)
-                    new_filename = f"photo_{hashlib.md5(str(shop_id).encode()).hexdigest()[:12]}{old_path.suffix}"
+                    # Имя по хэшу содержимого: URL неизменяемый и кэшируется навсегда
+                    new_filename = f"photo_{hashlib.md5(old_path.read_bytes()).hexdigest()[:12]}{old_path.suffix}"
                     new_path = shops_photos_dir / new_filename
                     shutil.copy2(old_path, new_path)
                     shop_photo_url = f"/media/shops/{shop_id}/{new_filename}"
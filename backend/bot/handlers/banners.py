@@ -11,6 +11,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime
 
+from backend.app.services.cache_invalidation import publish_invalidation
+
 router = Router()
 
 
@@ -205,6 +207,7 @@ async def finish_create_banner(message: Message, state: FSMContext):
         
         banner_id = await db.insert("banners", banner_data)
         await db.commit()
+        await publish_invalidation(db, "banners")
         await db.disconnect()
         
         await state.clear()
@@ -231,6 +234,7 @@ async def delete_banner(callback: CallbackQuery, bot: Bot, banner_id: int):
         
         await db.delete("banners", "id = ?", (banner_id,))
         await db.commit()
+        await publish_invalidation(db, "banners")
         await db.disconnect()
         
         await callback.answer("✅ Баннер удален!", show_alert=True)
@@ -300,6 +304,7 @@ async def toggle_banner(callback: CallbackQuery, bot: Bot, banner_id: int):
         new_status = 0 if banner.get("is_active") else 1
         await db.update("banners", {"is_active": new_status, "updated_at": datetime.now()}, "id = ?", (banner_id,))
         await db.commit()
+        await publish_invalidation(db, "banners")
         await db.disconnect()
         
         status_text = "активирован" if new_status else "деактивирован"
@@ -124,8 +124,18 @@ async def show_orders_menu(callback: CallbackQuery, bot: Bot):
         await callback.answer("❌ Ошибка при загрузке меню заказов.", show_alert=True)
 
 
-async def show_orders_list(callback: CallbackQuery, bot: Bot, status: str = None, page: int = 0, shop_id: int = None):
-    """Показывает список заказов с фильтрами и пагинацией."""
+async def show_orders_list(
+    callback: CallbackQuery,
+    bot: Bot,
+    status: str = None,
+    page: int = 0,
+    shop_id: int = None,
+    anchor: str = None
+):
+    """
+    Показывает список заказов с фильтрами и пагинацией.
+    anchor — курсор страницы: a{id} — заказы после заказа id, b{id} — перед ним.
+    """
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
@@ -156,10 +166,24 @@ async def show_orders_list(callback: CallbackQuery, bot: Bot, status: str = None
             conditions.append("o.shop_id = ?")
             params.append(shop_id)
         
-        where_clause = " AND ".join(conditions) if conditions else "1=1"
         limit = 10
         offset = page * limit
         
+        # Keyset-пагинация по (created_at, id) относительно крайнего заказа соседней страницы;
+        # без курсора (старые кнопки) — по номеру страницы
+        sort_direction = "DESC"
+        if anchor and anchor[:1] in ("a", "b") and anchor[1:].isdigit():
+            comparison = "<" if anchor[0] == "a" else ">"
+            conditions.append(
+                f"(o.created_at, o.id) {comparison} (SELECT created_at, id FROM orders WHERE id = ?)"
+            )
+            params.append(int(anchor[1:]))
+            if anchor[0] == "b":
+                sort_direction = "ASC"
+            offset = 0
+        
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+        
         orders = await db.fetch_all(
             f"""SELECT o.*, 
                       s.name as shop_name,
@@ -171,10 +195,12 @@ async def show_orders_list(callback: CallbackQuery, bot: Bot, status: str = None
                LEFT JOIN shops s ON o.shop_id = s.id
                LEFT JOIN users u ON o.user_id = u.id
                WHERE {where_clause}
-               ORDER BY o.created_at DESC
+               ORDER BY o.created_at {sort_direction}, o.id {sort_direction}
                LIMIT ? OFFSET ?""",
             tuple(params + [limit, offset])
         )
+        if sort_direction == "ASC":
+            orders = list(reversed(orders))
         
         await db.disconnect()
         
@@ -252,12 +278,12 @@ async def show_orders_list(callback: CallbackQuery, bot: Bot, status: str = None
         
         if page > 0:
             nav_buttons.append(
-                InlineKeyboardButton(text="◀️ Назад", callback_data=f"{callback_prefix}_{page-1}")
+                InlineKeyboardButton(text="◀️ Назад", callback_data=f"{callback_prefix}_{page-1}_b{orders[0]['id']}")
             )
         
         if len(orders) == 10:  # Если получили полную страницу, есть еще заказы
             nav_buttons.append(
-                InlineKeyboardButton(text="Вперед ▶️", callback_data=f"{callback_prefix}_{page+1}")
+                InlineKeyboardButton(text="Вперед ▶️", callback_data=f"{callback_prefix}_{page+1}_a{orders[-1]['id']}")
             )
         
         if nav_buttons:
@@ -932,20 +958,23 @@ async def callback_orders_list(callback: CallbackQuery, bot: Bot):
         shop_id = None
         status = None
         page = 0
+        anchor = None
         
-        # Проверяем формат: admin_orders_list_shop_{shop_id}_{status}_{page}
+        # Проверяем формат: admin_orders_list_shop_{shop_id}_{status}_{page}[_{anchor}]
         if len(parts) > 3 and parts[3] == "shop":
-            # Формат: admin_orders_list_shop_{shop_id}_{status}_{page}
+            # Формат: admin_orders_list_shop_{shop_id}_{status}_{page}[_{anchor}]
             shop_id = int(parts[4]) if len(parts) > 4 and parts[4].isdigit() else None
             status = parts[5] if len(parts) > 5 and parts[5] != "all" else None
             page = int(parts[6]) if len(parts) > 6 and parts[6].isdigit() else 0
+            anchor = parts[7] if len(parts) > 7 else None
         else:
-            # Старый формат: admin_orders_list_{status}_{page}
+            # Старый формат: admin_orders_list_{status}_{page}[_{anchor}]
             status = parts[3] if len(parts) > 3 and parts[3] != "all" else None
             page = int(parts[4]) if len(parts) > 4 and parts[4].isdigit() else 0
+            anchor = parts[5] if len(parts) > 5 else None
         
-        print(f"[ORDERS_ADMIN] Parsed: shop_id={shop_id}, status={status}, page={page}")
-        await show_orders_list(callback, bot, status, page, shop_id=shop_id)
+        print(f"[ORDERS_ADMIN] Parsed: shop_id={shop_id}, status={status}, page={page}, anchor={anchor}")
+        await show_orders_list(callback, bot, status, page, shop_id=shop_id, anchor=anchor)
     except Exception as e:
         print(f"[ORDERS_ADMIN] Error parsing callback_orders_list: {e}")
         import traceback
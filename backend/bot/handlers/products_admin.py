@@ -9,6 +9,7 @@ from aiogram.types import (
 import os
 from decimal import Decimal
 from backend.app.config import settings
+from backend.app.services.cache_invalidation import product_tags, publish_invalidation
 
 router = Router()
 
@@ -389,7 +390,7 @@ async def toggle_product_status(callback: CallbackQuery, bot: Bot, product_id: i
         db = await get_db()
         
         # Получаем текущий статус
-        product = await db.fetch_one("SELECT is_active FROM products WHERE id = ?", (product_id,))
+        product = await db.fetch_one("SELECT is_active, shop_id FROM products WHERE id = ?", (product_id,))
         
         if not product:
             await db.disconnect()
@@ -406,6 +407,7 @@ async def toggle_product_status(callback: CallbackQuery, bot: Bot, product_id: i
             (product_id,)
         )
         await db.commit()
+        await publish_invalidation(db, *product_tags(product["shop_id"], product_id))
         await db.disconnect()
         
         status_text = "активирован" if new_status else "деактивирован"
@@ -431,7 +433,7 @@ async def delete_product(callback: CallbackQuery, bot: Bot, product_id: int):
         db = await get_db()
         
         # Проверяем существование товара
-        product = await db.fetch_one("SELECT id FROM products WHERE id = ?", (product_id,))
+        product = await db.fetch_one("SELECT id, shop_id FROM products WHERE id = ?", (product_id,))
         if not product:
             await db.disconnect()
             await callback.answer("❌ Товар не найден", show_alert=True)
@@ -440,6 +442,7 @@ async def delete_product(callback: CallbackQuery, bot: Bot, product_id: int):
         # Удаляем товар
         await db.execute("DELETE FROM products WHERE id = ?", (product_id,))
         await db.commit()
+        await publish_invalidation(db, *product_tags(product["shop_id"], product_id))
         await db.disconnect()
         
         await callback.answer("✅ Товар удален", show_alert=True)
@@ -12,6 +12,7 @@ from aiogram.fsm.state import State, StatesGroup
 from decimal import Decimal
 import os
 from backend.app.config import settings
+from backend.app.services.cache_invalidation import publish_invalidation, shop_tags
 
 router = Router()
 
@@ -412,6 +413,7 @@ async def toggle_shop_status(callback: CallbackQuery, bot: Bot, shop_id: int):
             (shop_id,)
         )
         await db.commit()
+        await publish_invalidation(db, *shop_tags(shop_id))
         await db.disconnect()
         
         status_text = "активирован" if new_status else "заблокирован"
@@ -451,6 +453,7 @@ async def toggle_shop_verification(callback: CallbackQuery, bot: Bot, shop_id: i
             (shop_id,)
         )
         await db.commit()
+        await publish_invalidation(db, *shop_tags(shop_id))
         await db.disconnect()
         
         status_text = "верифицирован" if verify else "верификация снята"
@@ -744,6 +747,7 @@ async def process_edit_shop_value(message: Message, bot: Bot, state: FSMContext)
             (shop_id,)
         )
         await db.commit()
+        await publish_invalidation(db, *shop_tags(shop_id))
         await db.disconnect()
         
         await state.clear()
@@ -909,6 +913,7 @@ async def extend_subscription(callback: CallbackQuery, bot: Bot, shop_id: int, d
             (subscription["id"],)
         )
         await db.commit()
+        await publish_invalidation(db, *shop_tags(shop_id))
         await db.disconnect()
         
         await callback.answer(f"✅ Подписка продлена на {days} дней", show_alert=True)
@@ -1059,6 +1064,7 @@ async def change_subscription_plan(callback: CallbackQuery, bot: Bot, shop_id: i
         })
         
         await db.commit()
+        await publish_invalidation(db, *shop_tags(shop_id))
         await db.disconnect()
         
         await callback.answer(f"✅ Тариф изменён на '{plan.get('name', 'N/A')}'", show_alert=True)
@@ -57,6 +57,10 @@ async def cmd_start(message: Message, bot: Bot, command: CommandObject):
                 "telegram_id = ?",
                 (message.from_user.id,)
             )
+            # Пользователь мог заблокировать бота и вернуться — снова получает рассылки
+            from backend.app.services.broadcasts import mark_bot_unblocked
+            await mark_bot_unblocked(db, message.from_user.id)
+            await db.commit()
         
         await db.disconnect()
     except Exception as e:
@@ -223,9 +223,12 @@ async def successful_payment_handler_direct(message: Message, bot: Bot):
             
             # Активируем товары магазина при активации подписки
             from backend.app.services.subscription_manager import SubscriptionManager
+            from backend.app.services.cache_invalidation import publish_invalidation, shop_tags
             activated = await SubscriptionManager.activate_shop_products(db, shop_id)
             if activated > 0:
                 print(f"[SUBSCRIPTION] Activated {activated} products for shop {shop_id}")
+            # Подписка меняет видимость магазина на витрине
+            await publish_invalidation(db, *shop_tags(shop_id))
             
             await db.disconnect()
             
@@ -372,9 +375,12 @@ async def successful_payment_handler_plan(message: Message, bot: Bot):
         
         # Активируем товары магазина при активации подписки
         from backend.app.services.subscription_manager import SubscriptionManager
+        from backend.app.services.cache_invalidation import publish_invalidation, shop_tags
         activated = await SubscriptionManager.activate_shop_products(db, shop_id)
         if activated > 0:
             print(f"[SUBSCRIPTION] Activated {activated} products for shop {shop_id}")
+        # Подписка меняет видимость магазина на витрине
+        await publish_invalidation(db, *shop_tags(shop_id))
         
         await db.disconnect()
         
@@ -13,6 +13,7 @@ from decimal import Decimal
 import json
 import httpx
 from backend.app.config import settings
+from backend.app.services.cache_invalidation import publish_invalidation
 
 router = Router()
 
@@ -342,6 +343,7 @@ async def process_plan_max_products(message: Message, state: FSMContext):
             
             plan_id = await db.insert("subscription_plans", plan_data)
             await db.commit()
+            await publish_invalidation(db, "subscription_plans")
             await db.disconnect()
             
             await message.answer(
@@ -406,6 +408,7 @@ async def delete_subscription_plan(callback: CallbackQuery, bot: Bot, plan_id: i
             (plan_id,)
         )
         await db.commit()
+        await publish_invalidation(db, "subscription_plans")
         await db.disconnect()
         
         await callback.answer("✅ План подписки удален", show_alert=True)
@@ -442,6 +445,7 @@ async def toggle_subscription_plan(callback: CallbackQuery, bot: Bot, plan_id: i
             (plan_id,)
         )
         await db.commit()
+        await publish_invalidation(db, "subscription_plans")
         await db.disconnect()
         
         status_text = "активирован" if new_status else "деактивирован"
@@ -595,6 +599,7 @@ async def process_plan_max_products_edit(message: Message, state: FSMContext):
                 (plan_id,)
             )
             await db.commit()
+            await publish_invalidation(db, "subscription_plans")
             await db.disconnect()
             
             await message.answer(
@@ -11,9 +11,19 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from decimal import Decimal
 from backend.app.config import settings
+from backend.app.services.broadcasts import (
+    broadcast_manager,
+    count_recipients,
+    create_broadcast_job,
+    progress_keyboard,
+    progress_text,
+)
 
 router = Router()
 
+# Кнопка управления рассылкой → новый статус задания
+BROADCAST_ACTIONS = {"pause": "paused", "resume": "running", "stop": "cancelled"}
+
 
 class BroadcastStates(StatesGroup):
     """Состояния для рассылки."""
@@ -161,13 +171,13 @@ async def process_broadcast_message(message: Message, bot: Bot, state: FSMContex
 async def show_broadcast_preview(message: Message, bot: Bot, state: FSMContext, text: str, photo_file_id: str = None):
     """Показывает превью рассылки."""
     db = await get_db()
-    total_users = await db.fetch_one("SELECT COUNT(*) as cnt FROM users")
+    total_users = await count_recipients(db)
     await db.disconnect()
     
     preview_text = f"""
 <b>📢 Превью рассылки</b>
 
-<b>Получателей:</b> {total_users['cnt']} пользователей
+<b>Получателей:</b> {total_users} пользователей
 
 <b>Содержание:</b>
 {'-' * 30}
@@ -208,63 +218,58 @@ async def confirm_broadcast(callback: CallbackQuery, bot: Bot, state: FSMContext
     data = await state.get_data()
     text = data.get("text", "")
     photo_file_id = data.get("photo_file_id")
-    
-    await callback.message.edit_text("📤 Отправка рассылки...")
+    await state.clear()
     await callback.answer()
     
-    # Получаем всех пользователей
-    db = await get_db()
-    users = await db.fetch_all("SELECT telegram_id FROM users")
-    await db.disconnect()
+    # Сообщение с прогрессом: подпись превью с фото не заменить текстом, поэтому отправляем новое
+    if callback.message.photo:
+        progress_message = await callback.message.answer("📤 Подготовка рассылки...")
+    else:
+        await callback.message.edit_text("📤 Подготовка рассылки...")
+        progress_message = callback.message
     
-    total = len(users)
-    sent = 0
-    failed = 0
+    # Задание и список получателей сохраняются в базе; отправка идёт в фоне
+    db = await get_db()
+    try:
+        job = await create_broadcast_job(
+            db,
+            text=text,
+            photo_file_id=photo_file_id,
+            admin_chat_id=progress_message.chat.id,
+            progress_message_id=progress_message.message_id,
+            created_by=callback.from_user.id
+        )
+    finally:
+        await db.disconnect()
     
-    for user in users:
-        try:
-            telegram_id = user["telegram_id"]
-            
-            if photo_file_id:
-                # Отправляем фото с подписью
-                if text:
-                    await bot.send_photo(
-                        chat_id=telegram_id,
-                        photo=photo_file_id,
-                        caption=text
-                    )
-                else:
-                    await bot.send_photo(
-                        chat_id=telegram_id,
-                        photo=photo_file_id
-                    )
-            else:
-                # Отправляем только текст
-                if text:
-                    await bot.send_message(
-                        chat_id=telegram_id,
-                        text=text
-                    )
-            
-            sent += 1
-        except Exception as e:
-            print(f"Error sending to user {telegram_id}: {e}")
-            failed += 1
+    broadcast_manager.start(bot, job["id"])
+
+
+@router.callback_query(F.data.regexp(r"^admin_broadcast_(pause|resume|stop)_\d+$"))
+async def control_broadcast(callback: CallbackQuery, bot: Bot):
+    """Пауза, продолжение и отмена идущей рассылки."""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
+        return
     
-    await state.clear()
+    action, job_id = callback.data.removeprefix("admin_broadcast_").split("_")
+    db = await get_db()
+    try:
+        job = await broadcast_manager.set_status(db, int(job_id), BROADCAST_ACTIONS[action])
+    finally:
+        await db.disconnect()
     
-    result_text = f"""
-<b>✅ Рассылка завершена</b>
-
-<b>Статистика:</b>
-📤 Отправлено: {sent}
-❌ Ошибок: {failed}
-📊 Всего получателей: {total}
-"""
+    if not job:
+        await callback.answer("Рассылка уже завершена.", show_alert=True)
+        return
+    if action == "resume":
+        broadcast_manager.start(bot, job["id"])
     
-    await callback.message.edit_text(result_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="◀️ Назад к пользователям", callback_data="admin_users_menu")]
-    ]))
+    try:
+        await callback.message.edit_text(progress_text(job), reply_markup=progress_keyboard(job))
+    except Exception:
+        pass
+    await callback.answer()
 
 
 @router.callback_query(F.data == "admin_broadcast_cancel")
@@ -281,8 +286,11 @@ async def cancel_broadcast(callback: CallbackQuery, bot: Bot, state: FSMContext)
     await callback.answer()
 
 
-async def show_users_list(callback: CallbackQuery, bot: Bot, page: int = 0):
-    """Показывает список пользователей с пагинацией."""
+async def show_users_list(callback: CallbackQuery, bot: Bot, page: int = 0, anchor: str = None):
+    """
+    Показывает список пользователей с пагинацией.
+    anchor — курсор страницы: a{id} — пользователи после пользователя id, b{id} — перед ним.
+    """
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет прав администратора.", show_alert=True)
         return
@@ -293,15 +301,31 @@ async def show_users_list(callback: CallbackQuery, bot: Bot, page: int = 0):
         limit = 10
         offset = page * limit
         
+        # Keyset-пагинация по (created_at, id) относительно крайнего пользователя соседней страницы;
+        # без курсора (старые кнопки) — по номеру страницы
+        where_clause = "1=1"
+        params = []
+        sort_direction = "DESC"
+        if anchor and anchor[:1] in ("a", "b") and anchor[1:].isdigit():
+            comparison = "<" if anchor[0] == "a" else ">"
+            where_clause = f"(u.created_at, u.id) {comparison} (SELECT created_at, id FROM users WHERE id = ?)"
+            params.append(int(anchor[1:]))
+            if anchor[0] == "b":
+                sort_direction = "ASC"
+            offset = 0
+        
         users = await db.fetch_all(
-            """SELECT u.*,
+            f"""SELECT u.*,
                       (SELECT COUNT(*) FROM orders WHERE user_id = u.id) as orders_count,
                       (SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE user_id = u.id) as total_spent
                FROM users u
-               ORDER BY u.created_at DESC
+               WHERE {where_clause}
+               ORDER BY u.created_at {sort_direction}, u.id {sort_direction}
                LIMIT ? OFFSET ?""",
-            (limit, offset)
+            tuple(params + [limit, offset])
         )
+        if sort_direction == "ASC":
+            users = list(reversed(users))
         
         await db.disconnect()
         
@@ -345,12 +369,12 @@ async def show_users_list(callback: CallbackQuery, bot: Bot, page: int = 0):
         nav_buttons = []
         if page > 0:
             nav_buttons.append(
-                InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_users_list_{page-1}")
+                InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_users_list_{page-1}_b{users[0]['id']}")
             )
         
         if len(users) == 10:  # Если получили полную страницу, есть еще пользователи
             nav_buttons.append(
-                InlineKeyboardButton(text="Вперед ▶️", callback_data=f"admin_users_list_{page+1}")
+                InlineKeyboardButton(text="Вперед ▶️", callback_data=f"admin_users_list_{page+1}_a{users[-1]['id']}")
             )
         
         if nav_buttons:
@@ -646,9 +670,11 @@ async def show_user_orders(callback: CallbackQuery, bot: Bot, user_id: int, page
 @router.callback_query(F.data.startswith("admin_users_list"))
 async def callback_users_list(callback: CallbackQuery, bot: Bot):
     """Обработчик списка пользователей."""
+    # Формат: admin_users_list_{page}[_{anchor}]
     parts = callback.data.split("_")
     page = int(parts[3]) if len(parts) > 3 else 0
-    await show_users_list(callback, bot, page)
+    anchor = parts[4] if len(parts) > 4 else None
+    await show_users_list(callback, bot, page, anchor)
 
 
 @router.callback_query(F.data.startswith("admin_user_view_"))
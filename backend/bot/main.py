@@ -8,6 +8,9 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
+from backend.app.services.broadcasts import broadcast_manager
+from backend.app.services.telegram_sender import telegram_send_scheduler, use_send_scheduler
+
 from .handlers import router
 from .middlewares import AuthMiddleware
 
@@ -26,11 +29,11 @@ async def main(bot_token: str, webapp_url: str):
     # Создаём хранилище состояний для FSM
     storage = MemoryStorage()
     
-    # Создаём бота
-    bot = Bot(
+    # Создаём бота; все запросы идут через общий планировщик отправки (лимиты Bot API)
+    bot = use_send_scheduler(Bot(
         token=bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    ))
     
     # Создаём диспетчер с хранилищем состояний
     dp = Dispatcher(storage=storage)
@@ -59,6 +62,14 @@ async def main(bot_token: str, webapp_url: str):
         traceback.print_exc()
         # Продолжаем работу бота даже если сервис напоминаний не запустился
     
+    # Рассылки, прерванные перезапуском, продолжаются с места остановки
+    try:
+        resumed = await broadcast_manager.resume_unfinished(bot)
+        if resumed:
+            logger.info(f"Resumed {resumed} broadcast jobs")
+    except Exception as e:
+        logger.error(f"Failed to resume broadcasts: {e}")
+    
     try:
         # Удаляем webhook если был (с несколькими попытками)
         try:
@@ -89,6 +100,8 @@ async def main(bot_token: str, webapp_url: str):
                 pass
             except Exception as e:
                 logger.warning(f"Error cancelling reminder task: {e}")
+        await broadcast_manager.shutdown()
+        await telegram_send_scheduler.close()
         await bot.session.close()
 
 
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Проверка планов SQL-запросов из backend/app/routes.
+
+Собирает все SQL-строки из модулей роутов, выполняет для них
+EXPLAIN QUERY PLAN на копии базы с применёнными индексами из
+backend/app/services/db_indexes.py и завершается с кодом 1, если горячий
+запрос (фильтр по ведущей колонке объявленного индекса) сканирует таблицу целиком.
+
+Использование:
+    python database/check_query_plans.py [--db path/to/miniapp.db] [--verbose]
+"""
+
+import argparse
+import ast
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.app.services.db_indexes import INDEXES, index_statement, indexes_by_table  # noqa: E402
+
+DATABASE_PATH = Path(__file__).parent / "miniapp.db"
+ROUTES_DIR = PROJECT_ROOT / "backend" / "app" / "routes"
+
+SQL_START_RE = re.compile(r"^(?:SELECT|UPDATE|DELETE|WITH|INSERT)\b", re.IGNORECASE)
+
+# Подстановки для известных динамических частей f-строк
+FSTRING_SUBSTITUTIONS = {
+    "placeholders": "?",
+    "set_clause": "updated_at = ?",
+}
+
+TABLE_ALIAS_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)(?:\s+(?:AS\s+)?([A-Za-z_][A-Za-z0-9_]*))?",
+    re.IGNORECASE
+)
+SQL_KEYWORDS = {
+    "WHERE", "JOIN", "LEFT", "INNER", "ON", "ORDER", "GROUP", "LIMIT", "SET",
+    "AND", "OR", "UNION", "HAVING", "VALUES", "OFFSET", "CROSS",
+}
+
+
+def collect_queries(routes_dir: Path):
+    """Возвращает список (файл, строка, sql) и список пропущенных динамических запросов."""
+    queries = []
+    skipped = []
+    for path in sorted(routes_dir.glob("*.py")):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        # Части f-строк разбираются вместе с самой f-строкой
+        fstring_parts = {
+            id(value)
+            for node in ast.walk(tree) if isinstance(node, ast.JoinedStr)
+            for value in node.values
+        }
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                if id(node) in fstring_parts:
+                    continue
+                sql = node.value.strip()
+                if SQL_START_RE.match(sql):
+                    queries.append((path.name, node.lineno, sql))
+            elif isinstance(node, ast.JoinedStr):
+                parts = []
+                dynamic = False
+                for value in node.values:
+                    if isinstance(value, ast.Constant):
+                        parts.append(str(value.value))
+                    else:
+                        name = ast.unparse(value.value)
+                        if name in FSTRING_SUBSTITUTIONS:
+                            parts.append(FSTRING_SUBSTITUTIONS[name])
+                        else:
+                            parts.append("{" + name + "}")
+                            dynamic = True
+                sql = "".join(parts).strip()
+                if not SQL_START_RE.match(sql):
+                    continue
+                if dynamic:
+                    skipped.append((path.name, node.lineno, sql))
+                else:
+                    queries.append((path.name, node.lineno, sql))
+    return queries, skipped
+
+
+def table_aliases(sql: str):
+    """Сопоставляет алиасы таблиц именам таблиц."""
+    aliases = {}
+    for table, alias in TABLE_ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def has_indexed_predicate(sql: str, alias: str, table: str, leading_columns) -> bool:
+    """Есть ли в запросе условие на ведущую колонку индекса этой таблицы."""
+    for column in leading_columns:
+        # Только условия с параметром: col = ? / col IN (...), а не условия JOIN
+        pattern = rf"(?:\b{re.escape(alias)}\.|(?<![\w.])){re.escape(column)}\s*(?:=\s*\?|IN\s*\()"
+        if re.search(pattern, sql, re.IGNORECASE):
+            return True
+    return False
+
+
+def build_database(db_path: Path) -> sqlite3.Connection:
+    """Копирует базу в память и применяет объявленные индексы."""
+    conn = sqlite3.connect(":memory:")
+    if db_path.exists():
+        source = sqlite3.connect(db_path)
+        source.backup(conn)
+        source.close()
+    else:
+        print(f"⚠️  База не найдена: {db_path}, проверяются только запросы к существующим таблицам")
+    for index in INDEXES:
+        try:
+            conn.execute(index_statement(index))
+        except sqlite3.OperationalError as e:
+            print(f"⚠️  {index.name}: {e}")
+    # Статистика небольшой локальной базы склоняет планировщик к сканам:
+    # проверяем планы без неё, как для базы с неизвестным распределением данных
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone()
+    if has_stats:
+        conn.execute("DELETE FROM sqlite_stat1")
+        conn.commit()
+        # Перечитывает статистику в планировщик
+        conn.execute("ANALYZE sqlite_master")
+    return conn
+
+
+def check(db_path: Path, verbose: bool = False) -> int:
+    conn = build_database(db_path)
+    queries, skipped = collect_queries(ROUTES_DIR)
+    declared = indexes_by_table()
+    leading = {table: {idx.columns[0] for idx in idx_list} for table, idx_list in declared.items()}
+
+    failures = []
+    scans = []
+    errors = []
+
+    for filename, lineno, sql in queries:
+        params = (None,) * sql.count("?")
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.Error as e:
+            errors.append((filename, lineno, str(e)))
+            continue
+
+        aliases = table_aliases(sql)
+        for row in plan:
+            detail = row[-1]
+            match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+            if not match or "COVERING INDEX" in detail:
+                continue
+            alias = match.group(1)
+            table = aliases.get(alias, alias)
+            if table not in leading:
+                continue
+            if has_indexed_predicate(sql, alias, table, leading[table]):
+                failures.append((filename, lineno, detail, sql))
+            else:
+                scans.append((filename, lineno, detail))
+
+        if verbose:
+            print(f"\n{filename}:{lineno}")
+            for row in plan:
+                print(f"   {row[-1]}")
+
+    print("=" * 60)
+    print("ПРОВЕРКА ПЛАНОВ ЗАПРОСОВ")
+    print("=" * 60)
+    print(f"Запросов проверено: {len(queries) - len(errors)}")
+    print(f"Динамических запросов пропущено: {len(skipped)}")
+
+    if errors:
+        print(f"\nℹ️  Не удалось построить план ({len(errors)}), обычно из-за отсутствующих таблиц:")
+        for filename, lineno, error in errors:
+            print(f"   {filename}:{lineno}: {error}")
+
+    if scans and verbose:
+        print(f"\nℹ️  Полные сканы без индексируемого условия ({len(scans)}):")
+        for filename, lineno, detail in scans:
+            print(f"   {filename}:{lineno}: {detail}")
+
+    if failures:
+        print(f"\n❌ Горячие запросы со сканированием таблицы ({len(failures)}):")
+        for filename, lineno, detail, sql in failures:
+            short_sql = " ".join(sql.split())[:120]
+            print(f"   {filename}:{lineno}: {detail}")
+            print(f"      {short_sql}")
+        return 1
+
+    print("\n✅ Горячие запросы используют индексы")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN для SQL из backend/app/routes")
+    parser.add_argument("--db", type=Path, default=DATABASE_PATH, help="Путь к базе (схема и статистика)")
+    parser.add_argument("--verbose", action="store_true", help="Печатать планы всех запросов")
+    args = parser.parse_args()
+    sys.exit(check(args.db, args.verbose))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Создание уменьшенных копий для уже загруженных фото товаров.
+
+Проходит по записям product_media с фото из uploads/products/, создаёт рядом
+с файлами варианты (backend/app/services/image_variants.py) в пуле процессов
+и записывает их в product_media.variants. По умолчанию пропускает записи,
+у которых варианты уже есть.
+
+Использование:
+    python database/generate_image_variants.py [--db path/to/miniapp.db] [--force] [--workers 4]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.app.config import settings  # noqa: E402
+from backend.app.services.image_variants import available_formats, render_variants, variants_payload  # noqa: E402
+
+DATABASE_PATH = Path(__file__).parent / "miniapp.db"
+MEDIA_PREFIX = "/media/products/"
+
+
+def _render(media_id: int, source: str):
+    try:
+        return media_id, render_variants(source), None
+    except Exception as e:
+        return media_id, None, f"{type(e).__name__}: {e}"
+
+
+def backfill(db_path: Path, force: bool, workers: int) -> int:
+    if not available_formats():
+        print("❌ Pillow не установлен или не поддерживает WebP")
+        return 1
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    columns = [row["name"] for row in conn.execute("PRAGMA table_info(product_media)")]
+    if "variants" not in columns:
+        conn.execute("ALTER TABLE product_media ADD COLUMN variants TEXT")
+        conn.commit()
+        print("   + Добавлена колонка product_media.variants")
+
+    condition = "" if force else "AND (variants IS NULL OR variants = '')"
+    rows = conn.execute(
+        f"""SELECT id, url FROM product_media
+            WHERE media_type = 'photo' AND url LIKE '{MEDIA_PREFIX}%' {condition}
+            ORDER BY id"""
+    ).fetchall()
+
+    jobs = {}
+    missing = 0
+    for row in rows:
+        source = settings.PRODUCTS_MEDIA_DIR / row["url"][len(MEDIA_PREFIX):]
+        if not source.is_file():
+            missing += 1
+            continue
+        jobs[row["id"]] = (row["url"], source)
+
+    print(f"Фото для обработки: {len(jobs)} (файлов нет на диске: {missing})")
+
+    done = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render, media_id, str(source)) for media_id, (_, source) in jobs.items()]
+        for future in futures:
+            media_id, rendered, error = future.result()
+            url = jobs[media_id][0]
+            if error:
+                failed += 1
+                print(f"   ❌ {url}: {error}")
+                continue
+            conn.execute(
+                "UPDATE product_media SET variants = ? WHERE id = ?",
+                (json.dumps(variants_payload(url, rendered)), media_id)
+            )
+            done += 1
+            if done % 50 == 0:
+                conn.commit()
+                print(f"   ... {done}/{len(jobs)}")
+    conn.commit()
+    conn.close()
+
+    print("=" * 60)
+    print(f"Обработано: {done}, с ошибками: {failed}")
+    if failed:
+        print("❌ Часть фото не обработана")
+        return 1
+    print("✅ Варианты созданы")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Уменьшенные копии (WebP/AVIF) для загруженных фото товаров")
+    parser.add_argument("--db", type=Path, default=DATABASE_PATH, help="Путь к базе")
+    parser.add_argument("--force", action="store_true", help="Пересоздать варианты и для уже обработанных фото")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Число процессов")
+    args = parser.parse_args()
+    sys.exit(backfill(args.db, args.force, args.workers))
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка списания остатков при одновременных заказах.
+
+Ставит товару остаток --stock и из --clients процессов (у каждого свой покупатель)
+одновременно оформляет заказы на этот товар через запущенный API, по желанию
+с предварительным резервом (POST /api/orders/hold). Затем проверяет, что:
+  - остаток не ушёл в минус;
+  - продано ровно столько, сколько списано с остатка;
+  - число успешных заказов совпадает с числом позиций в базе;
+  - продан весь остаток, который успевали купить клиенты, а ответов 5xx
+    и сетевых ошибок нет (иначе оформление не работало и проверка ничего не доказывает).
+Код выхода 1, если проверка не прошла. После проверки тестовые заказы, резервы
+и покупатели удаляются, остаток товара восстанавливается (--keep — оставить).
+
+Запускайте на тестовом экземпляре API (несколько воркеров Gunicorn/uvicorn)
+с пустым BOT_TOKEN: иначе каждый заказ ставит в очередь уведомления владельцу
+магазина и покупателю.
+
+Использование:
+    python database/stock_load_test.py --url http://127.0.0.1:8000 --db database/miniapp.db \\
+        [--product-id 1] [--stock 20] [--clients 16] [--requests 10] [--hold] [--keep]
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+from pathlib import Path
+
+import httpx
+
+DATABASE_PATH = Path(__file__).parent / "miniapp.db"
+
+# Telegram ID тестовых покупателей: TEST_TELEGRAM_ID_BASE + номер клиента
+TEST_TELEGRAM_ID_BASE = 9_000_000_000
+
+
+def pick_product(conn: sqlite3.Connection, product_id=None):
+    """Товар для теста: заданный или первый активный товар активного магазина."""
+    if product_id:
+        return conn.execute(
+            "SELECT id, shop_id, name, quantity, sales_count FROM products WHERE id = ?",
+            (product_id,)
+        ).fetchone()
+    return conn.execute(
+        """SELECT p.id, p.shop_id, p.name, p.quantity, p.sales_count
+           FROM products p JOIN shops s ON p.shop_id = s.id
+           WHERE p.is_active = 1 AND s.is_active = 1
+           ORDER BY p.id LIMIT 1"""
+    ).fetchone()
+
+
+def run_client(args):
+    """Один клиент: последовательные заказы от своего покупателя. Возвращает коды ответов."""
+    url, index, shop_id, product_id, quantity, requests_count, hold, start_at = args
+    headers = {"X-Telegram-ID": str(TEST_TELEGRAM_ID_BASE + index)}
+    items = [{"product_id": product_id, "quantity": quantity}]
+    statuses = Counter()
+    with httpx.Client(base_url=url, headers=headers, timeout=30) as client:
+        # Регистрация покупателя до старта, чтобы заказы шли одновременно
+        client.get("/api/users/me")
+        time.sleep(max(0.0, start_at - time.time()))
+        for _ in range(requests_count):
+            try:
+                if hold:
+                    response = client.post("/api/orders/hold", json={"shop_id": shop_id, "items": items})
+                    if response.status_code != 200:
+                        statuses[f"hold {response.status_code}"] += 1
+                        continue
+                response = client.post("/api/orders/", json={"shop_id": shop_id, "items": items})
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+    return statuses
+
+
+def cleanup(conn: sqlite3.Connection, product, clients: int) -> None:
+    """Удаляет тестовые заказы, резервы и покупателей, восстанавливает остаток."""
+    telegram_ids = [TEST_TELEGRAM_ID_BASE + i for i in range(clients)]
+    placeholders = ",".join("?" * len(telegram_ids))
+    user_ids = [
+        row[0] for row in conn.execute(
+            f"SELECT id FROM users WHERE telegram_id IN ({placeholders})", telegram_ids
+        )
+    ]
+    if user_ids:
+        users = ",".join("?" * len(user_ids))
+        conn.execute(
+            f"DELETE FROM order_items WHERE order_id IN (SELECT id FROM orders WHERE user_id IN ({users}))",
+            user_ids
+        )
+        conn.execute(f"DELETE FROM orders WHERE user_id IN ({users})", user_ids)
+        try:
+            conn.execute(f"DELETE FROM stock_holds WHERE user_id IN ({users})", user_ids)
+        except sqlite3.OperationalError:
+            pass
+        conn.execute(f"DELETE FROM users WHERE id IN ({users})", user_ids)
+    conn.execute(
+        "UPDATE products SET quantity = ?, sales_count = ? WHERE id = ?",
+        (product["quantity"], product["sales_count"], product["id"])
+    )
+    conn.commit()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Одновременные заказы одного товара: остаток не уходит в минус")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Адрес запущенного API")
+    parser.add_argument("--db", type=Path, default=DATABASE_PATH, help="База, с которой работает API")
+    parser.add_argument("--product-id", type=int, help="Товар (по умолчанию первый активный)")
+    parser.add_argument("--stock", type=int, default=20, help="Остаток товара перед тестом")
+    parser.add_argument("--clients", type=int, default=16, help="Число параллельных клиентов (процессов)")
+    parser.add_argument("--requests", type=int, default=10, help="Заказов на клиента")
+    parser.add_argument("--quantity", type=int, default=1, help="Количество товара в заказе")
+    parser.add_argument("--hold", action="store_true", help="Перед заказом резервировать товар")
+    parser.add_argument("--keep", action="store_true", help="Не удалять тестовые заказы")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    conn.row_factory = sqlite3.Row
+    product = pick_product(conn, args.product_id)
+    if not product:
+        print("❌ Нет подходящего товара")
+        return 1
+
+    conn.execute("UPDATE products SET quantity = ? WHERE id = ?", (args.stock, product["id"]))
+    conn.commit()
+    sales_before = product["sales_count"] or 0
+
+    print("=" * 60)
+    print("НАГРУЗОЧНАЯ ПРОВЕРКА ОСТАТКОВ")
+    print("=" * 60)
+    print(f"Товар #{product['id']} «{product['name']}», остаток {args.stock}")
+    print(f"Клиентов: {args.clients} × {args.requests} заказов по {args.quantity} шт.{' (с резервом)' if args.hold else ''}")
+
+    start_at = time.time() + 2
+    jobs = [
+        (args.url, i, product["shop_id"], product["id"], args.quantity, args.requests, args.hold, start_at)
+        for i in range(args.clients)
+    ]
+    try:
+        with Pool(args.clients) as pool:
+            results = pool.map(run_client, jobs)
+    except Exception as e:
+        print(f"❌ Клиенты завершились с ошибкой: {e}")
+        cleanup(conn, product, args.clients)
+        return 1
+    elapsed = time.time() - start_at
+
+    statuses = Counter()
+    for result in results:
+        statuses.update(result)
+    succeeded = statuses.get("200", 0)
+
+    final = conn.execute(
+        "SELECT quantity, sales_count FROM products WHERE id = ?", (product["id"],)
+    ).fetchone()
+    telegram_ids = [TEST_TELEGRAM_ID_BASE + i for i in range(args.clients)]
+    placeholders = ",".join("?" * len(telegram_ids))
+    ordered = conn.execute(
+        f"""SELECT COUNT(*) as items, COALESCE(SUM(oi.quantity), 0) as quantity
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            JOIN users u ON o.user_id = u.id
+            WHERE oi.product_id = ? AND u.telegram_id IN ({placeholders})""",
+        (product["id"], *telegram_ids)
+    ).fetchone()
+
+    print(f"\nОтветы за {elapsed:.1f} с: {dict(sorted(statuses.items()))}")
+    print(f"Остаток после теста: {final['quantity']}")
+    print(f"Позиций в заказах: {ordered['items']}, продано: {ordered['quantity']}")
+
+    problems = []
+    if final["quantity"] < 0:
+        problems.append(f"остаток ушёл в минус: {final['quantity']}")
+    if args.stock - final["quantity"] != ordered["quantity"]:
+        problems.append(f"списано {args.stock - final['quantity']}, а в заказах {ordered['quantity']}")
+    if (final["sales_count"] or 0) - sales_before != ordered["quantity"]:
+        problems.append(f"sales_count вырос на {(final['sales_count'] or 0) - sales_before}, а продано {ordered['quantity']}")
+    if succeeded != ordered["items"]:
+        problems.append(f"успешных заказов {succeeded}, а позиций в базе {ordered['items']}")
+    if succeeded * args.quantity > args.stock:
+        problems.append(f"продано больше остатка: {succeeded * args.quantity} > {args.stock}")
+    expected = min(args.stock // args.quantity, args.clients * args.requests)
+    if succeeded != expected:
+        problems.append(f"успешных заказов {succeeded}, ожидалось {expected}")
+    # Коды ответов — «200», «hold 409»; остальное — исключения httpx
+    server_errors = sum(
+        count for status, count in statuses.items() if status.split()[-1].startswith("5")
+    )
+    transport_errors = sum(
+        count for status, count in statuses.items() if not status.split()[-1].isdigit()
+    )
+    if server_errors:
+        problems.append(f"ответов 5xx: {server_errors}")
+    if transport_errors:
+        problems.append(f"сетевых ошибок: {transport_errors}")
+
+    if not args.keep:
+        cleanup(conn, product, args.clients)
+    conn.close()
+
+    if problems:
+        print("\n❌ Ошибки:")
+        for problem in problems:
+            print(f"   {problem}")
+        return 1
+    print("\n✅ Перепродажи нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
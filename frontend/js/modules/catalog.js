@@ -480,7 +480,14 @@
         card.dataset.productId = product.id;
         
         const getMediaUrl = utils.getMediaUrl || window.getMediaUrl || ((url) => url);
+        const getMediaSrcset = utils.getMediaSrcset || window.getMediaSrcset || (() => '');
         const formatPrice = utils.formatPrice || window.formatPrice || ((p) => p);
+        // Карточка занимает половину ширины экрана в сетке из двух колонок
+        const imageSizes = '(max-width: 600px) 50vw, 300px';
+        const srcsetAttrs = (m) => {
+            const srcset = getMediaSrcset(m);
+            return srcset ? `srcset="${srcset}" sizes="${imageSizes}"` : '';
+        };
         
         // Генерируем HTML для изображения
         let imageHTML = '';
@@ -495,7 +502,7 @@
                                 <div class="product-slider-slide" data-index="${i}">
                                     ${m.media_type === 'video' 
                                         ? `<video src="${mediaUrl}" preload="auto" muted playsinline loop autoplay style="width:100%;height:100%;object-fit:cover;"></video>` 
-                                        : `<img src="${mediaUrl}" alt="${product.name}" loading="lazy">`
+                                        : `<img src="${mediaUrl}" ${srcsetAttrs(m)} alt="${product.name}" loading="lazy">`
                                     }
                                 </div>
                             `;
@@ -512,7 +519,7 @@
                     <div class="product-single-image">
                         ${media[0].media_type === 'video'
                             ? `<video src="${mediaUrl}" preload="auto" muted playsinline loop autoplay style="width:100%;height:100%;object-fit:cover;"></video>`
-                            : `<img src="${mediaUrl}" alt="${product.name}" loading="lazy">`
+                            : `<img src="${mediaUrl}" ${srcsetAttrs(media[0])} alt="${product.name}" loading="lazy">`
                         }
                     </div>
                 `;
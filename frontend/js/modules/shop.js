@@ -107,10 +107,12 @@
             if (shopTitleEl) shopTitleEl.textContent = shop.name || 'Магазин';
             
             const getMediaUrl = utils.getMediaUrl || window.getMediaUrl || ((url) => url);
+            const getResizedMediaUrl = utils.getResizedMediaUrl || window.getResizedMediaUrl || getMediaUrl;
             
             if (shopAvatarEl) {
                 if (shop.photo_url) {
-                    const photoUrl = getMediaUrl(shop.photo_url);
+                    // Аватар маленький — запрашиваем копию под его размер, а не оригинал
+                    const photoUrl = getResizedMediaUrl(shop.photo_url, shopAvatarEl.offsetWidth || 100);
                     shopAvatarEl.innerHTML = `<img src="${photoUrl}" alt="${shop.name}" style="width: 100%; height: 100%; object-fit: cover; border-radius: 50%;">`;
                 } else {
                     shopAvatarEl.textContent = '🏪';
@@ -40,6 +40,24 @@
         return api.baseUrl + '/' + url;
     }
 
+    // srcset из уменьшенных копий фото (media.variants, WebP) — браузер сам выбирает ширину
+    function getMediaSrcset(media) {
+        if (!media || !Array.isArray(media.variants)) return '';
+        return media.variants
+            .filter(v => v.format === 'webp')
+            .map(v => `${getMediaUrl(v.url)} ${v.width}w`)
+            .join(', ');
+    }
+
+    // URL копии изображения под ширину элемента (/media/...?w=, ресайз на сервере).
+    // Ширина округляется вверх до 100 px, чтобы на сервере не плодились копии
+    function getResizedMediaUrl(url, cssWidth) {
+        const mediaUrl = getMediaUrl(url);
+        if (!url || !url.startsWith('/media/') || !cssWidth) return mediaUrl;
+        const pixels = Math.ceil(cssWidth * (window.devicePixelRatio || 1) / 100) * 100;
+        return `${mediaUrl}?w=${Math.min(pixels, 2000)}`;
+    }
+
     function formatPrice(price) {
         return new Intl.NumberFormat('ru-RU', {
             style: 'currency',
@@ -164,6 +182,8 @@
     window.App = window.App || {};
     window.App.utils = {
         getMediaUrl,
+        getMediaSrcset,
+        getResizedMediaUrl,
         formatPrice,
         formatDate,
         getOrderStatusText,
@@ -179,6 +199,8 @@
 
     // Также экспортируем как глобальные функции для обратной совместимости
     window.getMediaUrl = getMediaUrl;
+    window.getMediaSrcset = getMediaSrcset;
+    window.getResizedMediaUrl = getResizedMediaUrl;
     window.formatPrice = formatPrice;
     window.formatDate = formatDate;
     window.getOrderStatusText = getOrderStatusText;